@@ -1,4 +1,4 @@
-__all__ = ["core", "dataverse", "utils"]
+__all__ = ["catalog", "checksum", "core", "dataverse", "direct_upload", "download", "journal", "manifest", "plan", "result", "session", "streaming", "utils"]
 __author__ = """Zhiyuan Ma"""
 __email__ = 'zhiyuanma@umass.edu'
 __version__ = '0.2.0'
@@ -0,0 +1,27 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+
+__all__ = ['run_sync', 'call']
+
+
+def run_sync(coro):
+    """Run `coro` to completion and return the result.
+
+    This allows the sync API to be used from within a running event loop,
+    in which case the coroutine is run in a helper thread.
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(asyncio.run, coro).result()
+
+
+async def call(dv_config, func, *args, **kwargs):
+    """Run the blocking `func` in the executor of `dv_config`."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        dv_config.executor, functools.partial(func, *args, **kwargs))
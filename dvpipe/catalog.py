@@ -0,0 +1,300 @@
+import asyncio
+import json
+import sqlite3
+import threading
+from pathlib import Path
+
+from loguru import logger
+
+from .checksum import get_remote_checksum
+from ._async import call, run_sync
+from .dataverse import (
+    get_datafile_items, get_metadata_hash, get_version_items,
+    iter_search_dataverse_async)
+
+
+__all__ = ['DataverseCatalog']
+
+
+class DataverseCatalog(object):
+    """A local mirror of the datasets in a dataverse subtree.
+
+    The catalog keeps the title, versions and files of each dataset in a
+    sqlite database, so that existence checks and listings are local
+    lookups. It is synced incrementally: the datasets in the subtree are
+    listed with the paginated search, and only the datasets whose
+    ``updatedAt`` timestamps changed since the last sync have their
+    versions and files queried.
+
+    Parameters
+    ----------
+    filepath : str or Path
+        The path of the sqlite database file.
+    """
+
+    _create_tables = """
+    CREATE TABLE IF NOT EXISTS meta (
+        key TEXT PRIMARY KEY,
+        value TEXT
+    );
+    CREATE TABLE IF NOT EXISTS dataset (
+        pid TEXT PRIMARY KEY,
+        title TEXT,
+        dataverse TEXT,
+        updated_at TEXT,
+        stale INTEGER DEFAULT 0,
+        metadata_hash TEXT
+    );
+    CREATE INDEX IF NOT EXISTS dataset_title ON dataset (title);
+    CREATE TABLE IF NOT EXISTS version (
+        pid TEXT,
+        version_id INTEGER,
+        data TEXT,
+        PRIMARY KEY (pid, version_id)
+    );
+    CREATE TABLE IF NOT EXISTS file (
+        pid TEXT,
+        file_id INTEGER,
+        label TEXT,
+        directory_label TEXT,
+        checksum_type TEXT,
+        checksum_value TEXT,
+        data TEXT,
+        PRIMARY KEY (pid, file_id)
+    );
+    """
+
+    _order_latest_first = "updated_at IS NULL DESC, updated_at DESC"
+    """The order of datasets with the ones not synced yet first."""
+
+    def __init__(self, filepath):
+        self._filepath = Path(filepath)
+        self._lock = threading.Lock()
+        self._filepath.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(
+            self._filepath.as_posix(), check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.executescript(self._create_tables)
+            columns = [
+                r[1] for r in
+                self._conn.execute("PRAGMA table_info(dataset)").fetchall()]
+            if 'metadata_hash' not in columns:
+                self._conn.execute(
+                    "ALTER TABLE dataset ADD COLUMN metadata_hash TEXT")
+
+    @property
+    def filepath(self):
+        return self._filepath
+
+    def _execute(self, sql, params=()):
+        with self._lock, self._conn:
+            return self._conn.execute(sql, params).fetchall()
+
+    def _get_meta(self, key):
+        rows = self._execute("SELECT value FROM meta WHERE key = ?", (key, ))
+        return rows[0][0] if rows else None
+
+    @property
+    def subtree(self):
+        """The dataverse subtree mirrored by the catalog."""
+        return self._get_meta('subtree')
+
+    @property
+    def last_sync(self):
+        """The time of the last sync in ISO format."""
+        return self._get_meta('last_sync')
+
+    def find_datasets(self, title):
+        """Return the pids of datasets with `title`, the latest first.
+
+        The datasets added or changed since the last sync have no
+        timestamp, and are listed first as the latest.
+        """
+        rows = self._execute(
+            "SELECT pid FROM dataset WHERE title = ? "
+            f"ORDER BY {self._order_latest_first}", (title, ))
+        return [r[0] for r in rows]
+
+    def get_datasets(self):
+        """Return the list of datasets in the catalog, the latest first."""
+        rows = self._execute(
+            "SELECT pid, title, dataverse, updated_at FROM dataset "
+            f"ORDER BY {self._order_latest_first}")
+        return [
+            dict(zip(['pid', 'title', 'dataverse', 'updated_at'], r))
+            for r in rows]
+
+    def get_versions(self, pid):
+        """Return the versions of dataset `pid`, the latest first."""
+        rows = self._execute(
+            "SELECT data FROM version WHERE pid = ? "
+            "ORDER BY version_id DESC", (pid, ))
+        return [json.loads(r[0]) for r in rows]
+
+    def get_datafiles(self, pid):
+        """Return the files of dataset `pid`.
+
+        Returns
+        -------
+        list or None
+            The file items as returned by dataverse, or None if the dataset
+            is not in the catalog or has been changed since the last sync.
+        """
+        rows = self._execute(
+            "SELECT stale FROM dataset WHERE pid = ?", (pid, ))
+        if not rows or rows[0][0]:
+            return None
+        rows = self._execute(
+            "SELECT data FROM file WHERE pid = ? ORDER BY file_id", (pid, ))
+        return [json.loads(r[0]) for r in rows]
+
+    def get_metadata_hash(self, pid):
+        """Return the metadata hash of the latest version of dataset `pid`.
+
+        Returns
+        -------
+        str or None
+            The hash computed with `dvpipe.dataverse.get_metadata_hash`, or
+            None if the dataset is not in the catalog or has been changed
+            since the last sync.
+        """
+        rows = self._execute(
+            "SELECT metadata_hash FROM dataset WHERE pid = ? AND stale = 0",
+            (pid, ))
+        return rows[0][0] if rows else None
+
+    def get_checksums(self, pid):
+        """Return the file checksums of dataset `pid` keyed by the labels."""
+        rows = self._execute(
+            "SELECT directory_label, label, checksum_type, checksum_value "
+            "FROM file WHERE pid = ?", (pid, ))
+        return {(r[0], r[1]): (r[2], r[3]) for r in rows}
+
+    def add_dataset(self, pid, title, dataverse=None):
+        """Add dataset `pid` to the catalog, to be refreshed on next sync."""
+        self._execute(
+            "INSERT OR REPLACE INTO dataset "
+            "(pid, title, dataverse, updated_at, stale) "
+            "VALUES (?, ?, ?, NULL, 1)", (pid, title, dataverse))
+
+    def invalidate(self, pid):
+        """Mark dataset `pid` as changed so it is refreshed on next sync."""
+        self._execute(
+            "UPDATE dataset SET updated_at = NULL, stale = 1 WHERE pid = ?",
+            (pid, ))
+
+    def _update_dataset(self, item, versions, datafiles):
+        pid = item['global_id']
+        # the versions are listed with the latest first
+        metadata_hash = None
+        if versions:
+            metadata_hash = get_metadata_hash(versions[0])
+        versions = [
+            {k: v for k, v in version.items() if k != 'metadataBlocks'}
+            for version in versions]
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO dataset "
+                "(pid, title, dataverse, updated_at, stale, metadata_hash) "
+                "VALUES (?, ?, ?, ?, 0, ?)",
+                (
+                    pid, item.get('name', None),
+                    item.get('identifier_of_dataverse', None),
+                    item.get('updatedAt', None), metadata_hash))
+            self._conn.execute("DELETE FROM version WHERE pid = ?", (pid, ))
+            self._conn.executemany(
+                "INSERT INTO version (pid, version_id, data) VALUES (?, ?, ?)",
+                [(pid, v.get('id', None), json.dumps(v)) for v in versions])
+            self._conn.execute("DELETE FROM file WHERE pid = ?", (pid, ))
+            rows = list()
+            for f in datafiles:
+                datafile_meta = f.get('dataFile', None) or {}
+                checksum = get_remote_checksum(datafile_meta) or (None, None)
+                rows.append((
+                    pid, datafile_meta.get('id', None), f.get('label', None),
+                    f.get('directoryLabel', None), checksum[0], checksum[1],
+                    json.dumps(f)))
+            self._conn.executemany(
+                "INSERT INTO file (pid, file_id, label, directory_label, "
+                "checksum_type, checksum_value, data) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+
+    def _remove_datasets(self, pids):
+        with self._lock, self._conn:
+            for table in ['dataset', 'version', 'file']:
+                self._conn.executemany(
+                    f"DELETE FROM {table} WHERE pid = ?",
+                    [(pid, ) for pid in pids])
+
+    async def sync_async(self, dv_config, subtree=None):
+        """Async version of `sync`."""
+        if subtree is None:
+            subtree = self.subtree
+        if subtree is None:
+            raise ValueError("subtree is required for the first sync")
+        if self.subtree is not None and subtree != self.subtree:
+            logger.info(
+                f"catalog subtree changed from {self.subtree} to {subtree}, "
+                f"reset catalog")
+            self._remove_datasets([d['pid'] for d in self.get_datasets()])
+        t_sync = self._execute("SELECT datetime('now')")[0][0]
+        local = {
+            d['pid']: d['updated_at'] for d in self.get_datasets()}
+        remote = dict()
+        async for item in iter_search_dataverse_async(
+                dv_config, q_str='*', data_type='dataset', subtree=subtree):
+            remote[item['global_id']] = item
+        changed = [
+            item for pid, item in remote.items()
+            if local.get(pid, None) is None
+            or local[pid] != item.get('updatedAt', None)
+            ]
+        removed = [pid for pid in local if pid not in remote]
+        logger.info(
+            f"sync catalog {self._filepath}: {len(remote)} datasets, "
+            f"{len(changed)} changed, {len(removed)} removed")
+
+        async def _refresh(item):
+            pid = item['global_id']
+            (versions, _), (datafiles, _) = await asyncio.gather(
+                call(
+                    dv_config, get_version_items, dv_config, pid,
+                    include_metadata=True),
+                call(dv_config, get_datafile_items, dv_config, pid),
+                )
+            self._update_dataset(item, versions, datafiles)
+
+        await asyncio.gather(*(_refresh(item) for item in changed))
+        self._remove_datasets(removed)
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                [('subtree', subtree), ('last_sync', t_sync)])
+        return {
+            'n_datasets': len(remote),
+            'n_changed': len(changed),
+            'n_removed': len(removed),
+            }
+
+    def sync(self, dv_config, subtree=None):
+        """Sync the catalog with the dataverse.
+
+        Parameters
+        ----------
+        dv_config : dvpipe.core.DataverseConfig
+            The dataverse connection config.
+        subtree : str, optional
+            The identifier of the dataverse to mirror. Default is the one
+            of the previous sync.
+
+        Returns
+        -------
+        dict
+            The counts of datasets, and of the datasets changed and removed
+            since the last sync.
+        """
+        return run_sync(self.sync_async(dv_config, subtree=subtree))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
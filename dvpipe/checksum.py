@@ -0,0 +1,223 @@
+import hashlib
+import os
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from loguru import logger
+
+
+__all__ = [
+    'compute_checksum', 'compute_checksums', 'get_remote_checksum',
+    'is_same_file', 'ChecksumCache']
+
+
+_blocksize = 8 * 1024 * 1024
+
+
+_dataverse_checksum_types = {
+    'MD5': 'md5',
+    'SHA-1': 'sha1',
+    'SHA-256': 'sha256',
+    'SHA-512': 'sha512',
+    }
+"""The mapping from dataverse checksum types to hashlib algorithms."""
+
+
+def compute_checksums(path, algorithms=('md5', 'sha1'), blocksize=_blocksize):
+    """Return the hex digests of the content of file `path`.
+
+    The file is read once in large blocks into a reused buffer, and all the
+    hashes are updated from the same block. Hashing releases the GIL, so
+    multiple files can be processed concurrently in threads.
+
+    Parameters
+    ----------
+    path : str or Path
+        The path of the file.
+    algorithms : tuple
+        The hashlib algorithm names.
+    blocksize : int
+        The number of bytes to read at a time.
+
+    Returns
+    -------
+    dict
+        The hex digests keyed by the algorithm names.
+    """
+    hashes = {a: hashlib.new(a) for a in algorithms}
+    buf = bytearray(blocksize)
+    view = memoryview(buf)
+    with open(path, 'rb', buffering=0) as fo:
+        while True:
+            n = fo.readinto(buf)
+            if not n:
+                break
+            for h in hashes.values():
+                h.update(view[:n])
+    return {a: h.hexdigest() for a, h in hashes.items()}
+
+
+def compute_checksum(path, algorithm='md5', blocksize=_blocksize):
+    """Return the hex digest of the content of file `path`.
+
+    Parameters
+    ----------
+    path : str or Path
+        The path of the file.
+    algorithm : str
+        The hashlib algorithm name.
+    blocksize : int
+        The number of bytes to read at a time.
+    """
+    return compute_checksums(
+        path, algorithms=(algorithm, ), blocksize=blocksize)[algorithm]
+
+
+class ChecksumCache(object):
+    """A persistent cache of file checksums backed by sqlite.
+
+    The entries are keyed by the absolute file path and are only valid if
+    the size and mtime of the file are not changed.
+
+    Parameters
+    ----------
+    filepath : str or Path
+        The path of the sqlite database file.
+    max_workers : int
+        The number of threads to compute checksums of multiple files.
+    """
+
+    algorithms = ('md5', 'sha1')
+
+    _create_table = """
+    CREATE TABLE IF NOT EXISTS checksum (
+        path TEXT PRIMARY KEY,
+        size INTEGER,
+        mtime_ns INTEGER,
+        md5 TEXT,
+        sha1 TEXT
+    );
+    """
+
+    def __init__(self, filepath, max_workers=4):
+        self._filepath = Path(filepath)
+        self._max_workers = max_workers
+        self._lock = threading.Lock()
+        self._filepath.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(
+            self._filepath.as_posix(), check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(self._create_table)
+
+    @property
+    def filepath(self):
+        return self._filepath
+
+    @staticmethod
+    def _stat_key(path):
+        path = Path(path).resolve()
+        st = path.stat()
+        return path.as_posix(), st.st_size, st.st_mtime_ns
+
+    def get(self, path):
+        """Return the cached checksums of `path`, or None if not valid."""
+        key = self._stat_key(path)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT md5, sha1 FROM checksum "
+                "WHERE path = ? AND size = ? AND mtime_ns = ?", key
+                ).fetchone()
+        if row is None:
+            return None
+        return dict(zip(self.algorithms, row))
+
+    def get_checksums(self, path):
+        """Return the checksums of `path`, computing them if needed."""
+        checksums = self.get(path)
+        if checksums is not None:
+            return checksums
+        key = self._stat_key(path)
+        logger.debug(f"compute checksums for {key[0]}")
+        checksums = compute_checksums(path, algorithms=self.algorithms)
+        # the file may be modified during the hashing
+        if self._stat_key(path) != key:
+            logger.warning(f"file {key[0]} changed during hashing")
+            return checksums
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO checksum "
+                "(path, size, mtime_ns, md5, sha1) VALUES (?, ?, ?, ?, ?)",
+                key + tuple(checksums[a] for a in self.algorithms)
+                )
+        return checksums
+
+    def get_checksums_many(self, paths):
+        """Return the checksums of `paths`, computed in parallel if needed.
+
+        Returns
+        -------
+        dict
+            The checksums keyed by the items in `paths`.
+        """
+        paths = list(paths)
+        with ThreadPoolExecutor(max_workers=self._max_workers) as executor:
+            results = executor.map(self.get_checksums, paths)
+            return dict(zip(paths, results))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def get_remote_checksum(datafile_meta):
+    """Return the checksum of a file on dataverse.
+
+    Parameters
+    ----------
+    datafile_meta : dict
+        The "dataFile" entry of the file metadata returned by dataverse.
+
+    Returns
+    -------
+    tuple or None
+        The tuple of (algorithm, hexdigest), or None if no checksum of a
+        supported algorithm is found.
+    """
+    checksum = datafile_meta.get('checksum', None) or {}
+    algorithm = _dataverse_checksum_types.get(checksum.get('type', None), None)
+    if algorithm is not None and checksum.get('value', None):
+        return algorithm, checksum['value'].lower()
+    md5 = datafile_meta.get('md5', None)
+    if md5:
+        return 'md5', md5.lower()
+    return None
+
+
+def is_same_file(path, datafile_meta, checksum_cache=None):
+    """Return True if local file `path` has the same content as the remote.
+
+    The file size is compared first so the file is only hashed when the
+    sizes match.
+
+    Parameters
+    ----------
+    path : str or Path
+        The path of the local file.
+    datafile_meta : dict
+        The "dataFile" entry of the file metadata returned by dataverse.
+    checksum_cache : ChecksumCache, optional
+        If set, the local checksum is looked up from the cache.
+    """
+    remote_size = datafile_meta.get('filesize', None)
+    if remote_size is not None and os.path.getsize(path) != remote_size:
+        return False
+    remote_checksum = get_remote_checksum(datafile_meta)
+    if remote_checksum is None:
+        logger.debug(f"no remote checksum found for {path}")
+        return False
+    algorithm, value = remote_checksum
+    if checksum_cache is not None and algorithm in checksum_cache.algorithms:
+        return checksum_cache.get_checksums(path)[algorithm] == value
+    return compute_checksum(path, algorithm=algorithm) == value
@@ -9,7 +9,7 @@ from wrapt import ObjectProxy
 
 from .. import __version__
 from ..core import DVPConfig
-from ..utils import pformat_yaml
+from ..utils import LazyFormat, lazy_pformat_yaml, set_pformat_max_size
 
 
 ctxobj_proxy = ObjectProxy(None)
@@ -67,6 +67,13 @@ class Config(BaseModel):
     default=False,
     help='Enable debug messages.',
     )
+@click.option(
+    '--log_max_size',
+    type=click.IntRange(min=0),
+    default=None,
+    metavar='N',
+    help='If set, the dumps of payloads in the log are truncated to N chars.',
+    )
 @click.option(
     '--no_banner',
     is_flag=True,
@@ -94,7 +101,7 @@ class Config(BaseModel):
     help='Dotenv file path to load env vars from.',
     )
 @click.pass_context
-def main(ctx, debug, no_banner, config_file, env_file):
+def main(ctx, debug, log_max_size, no_banner, config_file, env_file):
     """The CLI entry point."""
 
     # show banner
@@ -102,6 +109,7 @@ def main(ctx, debug, no_banner, config_file, env_file):
         print(_prog_info['banner'])
 
     _init_log(level='DEBUG' if debug else 'INFO')
+    set_pformat_max_size(log_max_size)
 
     if config_file is None:
         config = {
@@ -115,12 +123,13 @@ def main(ctx, debug, no_banner, config_file, env_file):
         DVPConfig.Config.env_file = env_file
     ctxobj = ctx.obj = ctxobj_proxy.__wrapped__ = Config(
         **config, config_file=config_file)
-    logger.debug(f"dvp cfg:\n{ctxobj.dvpipe.yaml()}")
+    logger.debug("dvp cfg:\n{}", LazyFormat(ctxobj.dvpipe.yaml))
     # try show the serve info version
     api = ctxobj.dvpipe.dataverse.native_api
     resp = api.get_info_version()
     if resp.ok:
-        logger.info(f"Dataverse server info:\n{pformat_yaml(resp.json())}")
+        logger.info(
+            "Dataverse server info:\n{}", lazy_pformat_yaml(resp.json()))
     else:
         logger.error("Unable to connect to dataverse server.")
     return
@@ -2,8 +2,15 @@ import click
 import pandas as pd
 from loguru import logger
 
-from ..dataverse import search_dataverse, upload_dataset
-from ..utils import pformat_resp, pformat_yaml, yaml
+from ..dataverse import publish_datasets, search_dataverse, upload_dataset
+from ..catalog import DataverseCatalog
+from ..checksum import ChecksumCache
+from ..download import download_dataset
+from ..journal import UploadJournal
+from ..plan import (
+    UploadPlan, execute_plan, make_plan, update_output_versions)
+from ..streaming import ProgressLogger
+from ..utils import lazy_pformat_resp, lazy_pformat_yaml, pformat_yaml, yaml
 from pathlib import Path
 
 
@@ -29,9 +36,9 @@ def cmd_dataset_list(ctxobj, parent):
     api = ctxobj.dvpipe.dataverse.native_api
     # parent info
     resp = api.get_dataverse(parent)
-    logger.debug(f'query parent dataverse:\n{pformat_resp(resp)}')
+    logger.debug('query parent dataverse:\n{}', lazy_pformat_resp(resp))
     data = resp.json().pop("data")
-    logger.debug(f"parent dataverse metadata:\n{pformat_yaml(data)}")
+    logger.debug("parent dataverse metadata:\n{}", lazy_pformat_yaml(data))
     # get children
     datasets = api.get_children(
         parent=parent, parent_type='dataverse',
@@ -43,6 +50,40 @@ def cmd_dataset_list(ctxobj, parent):
         print(df)
 
 
+@cmd_dataset.command('catalog')
+@click.option(
+    '--parent', '-p',
+    default=None,
+    metavar='ID',
+    help='The id of parent dataverse. Default is the one of the last sync.',
+    )
+@click.option(
+    '--catalog', '-c', 'catalog_file',
+    type=click.Path(file_okay=True, dir_okay=False),
+    required=True,
+    metavar='FILE',
+    help='Path to the catalog file.',
+    )
+@click.option(
+    '--no_sync', '-n',
+    is_flag=True,
+    default=False,
+    help='If set, list the datasets in the catalog without syncing.',
+    )
+@click.pass_obj
+def cmd_dataset_catalog(ctxobj, parent, catalog_file, no_sync):
+    """Sync the local catalog of datasets in a dataverse and list them."""
+    catalog = DataverseCatalog(catalog_file)
+    if not no_sync:
+        stats = catalog.sync(ctxobj.dvpipe.dataverse, subtree=parent)
+        logger.info("synced catalog:\n{}", lazy_pformat_yaml(stats))
+    df = pd.DataFrame.from_records(catalog.get_datasets())
+    if len(df) == 0:
+        print(f"No dataset found in catalog {catalog_file}")
+    else:
+        print(df)
+
+
 @cmd_dataset.command('search')
 @click.option(
     '--action_on_exist', '-a',
@@ -86,7 +127,10 @@ def cmd_dataset_search(ctxobj, action_on_exist, recursive_subtree, options):
             kwargs[k] = v
     # extract subtree args to filter on the returned items
     subtrees = kwargs['subtree']
-    result = search_dataverse(ctxobj.dvpipe.dataverse, **kwargs)
+    # all the pages are collected before any action is taken, because
+    # deleting items would shift the subsequent pages.
+    result = search_dataverse(
+        ctxobj.dvpipe.dataverse, all_pages=True, **kwargs)
     if result:
         print(result)
     else:
@@ -158,16 +202,64 @@ def cmd_dataset_search(ctxobj, action_on_exist, recursive_subtree, options):
     default=False,
     help='If set, only metadata is handled and files are ignored.',
     )
+@click.option(
+    '--jobs', '-j',
+    type=click.IntRange(min=1),
+    default=1,
+    help='The number of files to upload in parallel.',
+    )
+@click.option(
+    '--checksum_cache',
+    type=click.Path(file_okay=True, dir_okay=False),
+    default=None,
+    metavar='FILE',
+    help='Path to the checksum cache file.',
+    )
+@click.option(
+    '--direct_upload', '-d',
+    is_flag=True,
+    default=False,
+    help='If set, files are uploaded directly to the S3 store.',
+    )
+@click.option(
+    '--no_journal',
+    is_flag=True,
+    default=False,
+    help='If set, the upload journal is not used to resume uploads.',
+    )
+@click.option(
+    '--catalog', '-c', 'catalog_file',
+    type=click.Path(
+        exists=True,
+        file_okay=True, dir_okay=False),
+    default=None,
+    metavar='FILE',
+    help='Path to the catalog file to look up existing datasets.',
+    )
 @click.pass_obj
 def cmd_dataset_upload(
-        ctxobj, parent, index_file, action_on_exist, publish_type, metadata_only):
+        ctxobj, parent, index_file, action_on_exist, publish_type,
+        metadata_only, jobs, checksum_cache, direct_upload, no_journal,
+        catalog_file):
     """Create dataset in `parent` according to the content of `index_file`."""
     index_file = Path(index_file)
     with open(index_file, 'r') as fo:
         dataset_index = yaml.load(fo)
     output_index_file = index_file.parent.joinpath(index_file.stem + "_output.yaml")
     dataset_meta = dataset_index['meta']
-    logger.info(f"upload dataset:\n{pformat_yaml(dataset_meta)}")
+    logger.info("upload dataset:\n{}", lazy_pformat_yaml(dataset_meta))
+    if checksum_cache is not None:
+        checksum_cache = ChecksumCache(checksum_cache)
+    if no_journal:
+        journal = None
+    else:
+        journal = UploadJournal(
+            index_file.parent.joinpath(index_file.stem + "_journal.sqlite"))
+        logger.info(f"use upload journal {journal.filepath}")
+    if catalog_file is not None:
+        catalog = DataverseCatalog(catalog_file)
+    else:
+        catalog = None
     upload_dataset(
         ctxobj.dvpipe.dataverse,
         parent_id=parent,
@@ -175,4 +267,326 @@ def cmd_dataset_upload(
         action_on_exist=action_on_exist,
         publish_type=publish_type,
         metadata_only=metadata_only,
-        output=output_index_file)
+        output=output_index_file,
+        max_workers=jobs,
+        checksum_cache=checksum_cache,
+        direct_upload=direct_upload,
+        journal=journal,
+        catalog=catalog)
+    ctxobj.dvpipe.dataverse.log_connection_stats()
+
+
+@cmd_dataset.command('plan')
+@click.option(
+    '--parent', '-p',
+    default=':root',
+    metavar='ID',
+    help='The id of parent dataverse.',
+    )
+@click.option(
+    '--index_file', '-i', 'index_files',
+    type=click.Path(
+        exists=True,
+        file_okay=True, dir_okay=False,
+        readable=True),
+    multiple=True,
+    required=True,
+    metavar='FILE',
+    help='YAML file path that defines the dataset content. Can be repeated.',
+    )
+@click.option(
+    '--action_on_exist', '-a',
+    type=click.Choice(
+        ['none', 'update', 'create'],
+        case_sensitive=False),
+    default='none',
+    help='The action to take when the dataset exists',
+    )
+@click.option(
+    '--publish_type', '-b',
+    type=click.Choice(
+        ['none', 'major', 'minor', 'updatecurrent'],
+        case_sensitive=False),
+    default='none',
+    help='Specify how the dataset is published ("none" for not publish).',
+    )
+@click.option(
+    '--metadata_only', '-m',
+    is_flag=True,
+    default=False,
+    help='If set, only metadata is handled and files are ignored.',
+    )
+@click.option(
+    '--checksum_cache',
+    type=click.Path(file_okay=True, dir_okay=False),
+    default=None,
+    metavar='FILE',
+    help='Path to the checksum cache file.',
+    )
+@click.option(
+    '--direct_upload', '-d',
+    is_flag=True,
+    default=False,
+    help='If set, files are uploaded directly to the S3 store.',
+    )
+@click.option(
+    '--catalog', '-c', 'catalog_file',
+    type=click.Path(
+        exists=True,
+        file_okay=True, dir_okay=False),
+    default=None,
+    metavar='FILE',
+    help='Path to the catalog file to look up existing datasets.',
+    )
+@click.option(
+    '--output', '-o',
+    type=click.Path(file_okay=True, dir_okay=False),
+    default=None,
+    metavar='FILE',
+    help='If set, the plan is written to this YAML file.',
+    )
+@click.option(
+    '--execute', '-x',
+    is_flag=True,
+    default=False,
+    help='If set, the plan is executed.',
+    )
+@click.option(
+    '--jobs', '-j',
+    type=click.IntRange(min=1),
+    default=1,
+    help='The number of files of each dataset to upload in parallel.',
+    )
+@click.option(
+    '--dataset_jobs', '-J',
+    type=click.IntRange(min=1),
+    default=4,
+    help='The number of datasets to upload in parallel.',
+    )
+@click.pass_obj
+def cmd_dataset_plan(
+        ctxobj, parent, index_files, action_on_exist, publish_type,
+        metadata_only, checksum_cache, direct_upload, catalog_file,
+        output, execute, jobs, dataset_jobs):
+    """Plan the upload of datasets in `parent` and optionally execute it."""
+    dataset_indices = list()
+    for index_file in index_files:
+        with open(index_file, 'r') as fo:
+            dataset_indices.append(yaml.load(fo))
+    if checksum_cache is not None:
+        checksum_cache = ChecksumCache(checksum_cache)
+    if catalog_file is not None:
+        catalog = DataverseCatalog(catalog_file)
+    else:
+        catalog = None
+    dv_config = ctxobj.dvpipe.dataverse
+    plan = make_plan(
+        dv_config,
+        parent_id=parent,
+        dataset_indices=dataset_indices,
+        action_on_exist=action_on_exist,
+        metadata_only=metadata_only,
+        publish_type=publish_type,
+        direct_upload=direct_upload,
+        checksum_cache=checksum_cache,
+        catalog=catalog)
+    for index_file, dataset_plan in zip(index_files, plan.datasets):
+        index_file = Path(index_file)
+        dataset_plan.output = index_file.parent.joinpath(
+            index_file.stem + "_output.yaml")
+    plan_dict = plan.to_dict()
+    if output is not None:
+        with open(output, 'w') as fo:
+            yaml.dump(plan_dict, fo)
+        logger.info(f"plan written to: {output}")
+    else:
+        print(pformat_yaml([
+            {k: v for k, v in d.items() if k != 'dataset_index'}
+            for d in plan_dict['datasets']]))
+    logger.info("plan summary:\n{}", lazy_pformat_yaml(plan_dict['summary']))
+    if not execute:
+        return
+    execute_plan(
+        dv_config, plan,
+        max_datasets=dataset_jobs,
+        max_workers=jobs,
+        checksum_cache=checksum_cache)
+    dv_config.log_connection_stats()
+
+
+@cmd_dataset.command('execute')
+@click.option(
+    '--plan_file', '-f',
+    type=click.Path(
+        exists=True,
+        file_okay=True, dir_okay=False,
+        readable=True),
+    required=True,
+    metavar='FILE',
+    help='YAML file of the plan written by "dataset plan -o".',
+    )
+@click.option(
+    '--checksum_cache',
+    type=click.Path(file_okay=True, dir_okay=False),
+    default=None,
+    metavar='FILE',
+    help='Path to the checksum cache file.',
+    )
+@click.option(
+    '--jobs', '-j',
+    type=click.IntRange(min=1),
+    default=1,
+    help='The number of files of each dataset to upload in parallel.',
+    )
+@click.option(
+    '--dataset_jobs', '-J',
+    type=click.IntRange(min=1),
+    default=4,
+    help='The number of datasets to upload in parallel.',
+    )
+@click.pass_obj
+def cmd_dataset_execute(ctxobj, plan_file, checksum_cache, jobs, dataset_jobs):
+    """Execute the upload plan in `plan_file`."""
+    with open(plan_file, 'r') as fo:
+        plan = UploadPlan.from_dict(yaml.load(fo))
+    logger.info("plan summary:\n{}", lazy_pformat_yaml(plan.summary()))
+    if checksum_cache is not None:
+        checksum_cache = ChecksumCache(checksum_cache)
+    dv_config = ctxobj.dvpipe.dataverse
+    execute_plan(
+        dv_config, plan,
+        max_datasets=dataset_jobs,
+        max_workers=jobs,
+        checksum_cache=checksum_cache)
+    dv_config.log_connection_stats()
+
+
+@cmd_dataset.command('publish')
+@click.option(
+    '--index_file', '-i', 'index_files',
+    type=click.Path(
+        exists=True,
+        file_okay=True, dir_okay=False,
+        readable=True),
+    multiple=True,
+    metavar='FILE',
+    help='Output YAML file of uploaded dataset, which gets the versions '
+         'updated. Can be repeated.',
+    )
+@click.option(
+    '--publish_type', '-b',
+    type=click.Choice(
+        ['major', 'minor', 'updatecurrent'],
+        case_sensitive=False),
+    default='major',
+    help='Specify how the datasets are published.',
+    )
+@click.option(
+    '--jobs', '-j',
+    type=click.IntRange(min=1),
+    default=8,
+    help='The number of datasets to publish in parallel.',
+    )
+@click.option(
+    '--lock_timeout',
+    type=float,
+    default=600.,
+    help='The max time in seconds to wait for each dataset to be unlocked.',
+    )
+@click.argument(
+    'pids', nargs=-1,
+    metavar='PID',
+    )
+@click.pass_obj
+def cmd_dataset_publish(
+        ctxobj, index_files, publish_type, jobs, lock_timeout, pids):
+    """Publish the datasets of `pids` and `index_files` in parallel."""
+    outputs = dict()
+    for index_file in index_files:
+        with open(index_file, 'r') as fo:
+            dataset_index = yaml.load(fo)
+        outputs[dataset_index['meta']['dataset']['pid']] = index_file
+    pids = list(dict.fromkeys(list(pids) + list(outputs.keys())))
+    if not pids:
+        raise click.BadParameter(
+            "no dataset to publish, specify PIDs or index files.")
+    dv_config = ctxobj.dvpipe.dataverse
+    versions = publish_datasets(
+        dv_config, pids,
+        publish_type=publish_type,
+        max_concurrency=jobs,
+        lock_timeout=lock_timeout)
+    latest = list()
+    for pid, v in versions.items():
+        if pid in outputs:
+            update_output_versions(outputs[pid], v)
+            logger.info(f"output yaml written to: {outputs[pid]}")
+        # the versions are listed with the latest first
+        latest.append({
+            k: v[k][0] for k in [
+                "datasetPersistentId", "versionNumber",
+                "versionMinorNumber", "versionState", "lastUpdateTime"]})
+    print(pd.DataFrame.from_records(latest))
+    dv_config.log_connection_stats()
+
+
+@cmd_dataset.command('download')
+@click.option(
+    '--output_dir', '-o',
+    type=click.Path(file_okay=False, dir_okay=True),
+    default='.',
+    metavar='DIR',
+    help='The directory to download the files to.',
+    )
+@click.option(
+    '--version', '-V',
+    default=':latest',
+    help='The version of the dataset.',
+    )
+@click.option(
+    '--pattern', '-f', 'patterns',
+    multiple=True,
+    metavar='GLOB',
+    help='If set, only files with path <directoryLabel>/<label> matching '
+         'the pattern are downloaded. Can be repeated.',
+    )
+@click.option(
+    '--jobs', '-j',
+    type=click.IntRange(min=1),
+    default=4,
+    help='The number of files to download in parallel.',
+    )
+@click.option(
+    '--checksum_cache',
+    type=click.Path(file_okay=True, dir_okay=False),
+    default=None,
+    metavar='FILE',
+    help='Path to the checksum cache file.',
+    )
+@click.argument(
+    'pids', nargs=-1,
+    required=True,
+    metavar='PID',
+    )
+@click.pass_obj
+def cmd_dataset_download(
+        ctxobj, output_dir, version, patterns, jobs, checksum_cache, pids):
+    """Download the files of datasets `pids` to `output_dir`."""
+    if checksum_cache is not None:
+        checksum_cache = ChecksumCache(checksum_cache)
+    dv_config = ctxobj.dvpipe.dataverse
+    results = list()
+    for pid in pids:
+        results.extend(download_dataset(
+            dv_config, pid, output_dir,
+            version=version,
+            patterns=patterns,
+            max_workers=jobs,
+            checksum_cache=checksum_cache,
+            progress_callback=ProgressLogger(level='INFO')))
+    df = pd.DataFrame.from_records(results)
+    if len(df) == 0:
+        print("No file found to download")
+    else:
+        print(df)
+    dv_config.log_connection_stats()
@@ -2,7 +2,7 @@ from loguru import logger
 import click
 import pandas as pd
 
-from ..utils import pformat_yaml, pformat_resp
+from ..utils import lazy_pformat_resp, pformat_yaml
 
 
 @click.group(
@@ -15,7 +15,7 @@ def cmd_user(ctxobj, ):
     api = ctxobj.dvpipe.dataverse.native_api
     url = f"{api.base_url_api_native}/users/:me"
     resp = api.get_request(url, auth=True)
-    logger.debug(f'query current user:\n{pformat_resp(resp)}')
+    logger.debug('query current user:\n{}', lazy_pformat_resp(resp))
     data = resp.json().pop("data")
     print(pformat_yaml(data))
 
@@ -31,7 +31,7 @@ def cmd_user_list(ctxobj):
         })
     data = resp.json().pop('data')
     users = data.pop('users')
-    logger.debug(f'query all users:\n{pformat_resp(resp)}')
-    logger.debug(f'metadata:\n{data}')
+    logger.debug('query all users:\n{}', lazy_pformat_resp(resp))
+    logger.debug('metadata:\n{}', data)
     df = pd.DataFrame.from_records(users)
     print(df)
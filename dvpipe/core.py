@@ -3,34 +3,49 @@ from pydantic import BaseModel, BaseSettings
 from pydantic_yaml import YamlModelMixin
 from typing import Optional, Dict
 
-from pyDataverse.api import DataAccessApi, NativeApi, MetricsApi, SearchApi
+from .session import (
+    HttpConfig, get_pooled_api, get_executor, connection_stats)
+from .utils import lazy_pformat_yaml
 
 
 class DataverseConfig(BaseModel):
     """The config class for the dataverse instance."""
     api_token: str
     base_url: str
+    http: HttpConfig = HttpConfig()
 
     def get_api(self, type):
         """Return the pyDataverse.Api instance of `type`.
 
+        The instances are created once per process and share a keep-alive
+        connection pool configured by `http`.
+
         Parameters
         ----------
         type : {'data_access', 'native', 'metrics', 'search'}
             The type of API.
         """
-        dispatch_type = {
-            'data_access': DataAccessApi,
-            'native': NativeApi,
-            'metrics': MetricsApi,
-            'search': SearchApi
-            }
-        api_cls = dispatch_type.get(type, None)
-        if api_cls is None:
-            raise ValueError(f"Invalid api type {type}")
-        api = api_cls(base_url=self.base_url, api_token=self.api_token)
-        logger.debug(f"created dataverse api instance: {api}")
-        return api
+        return get_pooled_api(
+            type,
+            base_url=self.base_url,
+            api_token=self.api_token,
+            http_config=self.http,
+            )
+
+    @property
+    def executor(self):
+        """The thread pool executor to run requests concurrently."""
+        return get_executor(self.http)
+
+    def connection_stats(self):
+        """Return the counts of requests sent and connections opened."""
+        return connection_stats(self.http)
+
+    def log_connection_stats(self, level="INFO"):
+        """Log the connection stats at `level`."""
+        logger.log(
+            level, "connection stats:\n{}",
+            lazy_pformat_yaml(self.connection_stats()))
 
     @property
     def data_access_api(self):
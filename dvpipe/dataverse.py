@@ -1,19 +1,38 @@
+import asyncio
+import hashlib
+import mimetypes
 import os
-import zipfile
+import re
 from loguru import logger
 
-from astropy.table import Table
 from copy import deepcopy
-from dataclasses import dataclass
+from urllib.parse import quote
+from dataclasses import dataclass, field
 
 from pyDataverse.models import Dataset as _DVDataset
 from pyDataverse.models import Datafile as _DVDatafile
-from typing import Literal
+from typing import Callable, Literal, Optional
 
 import json
 import numpy as np
-from .utils import pformat_resp, pformat_yaml, yaml
+from pathlib import PurePath
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+from ._async import call, run_sync
+from .utils import (
+    lazy_pformat_json, lazy_pformat_resp, lazy_pformat_yaml,
+    pformat_resp, yaml)
 from .core import DataverseConfig
+from .checksum import (
+    ChecksumCache, compute_checksum, get_remote_checksum, is_same_file)
+from .direct_upload import upload_single, upload_multipart
+from .journal import UploadJournal
+from .manifest import DatafileManifest
+from .result import ResultTable
+from .streaming import MultipartEncoder, ProgressLogger, StoredZipStream
 
 
 # replace numpy.bool_ with bool
@@ -27,22 +46,80 @@ class CustomJSONizer(json.JSONEncoder):
         )
 
 
-def _json_dumps(data):
+def _json_default(obj):
+    if isinstance(obj, np.bool_):
+        # same as CustomJSONizer
+        return json.dumps(bool(obj))
+    if isinstance(obj, np.generic):
+        # numpy scalars are sent as the python numbers
+        return obj.item()
+    if isinstance(obj, float):
+        return float(obj)
+    if isinstance(obj, PurePath):
+        return obj.as_posix()
+    return str(obj)
+
+
+def _json_dumps(data, indent=None):
+    """Return the JSON of `data` as bytes.
+
+    orjson is used if installed. Paths and numpy scalars are handled, and
+    other unknown types are converted with `str`.
+    """
+    if orjson is not None:
+        option = (
+            orjson.OPT_NON_STR_KEYS
+            | orjson.OPT_PASSTHROUGH_DATETIME
+            | orjson.OPT_PASSTHROUGH_DATACLASS)
+        if indent is not None:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(data, default=_json_default, option=option)
     return json.dumps(
-        data, indent=2, cls=CustomJSONizer, default=str, ensure_ascii=False
-    )
+        data, indent=indent, default=_json_default, ensure_ascii=False
+    ).encode("utf-8")
 
 
 class DVDataset(_DVDataset):
     """A class to handle dataverse dataset.
 
     This enables the handling of extra metadata block.
+
+    The dataset payload is built once and cached, along with its
+    serialized form, until any attribute is set. Note that the values
+    modified in place are not detected, so they have to be set again.
     """
 
-    def json(self, **kwargs):
-        logger.debug(f"generate json for standard dataset")
-        data = json.loads(super().json(**kwargs))
-        data["datasetVersion"].update(
+    __slots__ = ("_payload", "_payload_json", "_payload_validated")
+
+    def __setattr__(self, name, value):
+        if name not in self.__slots__:
+            self._invalidate()
+        super().__setattr__(name, value)
+
+    def _invalidate(self):
+        object.__setattr__(self, "_payload", None)
+        object.__setattr__(self, "_payload_json", None)
+        object.__setattr__(self, "_payload_validated", False)
+
+    def to_dict(self, validate=False):
+        """Return the dataset payload for the dataverse API.
+
+        The returned dict is shared with the cache and should not be
+        modified.
+
+        Parameters
+        ----------
+        validate : bool
+            If True, the standard metadata are validated against the
+            pyDataverse JSON schema.
+        """
+        payload = getattr(self, "_payload", None)
+        if payload is not None and (
+                not validate or self._payload_validated):
+            return payload
+        logger.debug("generate json for standard dataset")
+        payload = json.loads(super().json(validate=validate))
+        payload["datasetVersion"].update(
             {
                 "license": {
                     "name": "CC0 1.0",
@@ -55,85 +132,262 @@ class DVDataset(_DVDataset):
         )
         for key, item in self.get().get('metadata_blocks', {}).items():
             logger.debug(f"generate json for custom metadata block {key}")
-            data["datasetVersion"]["metadataBlocks"][key] = item
-        return json.dumps(
-            data, indent=2, cls=CustomJSONizer, default=str, ensure_ascii=False
-        )
-        # return data_str.replace('\uFFFD', '?')
+            payload["datasetVersion"]["metadataBlocks"][key] = item
+        object.__setattr__(self, "_payload", payload)
+        object.__setattr__(self, "_payload_json", None)
+        object.__setattr__(self, "_payload_validated", validate)
+        return payload
+
+    def to_json_bytes(self, validate=False):
+        """Return the serialized dataset payload as bytes."""
+        payload = self.to_dict(validate=validate)
+        if self._payload_json is None:
+            object.__setattr__(self, "_payload_json", _json_dumps(payload))
+        return self._payload_json
+
+    def json(self, validate=True, **kwargs):
+        return self.to_json_bytes(validate=validate).decode("utf-8")
 
 
 class DVDatafile(_DVDatafile):
     """A class to handle dataverse data files."""
 
 
-def search_dataverse(dv_config, **kwargs):
+def _search_page(dv_config, **kwargs):
+    """Return the items and the response metadata of one search page."""
+    api = dv_config.search_api
+    resp = api.search(**kwargs)
+    logger.debug("search query:\n{}", lazy_pformat_resp(resp))
+    data = resp.json().pop("data")
+    items = data.pop("items")
+    logger.debug("metadata:\n{}", data)
+    return items, data
+
+
+def _make_result(items, data):
+    # an empty result still holds the metadata
+    return ResultTable.from_items(items, meta={"response_data": data})
+
+
+def _get_next_start(start, items, data):
+    """Return the start of the next search page, or None if no more."""
+    start += len(items)
+    if not items or start >= data.get("total_count", 0):
+        return None
+    return start
+
+
+async def iter_search_dataverse_async(
+        dv_config, per_page=1000, prefetch=True, **kwargs):
+    """Async version of `iter_search_dataverse`."""
+    logger.debug("iter search dataverse with kwargs:\n{}", lazy_pformat_yaml(kwargs))
+    start = kwargs.pop("start", None) or 0
+
+    def _fetch(start):
+        return asyncio.ensure_future(call(
+            dv_config, _search_page, dv_config,
+            start=start, per_page=per_page, **kwargs))
+
+    task = _fetch(start)
+    try:
+        while task is not None:
+            items, data = await task
+            task = None
+            start = _get_next_start(start, items, data)
+            if start is not None and prefetch:
+                task = _fetch(start)
+            for item in items:
+                yield item
+            if start is not None and not prefetch:
+                task = _fetch(start)
+    finally:
+        if task is not None:
+            task.cancel()
+
+
+def iter_search_dataverse(dv_config, per_page=1000, prefetch=True, **kwargs):
+    """Iterate through all the items of the search results.
+
+    The result pages are requested with the ``start`` and ``per_page``
+    parameters until the total count of the search is reached.
+
+    Parameters
+    ----------
+    dv_config : dvpipe.core.DataverseConfig
+        The dataverse connection config.
+    per_page : int
+        The number of items per page. Dataverse allows at most 1000.
+    prefetch : bool
+        If True, the next page is requested while the items of the
+        current page are consumed.
+    **kwargs :
+        The arguments passed to `pyDataverse.SearchApi.search`.
+
+    Yields
+    ------
+    dict
+        The search result items.
+    """
+    logger.debug("iter search dataverse with kwargs:\n{}", lazy_pformat_yaml(kwargs))
+    start = kwargs.pop("start", None) or 0
+    executor = dv_config.executor
+
+    def _fetch(start):
+        return executor.submit(
+            _search_page, dv_config, start=start, per_page=per_page, **kwargs)
+
+    future = _fetch(start)
+    try:
+        while future is not None:
+            items, data = future.result()
+            future = None
+            start = _get_next_start(start, items, data)
+            if start is not None and prefetch:
+                future = _fetch(start)
+            yield from items
+            if start is not None and not prefetch:
+                future = _fetch(start)
+    finally:
+        if future is not None:
+            future.cancel()
+
+
+async def search_dataverse_async(dv_config, all_pages=False, **kwargs):
+    """Async version of `search_dataverse`."""
+    logger.debug("search dataverse with kwargs:\n{}", lazy_pformat_yaml(kwargs))
+    items, data = await call(dv_config, _search_page, dv_config, **kwargs)
+    start = kwargs.pop("start", None) or 0
+    if all_pages:
+        start = _get_next_start(start, items, data)
+        if start is not None:
+            kwargs.setdefault("per_page", len(items))
+            items = items + [
+                item async for item in iter_search_dataverse_async(
+                    dv_config, start=start, **kwargs)]
+    return _make_result(items, data)
+
+
+def search_dataverse(dv_config, all_pages=False, **kwargs):
     """Search the dataverse.
 
     Parameters
     ----------
     dv_config : dvpipe.core.DataverseConfig
         The dataverse connection config.
+    all_pages : bool
+        If True, the items of all the result pages are returned. Otherwise
+        only the page specified by ``start`` and ``per_page`` is returned.
     **kwargs :
         The arguments passed to `pyDataverse.SearchApi.search`.
 
     Returns
     -------
-    df : The data frame containing the result.
+    dvpipe.result.ResultTable
+        The columnar result, which can be converted with ``to_table`` or
+        ``to_pandas``.
     """
-    logger.debug(f"search dataverse with kwargs:\n{pformat_yaml(kwargs)}")
+    return run_sync(
+        search_dataverse_async(dv_config, all_pages=all_pages, **kwargs))
 
-    api = dv_config.search_api
-    resp = api.search(**kwargs)
-    logger.debug(f"search query:\n{pformat_resp(resp)}")
-    data = resp.json().pop("data")
-    items = data.pop("items")
-    logger.debug(f"metadata:\n{data}")
-    if not items:
-        # we return an empty table to hold the metadata anyway
-        tbl = Table()
-    else:
-        tbl = Table(rows=items)  # , dtype=[object] * max(len(item) for item in items))
-    tbl.meta["response_data"] = data
-    return tbl
 
+def _make_title_query(titles):
+    """Return the search query string that matches any of `titles`."""
+    terms = list()
+    for title in titles:
+        title = title.replace("\\", "\\\\").replace('"', '\\"')
+        terms.append(f'title:"{title}"')
+    # the query is appended to the url as is by pyDataverse
+    return quote(" OR ".join(terms), safe=':"*')
 
-def get_datafiles(dv_config, dataset_id, version=":latest"):
-    """Return the files in dataset.
+
+async def resolve_dataset_pids_async(
+        dv_config, parent_id, dataset_indices, chunk_size=50):
+    """Async version of `resolve_dataset_pids`."""
+    titles = list(dict.fromkeys(
+        dataset_index["dataset"]["title"] for dataset_index in dataset_indices))
+    chunks = [
+        titles[i:i + chunk_size] for i in range(0, len(titles), chunk_size)]
+    logger.debug(
+        f"resolve {len(titles)} dataset titles in {len(chunks)} searches")
+
+    async def _resolve(chunk):
+        items = list()
+        async for item in iter_search_dataverse_async(
+                dv_config,
+                q_str=_make_title_query(chunk),
+                data_type="dataset",
+                subtree=parent_id,
+                sort="date",
+                order="desc",
+                ):
+            items.append(item)
+        return items
+
+    results = {title: list() for title in titles}
+    for items in await asyncio.gather(*(_resolve(chunk) for chunk in chunks)):
+        for item in items:
+            # the phrase query also matches titles containing the phrase
+            pids = results.get(item.get("name", None), None)
+            if pids is not None:
+                pids.append(str(item["global_id"]))
+    return results
+
+
+def resolve_dataset_pids(dv_config, parent_id, dataset_indices, chunk_size=50):
+    """Find the existing datasets of many dataset indices at once.
+
+    The titles are searched with OR-ed queries of `chunk_size` titles, in
+    parallel.
 
     Parameters
     ----------
     dv_config : dvpipe.core.DataverseConfig
         The dataverse connection config.
-    dataset_id : str
-        The persistent id of the dataset.
-    version : str, optional
-        The version of the dataset. Default is ':latest'
+    parent_id : str
+        The identifier of the parent dataverse.
+    dataset_indices : list
+        The dataset index dicts.
+    chunk_size : int
+        The max number of titles in one search query.
+
     Returns
     -------
-    df : The data frame containing the result.
+    dict
+        The pids of the datasets keyed by the titles, the latest first. The
+        value is an empty list if no dataset is found. It can be passed to
+        `upload_dataset` as `existing_pids`.
     """
-    logger.debug(f"get file list of dataset pid={dataset_id}")
+    return run_sync(resolve_dataset_pids_async(
+        dv_config, parent_id, dataset_indices, chunk_size=chunk_size))
+
 
+def get_datafile_items(dv_config, dataset_id, version=":latest"):
+    """Return the file items and the response metadata of a dataset."""
     api = dv_config.native_api
     url = (
         f"{api.base_url_api}/datasets/:persistentId/versions/"
         f"{version}/files?persistentId={dataset_id}"
     )
     resp = api.get_request(url, auth=True)
-    logger.debug(f"data files query:\n{pformat_resp(resp)}")
+    logger.debug("data files query:\n{}", lazy_pformat_resp(resp))
     data = resp.json()
     items = data.pop("data")
-    logger.debug(f"metadata:\n{data}")
-    if not items:
-        # we return an empty table to hold the metadata anyway
-        tbl = Table()
-    else:
-        tbl = Table(rows=items, dtype=[object] * len(items[0]))
-    tbl.meta["response_data"] = data
-    return tbl
+    logger.debug("metadata:\n{}", data)
+    return items, data
 
 
-def get_versions(dv_config, dataset_id, include_files=False, include_metadata=False):
+async def get_datafiles_async(
+        dv_config, dataset_id, version=":latest", manifest=False):
+    """Async version of `get_datafiles`."""
+    logger.debug(f"get file list of dataset pid={dataset_id}")
+    items, data = await call(
+        dv_config, get_datafile_items, dv_config, dataset_id, version=version)
+    if manifest:
+        return DatafileManifest.from_items(items, meta=data)
+    return _make_result(items, data)
+
+
+def get_datafiles(dv_config, dataset_id, version=":latest", manifest=False):
     """Return the files in dataset.
 
     Parameters
@@ -142,19 +396,31 @@ def get_versions(dv_config, dataset_id, include_files=False, include_metadata=Fa
         The dataverse connection config.
     dataset_id : str
         The persistent id of the dataset.
+    version : str, optional
+        The version of the dataset. Default is ':latest'
+    manifest : bool
+        If True, a `dvpipe.manifest.DatafileManifest` indexed by
+        ``(directoryLabel, label)`` is returned instead.
     Returns
     -------
-    df : The data frame containing the result.
+    dvpipe.result.ResultTable
+        The columnar result, which can be converted with ``to_table`` or
+        ``to_pandas``.
     """
-    logger.debug(f"get version list of dataset pid={dataset_id}")
+    return run_sync(get_datafiles_async(
+        dv_config, dataset_id, version=version, manifest=manifest))
 
+
+def get_version_items(
+        dv_config, dataset_id, include_files=False, include_metadata=False):
+    """Return the version items and the response metadata of a dataset."""
     api = dv_config.native_api
     url = (
         f"{api.base_url_api}/datasets/:persistentId/versions"
         f"?persistentId={dataset_id}"
     )
     resp = api.get_request(url, auth=True)
-    logger.debug(f"dataset version query:\n{pformat_resp(resp)}")
+    logger.debug("dataset version query:\n{}", lazy_pformat_resp(resp))
     data = resp.json()
     items = data.pop("data")
     for item in items:
@@ -162,96 +428,654 @@ def get_versions(dv_config, dataset_id, include_files=False, include_metadata=Fa
             del item["files"]
         if not include_metadata:
             del item["metadataBlocks"]
-    logger.debug(f"metadata:\n{data}")
-    if not items:
-        # we return an empty table to hold the metadata anyway
-        tbl = Table()
-    else:
-        tbl = Table(rows=items)  # , dtype=[object] * len(items[0]))
-    tbl.meta["response_data"] = data
-    return tbl
+    logger.debug("metadata:\n{}", data)
+    return items, data
+
+
+async def get_versions_async(
+        dv_config, dataset_id, include_files=False, include_metadata=False):
+    """Async version of `get_versions`."""
+    logger.debug(f"get version list of dataset pid={dataset_id}")
+    items, data = await call(
+        dv_config, get_version_items, dv_config, dataset_id,
+        include_files=include_files, include_metadata=include_metadata)
+    return _make_result(items, data)
+
+
+def get_versions(dv_config, dataset_id, include_files=False, include_metadata=False):
+    """Return the files in dataset.
+
+    Parameters
+    ----------
+    dv_config : dvpipe.core.DataverseConfig
+        The dataverse connection config.
+    dataset_id : str
+        The persistent id of the dataset.
+    Returns
+    -------
+    dvpipe.result.ResultTable
+        The columnar result, which can be converted with ``to_table`` or
+        ``to_pandas``.
+    """
+    return run_sync(get_versions_async(
+        dv_config, dataset_id,
+        include_files=include_files, include_metadata=include_metadata))
+
+
+def _normalize_metadata_value(value):
+    if isinstance(value, dict):
+        if "typeName" in value:
+            return _normalize_metadata_field(value)
+        # an entry of compound field keyed by the child type names
+        return {k: _normalize_metadata_value(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalize_metadata_value(v) for v in value]
+    if isinstance(value, (bool, np.bool_)):
+        return str(bool(value)).lower()
+    # the server returns all primitive values as strings
+    return str(value)
+
+
+def _normalize_metadata_field(field):
+    return {
+        "typeName": field["typeName"],
+        "multiple": bool(field.get("multiple", False)),
+        "typeClass": field.get("typeClass", None),
+        "value": _normalize_metadata_value(field.get("value", None)),
+    }
+
+
+def _is_empty_metadata_value(value):
+    # not compared with `in` so numpy values are not broadcast
+    return value is None or (isinstance(value, (str, list)) and not value)
+
+
+def get_metadata_hash(dataset_version):
+    """Return the hash of the metadata in `dataset_version`.
+
+    The metadata blocks are normalized such that the same metadata
+    submitted to and returned by the server have the same hash: only the
+    type name, class, multiplicity and values of the fields are kept, the
+    fields are sorted, and primitive values are compared as strings.
+
+    Parameters
+    ----------
+    dataset_version : dict
+        The "datasetVersion" of the dataset json, or the dataset version
+        returned by the server.
+
+    Returns
+    -------
+    str
+        The hex digest of the normalized metadata.
+    """
+    blocks = dict()
+    for name, block in (dataset_version.get("metadataBlocks", None) or {}).items():
+        fields = [
+            _normalize_metadata_field(f) for f in block.get("fields", [])
+            if not _is_empty_metadata_value(f.get("value", None))
+        ]
+        if fields:
+            blocks[name] = sorted(fields, key=lambda f: f["typeName"])
+    license = dataset_version.get("license", None)
+    if isinstance(license, dict):
+        license = license.get("name", None)
+    data = {
+        "metadataBlocks": blocks,
+        "license": license,
+        "termsOfAccess": dataset_version.get("termsOfAccess", None),
+        "fileAccessRequest": dataset_version.get("fileAccessRequest", None),
+    }
+    return hashlib.sha256(json.dumps(
+        data, sort_keys=True, separators=(",", ":"), ensure_ascii=False,
+        ).encode("utf-8")).hexdigest()
+
+
+def get_latest_version(dv_config, dataset_id):
+    """Return the latest version of the dataset, with the metadata."""
+    api = dv_config.native_api
+    url = (
+        f"{api.base_url_api_native}/datasets/:persistentId/versions/:latest"
+        f"?persistentId={dataset_id}"
+    )
+    resp = api.get_request(url, auth=True)
+    logger.debug("latest dataset version query:\n{}", lazy_pformat_resp(resp))
+    if not resp.ok:
+        raise ValueError(
+            f"Failed query latest version of dataset pid={dataset_id}:\n"
+            f"{pformat_resp(resp)}")
+    return resp.json()["data"]
+
+
+class DatasetLockedError(ValueError):
+    """Raised when a request is rejected because the dataset is locked."""
+
+
+_lock_error_pattern = re.compile(r"\block(ed)?\b", re.IGNORECASE)
+
+
+def _is_lock_error(resp):
+    """Return True if `resp` is a rejection due to dataset lock."""
+    if resp.ok:
+        return False
+    return (
+        resp.status_code == 409
+        or _lock_error_pattern.search(resp.text) is not None)
+
+
+def _get_registered_datafile(resp):
+    """Return the "dataFile" entry in the response of file add or replace."""
+    files = (resp.json().get("data", None) or {}).get("files", None) or [{}]
+    return files[0].get("dataFile", None) or {}
+
+
+def _check_datafile_resp(resp, action):
+    if _is_lock_error(resp):
+        raise DatasetLockedError(
+            f"Failed {action} datafile, dataset is locked:\n{pformat_resp(resp)}")
+    if not resp.ok:
+        raise ValueError(f"Failed {action} datafile:\n{pformat_resp(resp)}")
+
+
+async def _get_dataset_locks_async(dv_config, dataset_id):
+    """Return the list of locks of the dataset."""
+    api = dv_config.native_api
+    resp = await call(dv_config, api.get_dataset_lock, dataset_id)
+    if not resp.ok:
+        raise ValueError(
+            f"Failed query locks of dataset pid={dataset_id}:\n"
+            f"{pformat_resp(resp)}")
+    return resp.json().get("data", None) or []
+
+
+async def wait_for_dataset_unlock_async(
+        dv_config, dataset_id, poll_interval=1., max_poll_interval=30.,
+        timeout=600.):
+    """Wait until the dataset has no locks.
+
+    The locks are polled with exponential backoff starting from
+    `poll_interval` up to `max_poll_interval`.
+
+    Parameters
+    ----------
+    dv_config : dvpipe.core.DataverseConfig
+        The dataverse connection config.
+    dataset_id : str
+        The persistent id of the dataset.
+    poll_interval : float
+        The initial interval in seconds between polls.
+    max_poll_interval : float
+        The max interval in seconds between polls.
+    timeout : float
+        The max time in seconds to wait before `DatasetLockedError` is raised.
+    """
+    loop = asyncio.get_running_loop()
+    t_start = loop.time()
+    interval = poll_interval
+    while True:
+        locks = await _get_dataset_locks_async(dv_config, dataset_id)
+        if not locks:
+            return
+        lock_types = [lock.get("lockType", None) for lock in locks]
+        if loop.time() - t_start > timeout:
+            raise DatasetLockedError(
+                f"dataset pid={dataset_id} still locked after {timeout}s: "
+                f"{lock_types}"
+            )
+        logger.debug(
+            f"dataset pid={dataset_id} locked {lock_types}, "
+            f"retry in {interval}s"
+        )
+        await asyncio.sleep(interval)
+        interval = min(interval * 2, max_poll_interval)
+
+
+async def _call_with_lock_retry(
+        dv_config, dataset_id, func, *args, lock_timeout=600.,
+        retry_interval=1., max_retry_interval=30., max_unconfirmed=3,
+        **kwargs):
+    """Run `func` and retry after the dataset is unlocked if it was locked.
+
+    The lock is confirmed with the locks of the dataset before the retry.
+    The retries back off exponentially from `retry_interval` up to
+    `max_retry_interval`, and the error is raised after `max_unconfirmed`
+    consecutive rejections without a lock on the dataset.
+    """
+    loop = asyncio.get_running_loop()
+    t_start = loop.time()
+    interval = retry_interval
+    n_unconfirmed = 0
+    while True:
+        try:
+            return await call(dv_config, func, *args, **kwargs)
+        except DatasetLockedError as e:
+            t_left = lock_timeout - (loop.time() - t_start)
+            if t_left <= 0:
+                raise
+            if await _get_dataset_locks_async(dv_config, dataset_id):
+                n_unconfirmed = 0
+                logger.info(f"{e}\nwait for dataset pid={dataset_id} to unlock")
+                await wait_for_dataset_unlock_async(
+                    dv_config, dataset_id, timeout=t_left)
+            else:
+                n_unconfirmed += 1
+                if n_unconfirmed >= max_unconfirmed:
+                    raise
+                logger.info(
+                    f"{e}\nno lock found on dataset pid={dataset_id}, "
+                    f"retry in {interval}s")
+                await asyncio.sleep(min(interval, t_left))
+                interval = min(interval * 2, max_retry_interval)
+
+
+def _publish_dataset(dv_config, dataset_id, publish_type):
+    api = dv_config.native_api
+    resp = api.publish_dataset(dataset_id, release_type=publish_type)
+    logger.info("publish dataset pid={}: {}", dataset_id, lazy_pformat_resp(resp))
+    if _is_lock_error(resp):
+        raise DatasetLockedError(
+            f"Failed publish dataset pid={dataset_id}, dataset is locked:\n"
+            f"{pformat_resp(resp)}")
+    if not resp.ok:
+        raise ValueError(
+            f"Failed publish dataset pid={dataset_id}:\n{pformat_resp(resp)}")
+    return resp
+
+
+async def publish_dataset_async(
+        dv_config, dataset_id, publish_type="major", lock_timeout=600.):
+    """Publish the dataset and return the versions once it is finalized.
+
+    The publish request is retried when it is rejected due to dataset lock
+    (e.g., by ingest), and the finalize lock taken by dataverse after the
+    request is waited for, so that the versions returned are the published
+    ones.
+
+    Parameters
+    ----------
+    dv_config : dvpipe.core.DataverseConfig
+        The dataverse connection config.
+    dataset_id : str
+        The persistent id of the dataset.
+    publish_type : {'major', 'minor', 'updatecurrent'}
+        How the dataset is published.
+    lock_timeout : float
+        The max time in seconds to wait for the dataset to be unlocked.
+
+    Returns
+    -------
+    dvpipe.result.ResultTable
+        The versions of the dataset, as returned by `get_versions`.
+    """
+    await _call_with_lock_retry(
+        dv_config, dataset_id, _publish_dataset,
+        dv_config, dataset_id, publish_type, lock_timeout=lock_timeout)
+    await wait_for_dataset_unlock_async(
+        dv_config, dataset_id, timeout=lock_timeout)
+    return await get_versions_async(dv_config, dataset_id=dataset_id)
+
+
+async def publish_datasets_async(
+        dv_config, dataset_ids, publish_type="major", max_concurrency=8,
+        lock_timeout=600.):
+    """Async version of `publish_datasets`."""
+    dataset_ids = list(dataset_ids)
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def _publish(dataset_id):
+        async with semaphore:
+            return await publish_dataset_async(
+                dv_config, dataset_id, publish_type=publish_type,
+                lock_timeout=lock_timeout)
+
+    results = await asyncio.gather(
+        *(_publish(pid) for pid in dataset_ids), return_exceptions=True)
+    errors = [
+        (pid, r) for pid, r in zip(dataset_ids, results)
+        if isinstance(r, Exception)]
+    for pid, e in errors:
+        logger.error(f"failed publish dataset pid={pid}: {e}")
+    if errors:
+        error_info = "\n".join(f"{pid}: {e}" for pid, e in errors)
+        raise ValueError(
+            f"Failed publish {len(errors)} of {len(dataset_ids)} "
+            f"datasets:\n{error_info}")
+    return dict(zip(dataset_ids, results))
+
+
+def publish_datasets(
+        dv_config, dataset_ids, publish_type="major", max_concurrency=8,
+        lock_timeout=600.):
+    """Publish many datasets concurrently.
+
+    Each dataset is published with `publish_dataset_async`, so datasets
+    locked by ingest or finalization are waited for with backoff polling
+    instead of failing.
+
+    Parameters
+    ----------
+    dv_config : dvpipe.core.DataverseConfig
+        The dataverse connection config.
+    dataset_ids : list
+        The persistent ids of the datasets.
+    publish_type : {'major', 'minor', 'updatecurrent'}
+        How the datasets are published.
+    max_concurrency : int
+        The max number of datasets to publish in parallel.
+    lock_timeout : float
+        The max time in seconds to wait for each dataset to be unlocked.
+
+    Returns
+    -------
+    dict
+        The versions tables keyed by the dataset pids.
+    """
+    return run_sync(publish_datasets_async(
+        dv_config, dataset_ids, publish_type=publish_type,
+        max_concurrency=max_concurrency, lock_timeout=lock_timeout))
 
 
 @dataclass
 class FileUploader:
     """A base class for file uploader."""
-    dv_config: DataverseConfig 
+    dv_config: DataverseConfig
+
 
-       
 @dataclass
 class FileUploaderNative(FileUploader):
-    """The file uploader that uses the native api."""
+    """The file uploader that uses the native api.
+
+    The multipart request body is streamed from the file in chunks, so the
+    memory use does not depend on the file size. The upload progress is
+    reported to `progress_callback` with a `TransferProgress` object.
+    """
+    progress_callback: Optional[Callable] = field(
+        default_factory=ProgressLogger)
 
     def create(self, df):
-        df = self._normalize_file(df)
         api = self.dv_config.native_api
         df_json = df.json()
-        logger.debug(f"create file json:\n{df_json}")
-        resp = api.upload_datafile(df.pid, df.filename, df_json)
-        logger.info(f"create datafile:\n{pformat_resp(resp)}")
+        logger.debug("create file json:\n{}", lazy_pformat_json(df_json))
+        url = (
+            f"{api.base_url_api_native}/datasets/:persistentId/add"
+            f"?persistentId={df.pid}"
+        )
+        resp = self._post_file(url, df, df_json)
+        logger.info("create datafile:\n{}", lazy_pformat_resp(resp))
+        _check_datafile_resp(resp, "create")
         return resp
-       
+
     def replace(self, file_pid, df):
-        df = self._normalize_file(df)
         api = self.dv_config.native_api
         df_json = df.json()
-        logger.debug(f"replace file json:\n{df_json}")
-        resp = api.replace_datafile(
-            file_pid, df.filename, df_json, is_filepid=False)
+        logger.debug("replace file json:\n{}", lazy_pformat_json(df_json))
+        url = f"{api.base_url_api_native}/files/{file_pid}/replace"
+        resp = self._post_file(url, df, df_json)
         logger.info(
-            f"overwrite existing datafile:\n{pformat_resp(resp)}")
+            "overwrite existing datafile:\n{}", lazy_pformat_resp(resp))
+        _check_datafile_resp(resp, "replace")
         # update the restricted flag
         # this had to be done separately because the file replace
         # may fail
         url = f"{api.base_url_api_native}/files/{file_pid}/restrict"
-        resp = api.put_request(url, auth=True, data=json.dumps(df.restrict))
+        resp_restrict = api.put_request(
+            url, auth=True, data=json.dumps(df.restrict))
         logger.info(
-            f"update file restrict state:\n{pformat_resp(resp)}")
+            "update file restrict state:\n{}",
+            lazy_pformat_resp(resp_restrict))
+        return resp
+
+    def _post_file(self, url, df, df_json):
+        api = self.dv_config.native_api
+        with self._open_file(df.filename) as fo:
+            body = MultipartEncoder(
+                {
+                    "jsonData": df_json,
+                    "file": (os.path.basename(df.filename), fo),
+                },
+                callback=self.progress_callback,
+                name=df.filename,
+            )
+            return api.post_request(
+                url,
+                data=body,
+                headers={"Content-Type": body.content_type},
+                auth=True,
+            )
 
-    @classmethod
-    def _normalize_file(cls, df):
-        filename = df.filename
-        if filename.endswith(".zip"):
-            df.filename = cls._zip_zip(filename)
-        return df
-       
     @staticmethod
-    def _zip_zip(zip_path):
-        if not zip_path.lower().endswith('.zip') or not os.path.isfile(zip_path):
-            raise ValueError("Provided path is not a valid zip file")
-        
-        parent_dir = os.path.dirname(zip_path)
-        zip_filename = os.path.basename(zip_path)
-        
-        temp_dir = os.path.join(parent_dir, "_zip_zip")
-        os.makedirs(temp_dir, exist_ok=True)
-        
-        # Define the new zip file path
-        new_zip_path = os.path.join(temp_dir, f"{zip_filename}")
-        
-        # Zip the original zip file
-        with zipfile.ZipFile(new_zip_path, 'w', zipfile.ZIP_DEFLATED) as new_zip:
-            new_zip.write(zip_path, arcname=zip_filename)
-        return new_zip_path
+    def _open_file(filename):
+        # dataverse unpacks uploaded zip files, so zip files are wrapped in
+        # another zip to be kept as is.
+        if filename.lower().endswith(".zip"):
+            return StoredZipStream(filename)
+        return open(filename, "rb")
 
 
 @dataclass
 class DvUploaderWrapper(FileUploader):
-    """A wrapper that invokes DVUploader to upload files."""
+    """The file uploader that sends files directly to the object store.
+
+    The file content is uploaded to the presigned S3 URLs provided by
+    dataverse, in parallel parts for large files, so the data do not pass
+    through the dataverse app server. The file is registered with the
+    dataset afterwards. The storage of the dataset has to be configured
+    with direct upload enabled.
+
+    The part size of multipart uploads is decided by the server, see the
+    ``dataverse.files.<id>.min-part-size`` setting of the store.
+    """
+    max_part_workers: int = 4
+    checksum_cache: Optional[ChecksumCache] = None
+    journal: Optional[UploadJournal] = None
+
+    def _get_md5(self, filename):
+        if self.checksum_cache is not None:
+            return self.checksum_cache.get_checksums(filename)["md5"]
+        return compute_checksum(filename, algorithm="md5")
+
+    def upload_to_store(self, df):
+        """Upload the content of `df` to the object store.
+
+        If `journal` is set and has an unfinished multipart upload of the
+        file, the upload is continued from the parts acknowledged.
+
+        Returns
+        -------
+        dict
+            The file metadata to register the uploaded file with dataverse.
+        """
+        if self.journal is not None:
+            entry = self.journal.get(df.label, df.filename)
+            if (
+                    entry is not None
+                    and entry["state"] == "uploading"
+                    and entry["upload_info"] is not None):
+                logger.info(
+                    f"resume multipart upload of {df.filename}: "
+                    f"{len(entry['etags'])}/{len(entry['upload_info']['urls'])}"
+                    f" parts done")
+                try:
+                    return self._upload_to_store(
+                        df, entry["upload_info"], etags=entry["etags"])
+                except Exception as e:
+                    logger.warning(
+                        f"failed resume upload of {df.filename}, "
+                        f"restart: {e}")
+                    self._abort_multipart(entry["upload_info"])
+        return self._upload_to_store(df, self._request_upload_info(df))
+
+    def _request_upload_info(self, df):
+        api = self.dv_config.native_api
+        size = os.path.getsize(df.filename)
+        url = f"{api.base_url_api_native}/datasets/:persistentId/uploadurls"
+        resp = api.get_request(
+            url, params={"persistentId": df.pid, "size": size}, auth=True)
+        logger.debug("request upload urls:\n{}", lazy_pformat_resp(resp))
+        if not resp.ok:
+            raise ValueError(
+                f"Failed request upload urls of {df.filename}:\n"
+                f"{pformat_resp(resp)}")
+        upload_info = resp.json()["data"]
+        if self.journal is not None:
+            self.journal.set_state(df.label, df.filename, "uploading")
+            if "urls" in upload_info:
+                self.journal.set_upload_info(df.label, upload_info)
+        return upload_info
+
+    def _upload_to_store(self, df, upload_info, etags=None):
+        api = self.dv_config.native_api
+        filename = df.filename
+        timeout = self.dv_config.http.timeout
+        if "url" in upload_info:
+            upload_single(api.session, upload_info["url"], filename, timeout=timeout)
+        else:
+            if self.journal is not None:
+                def _on_part_done(part_number, etag):
+                    self.journal.add_etag(df.label, part_number, etag)
+            else:
+                _on_part_done = None
+            try:
+                etags = upload_multipart(
+                    api.session, upload_info["urls"], filename,
+                    part_size=upload_info["partSize"],
+                    max_workers=self.max_part_workers,
+                    timeout=timeout,
+                    etags=etags,
+                    callback=_on_part_done,
+                )
+                resp = api.put_request(
+                    f"{api.base_url}{upload_info['complete']}",
+                    data=json.dumps(etags), auth=True)
+                logger.debug("complete multipart upload:\n{}", lazy_pformat_resp(resp))
+                if not resp.ok:
+                    raise ValueError(
+                        f"Failed complete multipart upload:\n{pformat_resp(resp)}")
+            except Exception:
+                # keep the parts uploaded so far to resume from the journal
+                if self.journal is None:
+                    self._abort_multipart(upload_info)
+                raise
+        logger.info(
+            f"uploaded {filename} to store "
+            f"storageIdentifier={upload_info['storageIdentifier']}")
+        return self._make_file_meta(df, upload_info["storageIdentifier"])
+
+    def _abort_multipart(self, upload_info):
+        api = self.dv_config.native_api
+        resp = api.delete_request(
+            f"{api.base_url}{upload_info['abort']}", auth=True)
+        logger.debug("abort multipart upload:\n{}", lazy_pformat_resp(resp))
+
+    def _make_file_meta(self, df, storage_identifier):
+        mimetype = mimetypes.guess_type(df.filename)[0]
+        meta = {
+            "storageIdentifier": storage_identifier,
+            "fileName": os.path.basename(df.filename),
+            "mimeType": mimetype or "application/octet-stream",
+            "checksum": {"@type": "MD5", "@value": self._get_md5(df.filename)},
+        }
+        for key in ["label", "directoryLabel", "description", "categories", "restrict"]:
+            value = getattr(df, key, None)
+            if value is not None:
+                meta[key] = value
+        return meta
+
+    supports_bulk_register = True
+
+    def stage(self, df, file_pid=None):
+        """Upload the content of `df` to the store without registering it.
+
+        Parameters
+        ----------
+        df : DVDatafile
+            The datafile to upload.
+        file_pid : int, optional
+            If set, the staged file is to replace the file of this id.
+
+        Returns
+        -------
+        dict
+            The file metadata to be passed to `register`.
+        """
+        file_meta = self.upload_to_store(df)
+        if file_pid is not None:
+            file_meta["fileToReplaceId"] = file_pid
+            file_meta["forceReplace"] = True
+        return file_meta
+
+    def register(self, dataset_id, file_metas, replace=False):
+        """Register staged files of one kind of action with one request.
 
-    def __post_init__(self):
-        self._dv_uploader_path = self._ensuere_dv_uploader()
-    
-    def _ensure_dv_uploader():
-        return
+        Parameters
+        ----------
+        dataset_id : str
+            The persistent id of the dataset.
+        file_metas : list
+            The file metadata returned by `stage`.
+        replace : bool
+            If True, the files are registered as replacements, which
+            requires `stage` to be called with ``file_pid``.
+
+        Returns
+        -------
+        file_ids : dict
+            The ids of the files accepted keyed by the storage identifiers,
+            None if not reported by the server.
+        failed : dict
+            The error messages of the files rejected keyed by the storage
+            identifiers.
+        """
+        api = self.dv_config.native_api
+        endpoint = "replaceFiles" if replace else "addFiles"
+        url = (
+            f"{api.base_url_api_native}/datasets/:persistentId/{endpoint}"
+            f"?persistentId={dataset_id}"
+        )
+        resp = self._register(url, file_metas, f"register {len(file_metas)}")
+        data = resp.json().get("data", None) or {}
+        logger.debug(f"register datafiles result: {data.get('Result', None)}")
+        reported = {
+            f.get("storageIdentifier", None): f for f in data.get("Files", [])}
+        file_ids = dict()
+        failed = dict()
+        for file_meta in file_metas:
+            storage_identifier = file_meta["storageIdentifier"]
+            f = reported.get(storage_identifier, None) or {}
+            if f.get("errorMessage", None):
+                failed[storage_identifier] = f["errorMessage"]
+            else:
+                file_ids[storage_identifier] = (
+                    f.get("fileDetails", None) or {}).get("id", None)
+        return file_ids, failed
+
+    def _register(self, url, file_meta, action):
+        api = self.dv_config.native_api
+        json_str = json.dumps(file_meta)
+        logger.debug("{} file json:\n{}", action, lazy_pformat_json(json_str))
+        resp = api.post_request(url, files={"jsonData": (None, json_str)}, auth=True)
+        logger.info("{} datafile:\n{}", action, lazy_pformat_resp(resp))
+        _check_datafile_resp(resp, action)
+        return resp
 
     def create(self, df):
-        return NotImplemented
-       
+        file_meta = self.upload_to_store(df)
+        api = self.dv_config.native_api
+        url = (
+            f"{api.base_url_api_native}/datasets/:persistentId/add"
+            f"?persistentId={df.pid}"
+        )
+        return self._register(url, file_meta, "create")
+
     def replace(self, file_pid, df):
-        return NotImplemented
+        file_meta = self.upload_to_store(df)
+        file_meta["forceReplace"] = True
+        api = self.dv_config.native_api
+        url = f"{api.base_url_api_native}/files/{file_pid}/replace"
+        return self._register(url, file_meta, "replace")
 
-def upload_dataset(
+
+async def upload_dataset_async(
     dv_config,
     parent_id,
     dataset_index,
@@ -260,100 +1084,183 @@ def upload_dataset(
     publish_type="none",
     output=None,
     direct_upload=False,
+    max_workers=1,
+    lock_timeout=600.,
+    checksum_cache=None,
+    register_batch_size=100,
+    journal=None,
+    catalog=None,
+    existing_pids=None,
+    file_plan=None,
+    metadata_plan=None,
 ):
-    """Upload dataset to dataverse.
-
-    Parameters
-    ----------
-    dv_config : dvpipe.core.DataverseConfig
-        The dataverse connection config.
-    parent_id : str
-        The identifier of the parent dataverse.
-    dataset_index : dict
-        The index file of the dataset to be uploaded.
-    action_on_exist : {'none', 'update', 'create'}
-        The action to take when the dataset exists:
-        * 'none': no action.
-        * 'update': update existing dataset.
-        * 'create': create new dataset.
-    metadata_only : bool
-        If True, files are skipped.
-    publish_type : {'none', 'major', 'minor', 'updatecurrent'}
-        How the dataset is published:
-        * 'none': do not publish.
-        * 'major': publish with major version bump.
-        * 'minor': publish with minor version bump.
-    file_upload_method: {"native", "dvuploader"}
-        If provided, the callable is used to upload files.
-    """
+    """Async version of `upload_dataset`."""
     api = dv_config.native_api
-    # parent info
-    resp = api.get_dataverse(parent_id)
-    logger.info(f"query parent dataverse:\n{pformat_resp(resp)}")
-    parent_meta = resp.json().pop("data")
-    logger.debug(f"parent dataverse meta:\n{pformat_yaml(parent_meta)}")
-    logger.debug(f"dataset index meta:\n{pformat_yaml(dataset_index['meta'])}")
 
     # create ds object
     ds = DVDataset()
     ds.set(dataset_index["dataset"])
-    ds_json = ds.json()
+    ds_json = ds.to_json_bytes()
     logger.info("VALIDATING...")
-    logger.info(ds_json)
+    logger.debug("dataset json:\n{}", lazy_pformat_json(ds_json))
     assert ds.validate_json()
     logger.info("OK")
     logger.info(f"action_on_exist : {action_on_exist}")
-    logger.info(
-        f"DATASET INDEX FILES: {dataset_index['files']}, len={len(dataset_index['files'])}"
-    )
+    logger.info(f"DATASET INDEX FILES: len={len(dataset_index['files'])}")
+    logger.debug(
+        "DATASET INDEX FILES:\n{}", lazy_pformat_yaml(dataset_index['files']))
+
+    async def _get_parent_meta():
+        resp = await call(dv_config, api.get_dataverse, parent_id)
+        logger.info("query parent dataverse:\n{}", lazy_pformat_resp(resp))
+        parent_meta = resp.json().pop("data")
+        logger.debug("parent dataverse meta:\n{}", lazy_pformat_yaml(parent_meta))
+        logger.debug(
+            "dataset index meta:\n{}", lazy_pformat_yaml(dataset_index['meta']))
+        return parent_meta
+
+    # search for existing dataset
+    search_kwargs = {
+        "q_str": f'title:"{dataset_index["dataset"]["title"]}"',
+        "subtree": parent_id,
+        "sort": "date",
+        "order": "desc",
+    }
+
+    # a previous upload that did not finish is continued
+    resume_pid = None
+    if journal is not None:
+        resume_pid = journal.get_resumable_pid()
+
+    if isinstance(existing_pids, dict):
+        existing_pids = existing_pids.get(dataset_index["dataset"]["title"], None)
+
+    # the existence check is a local lookup if the catalog mirrors the
+    # parent dataverse.
+    if catalog is not None and catalog.subtree != parent_id:
+        logger.warning(
+            f"catalog subtree {catalog.subtree} does not match "
+            f"parent {parent_id}, catalog is not used.")
+        catalog = None
+
+    async def _search():
+        if action_on_exist == "create" or resume_pid is not None:
+            return None
+        if existing_pids is not None:
+            return list(existing_pids)
+        if catalog is not None:
+            return catalog.find_datasets(dataset_index["dataset"]["title"])
+        results = await search_dataverse_async(dv_config=dv_config, **search_kwargs)
+        # warn if multiple entries found
+        if len(results) > 1:
+            entry_info = results[0]
+            logger.warning(
+                "multiple entries found in search:\n{}\n"
+                "use the latest entry:\n{}",
+                results, lazy_pformat_yaml(entry_info))
+        if not results:
+            return []
+        return [str(pid) for pid in results["global_id"]]
+
+    # the parent query and the search are independent
+    _, results = await asyncio.gather(_get_parent_meta(), _search())
 
     file_action = action_on_exist
     if metadata_only:
         file_action = "none"
-        
-    def _create():
-        logger.debug(f"create dataset json:\n{ds_json}")
-        resp = api.create_dataset(
+
+    # the state of the latest version, if queried
+    latest_version_state = None
+
+    transfer_stats = {
+        "metadata_action": "none",
+        "n_files_transferred": 0,
+        "bytes_transferred": 0,
+        "n_files_skipped": 0,
+        "bytes_skipped": 0,
+    }
+
+    async def _create():
+        logger.debug("create dataset json:\n{}", lazy_pformat_json(ds_json))
+        resp = await call(
+            dv_config, api.create_dataset,
             parent_id, ds_json, pid=None, publish=False, auth=True
         )
-        logger.info(f"create dataset response:\n{pformat_resp(resp)}")
+        logger.info("create dataset response:\n{}", lazy_pformat_resp(resp))
         if not resp.ok:
             raise ValueError(f"Failed create dataset:\n{pformat_resp(resp)}")
         # set file action to create for newly created datasets
         nonlocal file_action
         file_action = "create"
+        transfer_stats["metadata_action"] = "created"
         # get pid
         return str(resp.json()["data"]["persistentId"])
 
-    if action_on_exist == "create":
+    async def _update_metadata():
+        logger.debug("update dataset with metadata")
+        dataset_version = ds.to_dict()["datasetVersion"]
+        if metadata_plan == "skip":
+            logger.info(f"dataset metadata unchanged pid={pid}, skipped.")
+            transfer_stats["metadata_action"] = "unchanged"
+            return
+        if metadata_plan is None:
+            # skip the update if the metadata are the same as the latest
+            # version
+            metadata_hash = get_metadata_hash(dataset_version)
+            metadata_hash_remote = None
+            if catalog is not None:
+                metadata_hash_remote = catalog.get_metadata_hash(pid)
+            if metadata_hash_remote is None:
+                latest_version = await call(
+                    dv_config, get_latest_version, dv_config, pid)
+                metadata_hash_remote = get_metadata_hash(latest_version)
+                nonlocal latest_version_state
+                latest_version_state = latest_version.get(
+                    "versionState", None)
+            if metadata_hash == metadata_hash_remote:
+                logger.info(f"dataset metadata unchanged pid={pid}, skipped.")
+                transfer_stats["metadata_action"] = "unchanged"
+                return
+        ds_json_new = _json_dumps(dataset_version)
+        logger.debug(
+            "update dataset metadata json:\n{}",
+            lazy_pformat_json(ds_json_new))
+        url = "{0}/datasets/:persistentId/versions/:draft?persistentId={1}".format(
+            api.base_url_api_native, pid
+        )
+        resp = await call(
+            dv_config, api.put_request, url, ds_json_new, auth=True)
+        logger.info("update dataset metadata response:\n{}", lazy_pformat_resp(resp))
+        if not resp.ok:
+            raise ValueError(
+                f"Failed update dataset metadata:\n{pformat_resp(resp)}"
+            )
+        transfer_stats["metadata_action"] = "updated"
+
+    if resume_pid is not None:
+        pid = resume_pid
+        logger.info(
+            f"resume upload to dataset pid={pid} "
+            f"from journal {journal.filepath}")
+        # the files uploaded before the interruption are checked against
+        # the existing files.
+        if not metadata_only:
+            file_action = "update"
+        if action_on_exist == "update":
+            await _update_metadata()
+    elif action_on_exist == "create":
         # just create
-        pid = _create()
+        pid = await _create()
     else:
-        # search for existing dataset
-        search_kwargs = {
-            "q_str": f'title:"{dataset_index["dataset"]["title"]}"',
-            "subtree": parent_id,
-            "sort": "date",
-            "order": "desc",
-        }
-        results = search_dataverse(dv_config=dv_config, **search_kwargs)
         if not results:
             # not exist, create
             logger.debug(
-                f"no dataset found with "
-                f"search_kwargs:\n{pformat_yaml(search_kwargs)}"
-            )
-            pid = _create()
+                "no dataset found with search_kwargs:\n{}",
+                lazy_pformat_yaml(search_kwargs))
+            pid = await _create()
         else:
-            # warn if multiple entries found
-            if len(results) > 1:
-                entry_info = dict(zip(results.colnames, results[0]))
-                logger.warning(
-                    f"multiple entries found in search:\n{results}\n"
-                    f"use the latest entry:\n{pformat_yaml(entry_info)}"
-                )
             # get the latest dataset pid
-            pid = str(results[0]["global_id"])
+            pid = results[0]
             if action_on_exist == "none":
                 # nothing need to be done
                 logger.debug(
@@ -362,43 +1269,42 @@ def upload_dataset(
                 )
                 # return pid
             elif action_on_exist == "update":
-                logger.debug("update dataset with metadata")
-                # TODO implement this
-                # update dataset with pid
-                # raise NotImplementedError()
-                # logger.warning("metadata update is not implemented yet, skipped.")
-                ds_dict = json.loads(ds_json)
-                ds_json_new = json.dumps(ds_dict["datasetVersion"], indent=2)
-                logger.debug(f"update dataset metadata json:\n{ds_json_new}")
-                url = "{0}/datasets/:persistentId/versions/:draft?persistentId={1}".format(
-                    api.base_url_api_native, pid
-                )
-                resp = api.put_request(url, ds_json_new, auth=True)
-                # resp = api.edit_dataset_metadata(pid, ds_json_new, replace=True, auth=True)
-                logger.info(f"update dataset metadata response:\n{pformat_resp(resp)}")
-                if not resp.ok:
-                    raise ValueError(
-                        f"Failed update dataset metadata:\n{pformat_resp(resp)}"
-                    )
+                await _update_metadata()
             else:
                 pass
                 # raise ValueError("invalid action.")
+    if journal is not None:
+        journal.start(pid)
 
     # if we reach here, we need to handle the datafiles
     logger.info(f"handle datafiles for dataset pid: {pid}; {file_action=}")
     data_files = list()
     # we retrieve the list of data files in the dataset
     # if action is to update.
-    if file_action == "update":
-        files_remote = get_datafiles(dv_config, dataset_id=pid)
-        logger.debug(f"existing files:\n{files_remote}")
+    file_plan = file_plan or dict()
+    if file_action == "update" and all(
+            data.get("label", None) in file_plan
+            for data in dataset_index["files"]):
+        # no need to look up the existing files
+        files_remote = None
+    elif file_action == "update":
+        items = None
+        if catalog is not None:
+            items = catalog.get_datafiles(pid)
+        if items is not None:
+            files_remote = DatafileManifest.from_items(items)
+        else:
+            files_remote = await get_datafiles_async(
+                dv_config, dataset_id=pid, manifest=True)
+        logger.debug(f"existing files: {len(files_remote)}")
 
     # file uploader
     if direct_upload:
-        file_uploader = DVUploaderWrapper(dv_config)
+        file_uploader = DvUploaderWrapper(
+            dv_config, checksum_cache=checksum_cache, journal=journal)
     else:
         file_uploader = FileUploaderNative(dv_config)
-   
+
     for data in dataset_index["files"]:
         # update pid to point to the dataset.
         data["pid"] = pid
@@ -406,38 +1312,182 @@ def upload_dataset(
         df.set(data)
         assert df.validate_json()
         data_files.append(df)
-        # upload file if needed
-        if file_action == "create":
-            file_uploader.create(df) 
-        elif file_action == "update":
-            # check if the file is in the list of existing files
-            if len(files_remote) == 0:
-                m = None
+        if journal is not None and journal.get(df.label, df.filename) is None:
+            journal.set_state(df.label, df.filename, "pending")
+
+    # upload files with at most max_workers in flight.
+    n_files = len(data_files)
+    semaphore = asyncio.Semaphore(max_workers)
+
+    # the files uploaded to the store are registered in batches
+    # if the uploader supports it.
+    bulk_register = getattr(file_uploader, "supports_bulk_register", False)
+    staged = list()
+
+    def _add_transferred(df):
+        transfer_stats["n_files_transferred"] += 1
+        transfer_stats["bytes_transferred"] += os.path.getsize(df.filename)
+
+    async def _upload(df, file_pid=None):
+        if bulk_register:
+            # counted as transferred once registered
+            file_meta = await call(
+                dv_config, file_uploader.stage, df, file_pid=file_pid)
+            staged.append((df, file_meta))
+        else:
+            if journal is not None:
+                journal.set_state(df.label, df.filename, "uploading")
+            if file_pid is None:
+                resp = await _call_with_lock_retry(
+                    dv_config, pid, file_uploader.create, df,
+                    lock_timeout=lock_timeout)
             else:
-                m = files_remote[files_remote["label"] == df.label]
-            if m is not None and len(m) > 0:
-                if len(m) > 1:
-                    logger.warning(f"multiple files found with label={df.label}")
-                # TODO implement checksum comparison to do update?
-                # file_pid = m[0]['dataFile']['id']
-                # resp = api.replace_datafile(
-                #     file_pid, df.filename, df.json(), is_filepid=False)
-                # logger.info(
-                #     f"update existing datafile:\n{pformat_resp(resp)}")
-                logger.warning(f"overwrite existing datafile label={df.label}")
-                file_pid = m[0]["dataFile"]["id"]
-                file_uploader.replace(file_pid, df)
+                resp = await _call_with_lock_retry(
+                    dv_config, pid, file_uploader.replace, file_pid, df,
+                    lock_timeout=lock_timeout)
+            if journal is not None:
+                datafile_meta = _get_registered_datafile(resp)
+                checksum = get_remote_checksum(datafile_meta) or (None, None)
+                journal.set_state(
+                    df.label, df.filename, "registered",
+                    md5=checksum[1] if checksum[0] == "md5" else None,
+                    file_id=datafile_meta.get("id", None))
+            _add_transferred(df)
+
+    async def _handle_file(i, df):
+        file_info = f"[{i + 1}/{n_files}] label={df.label}"
+        async with semaphore:
+            if (
+                    file_action in ["create", "update"]
+                    and journal is not None
+                    and journal.is_registered(df.label, df.filename)):
+                logger.info(f"{file_info} registered per journal, skipped.")
+                transfer_stats["n_files_skipped"] += 1
+                transfer_stats["bytes_skipped"] += os.path.getsize(df.filename)
+                return
+            if file_action == "update" and df.label in file_plan:
+                # the action is decided in advance
+                action, file_pid = file_plan[df.label]
+                logger.info(f"{file_info} {action} datafile per plan")
+                if action == "skip":
+                    transfer_stats["n_files_skipped"] += 1
+                    transfer_stats["bytes_skipped"] += os.path.getsize(
+                        df.filename)
+                elif action == "replace":
+                    await _upload(df, file_pid=file_pid)
+                else:
+                    await _upload(df)
+                return
+            if file_action == "create":
+                logger.info(f"{file_info} create datafile")
+                await _upload(df)
+            elif file_action == "update":
+                # check if the file is in the list of existing files
+                m = files_remote.get(
+                    df.label, getattr(df, "directoryLabel", None))
+                if m is not None:
+                    datafile_meta = m.datafile_meta
+                    if await call(
+                            dv_config, is_same_file, df.filename, datafile_meta,
+                            checksum_cache=checksum_cache):
+                        logger.info(f"{file_info} unchanged, skipped.")
+                        if journal is not None:
+                            journal.set_state(
+                                df.label, df.filename, "registered",
+                                file_id=datafile_meta["id"])
+                        transfer_stats["n_files_skipped"] += 1
+                        transfer_stats["bytes_skipped"] += os.path.getsize(
+                            df.filename)
+                        return
+                    logger.warning(f"{file_info} overwrite existing datafile")
+                    file_pid = datafile_meta["id"]
+                    await _upload(df, file_pid=file_pid)
+                else:
+                    # not exist yet, create
+                    logger.info(f"{file_info} create datafile")
+                    await _upload(df)
             else:
-                # not exist yet, create
-                file_uploader.create(df)
-        else:
-            logger.debug("no action specified for file uploading, skipped.")
+                logger.debug(
+                    f"{file_info} no action specified for file uploading, skipped.")
+        logger.debug(f"{file_info} done")
+
+    results = await asyncio.gather(
+        *(_handle_file(i, df) for i, df in enumerate(data_files)),
+        return_exceptions=True,
+    )
+    errors = [
+        (df, r) for df, r in zip(data_files, results)
+        if isinstance(r, Exception)
+    ]
+    for i in range(0, len(staged), register_batch_size):
+        batch = staged[i:i + register_batch_size]
+        logger.info(
+            f"register {len(batch)} datafiles "
+            f"[{i + 1}-{i + len(batch)}/{len(staged)}]")
+        for replace in [False, True]:
+            group = [
+                (df, file_meta) for df, file_meta in batch
+                if ("fileToReplaceId" in file_meta) == replace]
+            if not group:
+                continue
+            try:
+                file_ids, failed = await _call_with_lock_retry(
+                    dv_config, pid, file_uploader.register,
+                    pid, [file_meta for _, file_meta in group],
+                    replace=replace, lock_timeout=lock_timeout)
+            except Exception as e:
+                errors.extend((df, e) for df, _ in group)
+                continue
+            for df, file_meta in group:
+                storage_identifier = file_meta["storageIdentifier"]
+                if storage_identifier in failed:
+                    errors.append((df, ValueError(
+                        f"Failed register datafile: "
+                        f"{failed[storage_identifier]}")))
+                    continue
+                _add_transferred(df)
+                if journal is not None:
+                    journal.set_state(
+                        df.label, df.filename, "registered",
+                        md5=file_meta["checksum"]["@value"],
+                        file_id=file_ids[storage_identifier])
+    logger.info("file transfer stats:\n{}", lazy_pformat_yaml(transfer_stats))
+    for df, e in errors:
+        logger.error(f"failed upload datafile label={df.label}: {e}")
+    if errors:
+        error_info = "\n".join(f"{df.label}: {e}" for df, e in errors)
+        raise ValueError(
+            f"Failed upload {len(errors)} of {n_files} datafiles "
+            f"for dataset pid={pid}:\n{error_info}"
+        )
+
+    async def _needs_publish():
+        # an unchanged dataset is only published if it has a draft, as
+        # dataverse rejects publishing a released version again.
+        if (
+                transfer_stats["metadata_action"] in ["created", "updated"]
+                or transfer_stats["n_files_transferred"] > 0):
+            return True
+        state = latest_version_state
+        if state is None:
+            latest_version = await call(
+                dv_config, get_latest_version, dv_config, pid)
+            state = latest_version.get("versionState", None)
+        if state != "DRAFT":
+            logger.info(
+                f"dataset pid={pid} unchanged and latest version is "
+                f"{state}, skip publish.")
+            return False
+        return True
+
     # finally, publish the dataset if requested
-    if publish_type not in ["none"]:
-        resp = api.publish_dataset(pid, publish_type)
-        logger.info(f"publish dataset pid={pid}: {pformat_resp(resp)}")
+    if publish_type not in ["none"] and await _needs_publish():
+        v = await publish_dataset_async(
+            dv_config, pid, publish_type=publish_type,
+            lock_timeout=lock_timeout)
+    else:
+        v = await get_versions_async(dv_config, dataset_id=pid)
     # print out version info
-    v = get_versions(dv_config, dataset_id=pid)
     vv = v[
         [
             "id",
@@ -449,15 +1499,133 @@ def upload_dataset(
             "lastUpdateTime",
         ]
     ]
-    logger.info(f"current versions:\n{vv}")
+    logger.info("current versions:\n{}", vv)
 
     # generate output index file
     index_out = deepcopy(dataset_index)
     index_out["meta"].update(
-        {"dataset": {"pid": pid, "versions": v.to_pandas().to_dict(orient="records")}}
+        {
+            "dataset": {
+                "pid": pid,
+                "versions": v.to_records(),
+                "transfer": transfer_stats,
+            }
+        }
     )
     if output is not None:
         with open(output, "w") as fo:
             yaml.dump(index_out, fo)
         logger.info(f"output yaml written to: {output}")
+    if journal is not None:
+        journal.finish()
+    if catalog is not None:
+        # the dataset is refreshed on the next sync
+        catalog.add_dataset(pid, dataset_index["dataset"]["title"], parent_id)
     return pid
+
+
+def upload_dataset(
+    dv_config,
+    parent_id,
+    dataset_index,
+    action_on_exist="none",
+    metadata_only=False,
+    publish_type="none",
+    output=None,
+    direct_upload=False,
+    max_workers=1,
+    lock_timeout=600.,
+    checksum_cache=None,
+    register_batch_size=100,
+    journal=None,
+    catalog=None,
+    existing_pids=None,
+    file_plan=None,
+    metadata_plan=None,
+):
+    """Upload dataset to dataverse.
+
+    Parameters
+    ----------
+    dv_config : dvpipe.core.DataverseConfig
+        The dataverse connection config.
+    parent_id : str
+        The identifier of the parent dataverse.
+    dataset_index : dict
+        The index file of the dataset to be uploaded.
+    action_on_exist : {'none', 'update', 'create'}
+        The action to take when the dataset exists:
+        * 'none': no action.
+        * 'update': update existing dataset.
+        * 'create': create new dataset.
+    metadata_only : bool
+        If True, files are skipped.
+    publish_type : {'none', 'major', 'minor', 'updatecurrent'}
+        How the dataset is published:
+        * 'none': do not publish.
+        * 'major': publish with major version bump.
+        * 'minor': publish with minor version bump.
+        The dataset is only published when this run changed it, or when
+        its latest version is a draft.
+    output : str or Path, optional
+        If set, the output index file is written to this path.
+    direct_upload : bool
+        If True, files are uploaded with `DvUploaderWrapper`.
+    max_workers : int
+        The max number of files of the dataset to upload in parallel.
+        Note that the total number of requests in flight is also bounded
+        by ``dv_config.http.max_concurrency``.
+    lock_timeout : float
+        The max time in seconds to wait for the dataset to be unlocked
+        when a file upload is rejected due to dataset lock.
+    checksum_cache : dvpipe.checksum.ChecksumCache, optional
+        If set, local file checksums are looked up from the cache.
+    register_batch_size : int
+        The max number of files registered in one request, for uploaders
+        that register files in bulk.
+    journal : dvpipe.journal.UploadJournal, optional
+        If set, the upload state of the files is recorded in the journal,
+        and an upload interrupted previously is resumed: the dataset is
+        not created again, the files registered are skipped, and the
+        multipart direct uploads are continued.
+    catalog : dvpipe.catalog.DataverseCatalog, optional
+        If set and it mirrors `parent_id`, the existing dataset and files
+        are looked up from the catalog instead of queried from the server.
+        The uploaded dataset is marked to be refreshed on the next sync.
+    existing_pids : list or dict, optional
+        If set, the pids of the existing datasets with the title of
+        `dataset_index`, the latest first, as resolved in advance with
+        `resolve_dataset_pids`. The dict returned by the latter can be
+        passed as is. The search for the existing dataset is skipped,
+        unless the title is not in the dict.
+    file_plan : dict, optional
+        The actions decided in advance for the files of an existing
+        dataset, keyed by the file labels. The values are tuples of
+        ``(action, file_id)``, where action is one of 'create', 'replace'
+        and 'skip', and file_id is the id of the file to replace. The
+        files not in the dict are compared with the existing files.
+        See `dvpipe.plan`.
+    metadata_plan : {'update', 'skip'}, optional
+        The action decided in advance for the metadata of an existing
+        dataset, in which case the metadata are not compared with the
+        latest version. See `dvpipe.plan`.
+    """
+    return run_sync(upload_dataset_async(
+        dv_config,
+        parent_id,
+        dataset_index,
+        action_on_exist=action_on_exist,
+        metadata_only=metadata_only,
+        publish_type=publish_type,
+        output=output,
+        direct_upload=direct_upload,
+        max_workers=max_workers,
+        lock_timeout=lock_timeout,
+        checksum_cache=checksum_cache,
+        register_batch_size=register_batch_size,
+        journal=journal,
+        catalog=catalog,
+        existing_pids=existing_pids,
+        file_plan=file_plan,
+        metadata_plan=metadata_plan,
+    ))
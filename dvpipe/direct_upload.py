@@ -0,0 +1,178 @@
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from loguru import logger
+
+
+__all__ = ['FilePart', 'put_part', 'upload_single', 'upload_multipart']
+
+
+class FilePart(object):
+    """A read-only file-like view of a byte range of a file.
+
+    This allows a part of a large file to be sent as a request body
+    without being loaded into memory.
+
+    Parameters
+    ----------
+    path : str or Path
+        The path of the file.
+    offset : int
+        The start of the byte range.
+    size : int
+        The length of the byte range.
+    """
+
+    def __init__(self, path, offset, size):
+        self._path = path
+        self._offset = offset
+        self._size = size
+        self._fo = None
+        self._remaining = size
+
+    def __len__(self):
+        return self._size
+
+    def __enter__(self):
+        self._fo = open(self._path, 'rb')
+        self._fo.seek(self._offset)
+        self._remaining = self._size
+        return self
+
+    def __exit__(self, *args):
+        self._fo.close()
+        self._fo = None
+
+    def read(self, n=-1):
+        if self._remaining <= 0:
+            return b''
+        if n is None or n < 0 or n > self._remaining:
+            n = self._remaining
+        data = self._fo.read(n)
+        self._remaining -= len(data)
+        return data
+
+
+def put_part(
+        session, url, path, offset, size,
+        headers=None, timeout=None, max_retries=3):
+    """Upload a byte range of `path` to the presigned `url`.
+
+    Parameters
+    ----------
+    session : requests.Session
+        The session to send the request.
+    url : str
+        The presigned URL to PUT the data to.
+    path : str or Path
+        The path of the file.
+    offset : int
+        The start of the byte range.
+    size : int
+        The length of the byte range.
+    headers : dict, optional
+        Extra headers to send.
+    timeout : float or tuple, optional
+        The request timeout.
+    max_retries : int
+        The number of attempts before giving up.
+
+    Returns
+    -------
+    str
+        The ETag returned by the object store.
+    """
+    headers = dict(headers or {})
+    headers['Content-Length'] = str(size)
+    for i in range(max_retries):
+        with FilePart(path, offset, size) as part:
+            resp = session.put(url, data=part, headers=headers, timeout=timeout)
+        if resp.ok:
+            return resp.headers.get('ETag', None)
+        logger.debug(
+            f"failed upload part of {path} offset={offset} "
+            f"(attempt {i + 1}/{max_retries}): "
+            f"{resp.status_code} {resp.reason}")
+    raise ValueError(
+        f"Failed upload part of {path} offset={offset} size={size}: "
+        f"{resp.status_code} {resp.reason}\n{resp.text}")
+
+
+def upload_single(session, url, path, timeout=None, max_retries=3):
+    """Upload the file `path` to the presigned `url` in one request.
+
+    The object is tagged as temporary per dataverse convention, so it gets
+    cleaned up if the file is never registered.
+    """
+    size = os.path.getsize(path)
+    return put_part(
+        session, url, path, 0, size,
+        headers={'x-amz-tagging': 'dv-state=temp'},
+        timeout=timeout, max_retries=max_retries)
+
+
+def upload_multipart(
+        session, urls, path, part_size,
+        max_workers=4, timeout=None, max_retries=3,
+        etags=None, callback=None):
+    """Upload the file `path` as multiple parts in parallel.
+
+    Parameters
+    ----------
+    session : requests.Session
+        The session to send the requests.
+    urls : dict
+        The presigned URLs keyed by the part numbers starting from 1.
+    path : str or Path
+        The path of the file.
+    part_size : int
+        The size of each part, except the last one.
+    max_workers : int
+        The number of parts to upload in parallel.
+    timeout : float or tuple, optional
+        The request timeout.
+    max_retries : int
+        The number of attempts to upload each part.
+    etags : dict, optional
+        The ETags of the parts already uploaded, which are skipped.
+    callback : callable, optional
+        If set, it is called with the part number and the ETag of each
+        uploaded part.
+
+    Returns
+    -------
+    dict
+        The ETags keyed by the part numbers, as expected by the multipart
+        upload complete request.
+    """
+    size = os.path.getsize(path)
+    n_parts = max(math.ceil(size / part_size), 1)
+    if n_parts != len(urls):
+        raise ValueError(
+            f"mismatch number of parts for {path}: "
+            f"expected {n_parts}, got {len(urls)} urls")
+
+    etags = dict(etags or {})
+
+    def _put(part_number):
+        offset = (part_number - 1) * part_size
+        etag = put_part(
+            session, urls[str(part_number)], path,
+            offset, min(part_size, size - offset),
+            timeout=timeout, max_retries=max_retries)
+        logger.debug(f"uploaded part {part_number}/{n_parts} of {path}")
+        if callback is not None:
+            callback(part_number, etag)
+        return etag
+
+    part_numbers = [
+        n for n in range(1, n_parts + 1) if str(n) not in etags]
+    if len(part_numbers) < n_parts:
+        logger.debug(
+            f"skip {n_parts - len(part_numbers)}/{n_parts} uploaded parts "
+            f"of {path}")
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for n, etag in zip(part_numbers, executor.map(_put, part_numbers)):
+            etags[str(n)] = etag
+    return {str(n): etags[str(n)] for n in range(1, n_parts + 1)}
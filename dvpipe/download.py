@@ -0,0 +1,290 @@
+import asyncio
+import hashlib
+import os
+from fnmatch import fnmatch
+from pathlib import Path, PurePosixPath
+
+import requests
+from loguru import logger
+from pyDataverse.exceptions import OperationFailedError
+
+from ._async import call, run_sync
+from .checksum import compute_checksum, get_remote_checksum, is_same_file
+from .dataverse import get_datafile_items
+from .streaming import TransferProgress
+
+
+__all__ = ['download_datafile', 'download_dataset']
+
+
+_chunk_size = 1024 * 1024
+"""The number of bytes received at a time, which is also the max number of
+bytes lost when the transfer is interrupted."""
+
+
+def _get_relative_path(item):
+    """Return the path ``<directoryLabel>/<label>`` of the file `item`."""
+    directory_label = item.get('directoryLabel', None)
+    if directory_label:
+        return PurePosixPath(directory_label, item['label'])
+    return PurePosixPath(item['label'])
+
+
+def _check_local_path(dirpath, path):
+    """Return `path`, raising ValueError if it resolves outside `dirpath`."""
+    if Path(dirpath).resolve() not in Path(path).resolve().parents:
+        raise ValueError(f"path {path} is not inside {dirpath}")
+    return path
+
+
+def _get_local_path(dirpath, item):
+    """Return the local path of the file `item` in `dirpath`.
+
+    The labels come from the server, so the path is checked to be inside
+    `dirpath`, e.g., a ``directoryLabel`` of ``../..`` is rejected.
+    """
+    return _check_local_path(
+        dirpath, Path(dirpath).joinpath(_get_relative_path(item)))
+
+
+def _get_original_meta(datafile_meta):
+    """Return the datafile metadata describing the originally uploaded file.
+
+    Tabular files are ingested by dataverse, in which case the checksum is
+    of the original file and the original is downloaded.
+    """
+    if not datafile_meta.get('originalFileFormat', None):
+        return datafile_meta
+    datafile_meta = dict(datafile_meta)
+    if datafile_meta.get('originalFileSize', None) is not None:
+        datafile_meta['filesize'] = datafile_meta['originalFileSize']
+    return datafile_meta
+
+
+def _fetch(api, url, params, path_part, checksum, callback, name, size):
+    """Fetch `url` to `path_part`, resuming from the bytes already there.
+
+    Returns the hash object of the file if it is fetched from the start,
+    otherwise None, and the number of bytes transferred.
+    """
+    offset = path_part.stat().st_size if path_part.exists() else 0
+    if size is not None and offset > size:
+        logger.debug(f"discard invalid partial file {path_part}")
+        path_part.unlink()
+        offset = 0
+    if size is not None and offset == size:
+        # nothing left to fetch
+        return None, 0
+    headers = dict()
+    if offset > 0:
+        headers['Range'] = f'bytes={offset}-'
+    resp = api.get_request(
+        url, params=params, auth=True, headers=headers, stream=True)
+    with resp:
+        if offset > 0 and resp.status_code != 206:
+            # range not honored, start over
+            logger.debug(f"server ignored range request for {name}")
+            offset = 0
+        elif offset > 0:
+            logger.debug(f"resume download of {name} from byte {offset}")
+        # the resumed files are hashed once complete
+        h = None
+        if checksum is not None and offset == 0:
+            h = hashlib.new(checksum[0])
+        progress = TransferProgress(
+            name=name,
+            bytes_total=(size if size is not None else offset) - offset)
+        with open(path_part, 'ab' if offset > 0 else 'wb') as fo:
+            for chunk in resp.iter_content(chunk_size=_chunk_size):
+                fo.write(chunk)
+                if h is not None:
+                    h.update(chunk)
+                progress.bytes_sent += len(chunk)
+                if callback is not None:
+                    callback(progress)
+    return h, progress.bytes_sent
+
+
+def download_datafile(
+        dv_config, item, dirpath,
+        checksum_cache=None, max_retries=3, progress_callback=None):
+    """Download a file of a dataset to `dirpath`.
+
+    The file is written to ``<dirpath>/<directoryLabel>/<label>``, and is
+    skipped if it is present with the same content. The data is first
+    written to a ``.part`` file, which is resumed with HTTP range requests
+    if the transfer is interrupted, and is only renamed to the final path
+    once the checksum is verified.
+
+    Parameters
+    ----------
+    dv_config : dvpipe.core.DataverseConfig
+        The dataverse connection config.
+    item : dict
+        The file item as listed by `dvpipe.dataverse.get_datafiles`.
+    dirpath : str or Path
+        The directory to download to.
+    checksum_cache : dvpipe.checksum.ChecksumCache, optional
+        If set, the checksums of the present files are looked up from the
+        cache.
+    max_retries : int
+        The number of attempts before giving up.
+    progress_callback : callable, optional
+        If set, it is called with a `dvpipe.streaming.TransferProgress`
+        after each chunk received.
+
+    Returns
+    -------
+    dict
+        The label, path, state (one of 'skipped' and 'downloaded') and
+        number of bytes transferred.
+    """
+    api = dv_config.data_access_api
+    datafile_meta = item['dataFile']
+    path = _get_local_path(dirpath, item)
+    result = {
+        'label': item['label'],
+        'path': path.as_posix(),
+        'state': 'skipped',
+        'n_bytes': 0,
+        }
+    original_meta = _get_original_meta(datafile_meta)
+    if path.exists() and is_same_file(
+            path, original_meta, checksum_cache=checksum_cache):
+        logger.debug(f"skip present file {path}")
+        return result
+    url = f"{api.base_url_api_data_access}/datafile/{datafile_meta['id']}"
+    params = dict()
+    if original_meta is not datafile_meta:
+        params['format'] = 'original'
+    checksum = get_remote_checksum(original_meta)
+    if checksum is None:
+        logger.warning(f"no checksum found for {path}, skip verification")
+    size = original_meta.get('filesize', None)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path_part = _check_local_path(
+        dirpath, path.with_name(path.name + '.part'))
+    for i in range(max_retries):
+        try:
+            h, n_bytes = _fetch(
+                api, url, params, path_part, checksum,
+                progress_callback, item['label'], size)
+        except (requests.RequestException, OperationFailedError) as e:
+            logger.debug(
+                f"failed download {path} "
+                f"(attempt {i + 1}/{max_retries}): {e}")
+            error = e
+            continue
+        result['n_bytes'] += n_bytes
+        n_bytes_local = path_part.stat().st_size
+        if size is not None and n_bytes_local != size:
+            error = ValueError(
+                f"mismatch size of {path}: "
+                f"expected {size}, got {n_bytes_local}")
+            logger.debug(
+                f"{error} (attempt {i + 1}/{max_retries})")
+            continue
+        if checksum is not None:
+            if h is not None:
+                digest = h.hexdigest()
+            else:
+                digest = compute_checksum(path_part, algorithm=checksum[0])
+            if digest != checksum[1]:
+                error = ValueError(
+                    f"mismatch {checksum[0]} checksum of {path}: "
+                    f"expected {checksum[1]}, got {digest}")
+                logger.debug(
+                    f"{error} (attempt {i + 1}/{max_retries})")
+                path_part.unlink()
+                continue
+        os.replace(path_part, path)
+        result['state'] = 'downloaded'
+        return result
+    raise ValueError(f"Failed download {path}: {error}")
+
+
+async def download_dataset_async(
+        dv_config, dataset_id, dirpath, version=":latest", patterns=None,
+        max_workers=4, **kwargs):
+    """Async version of `download_dataset`."""
+    items, _ = await call(
+        dv_config, get_datafile_items, dv_config, dataset_id,
+        version=version)
+    if patterns:
+        items = [
+            item for item in items
+            if any(
+                fnmatch(_get_relative_path(item).as_posix(), p)
+                for p in patterns)
+            ]
+    logger.info(
+        f"download {len(items)} datafiles of dataset pid={dataset_id} "
+        f"to {dirpath}")
+    semaphore = asyncio.Semaphore(max_workers)
+
+    async def _download(item):
+        async with semaphore:
+            return await call(
+                dv_config, download_datafile, dv_config, item, dirpath,
+                **kwargs)
+
+    results = await asyncio.gather(
+        *(_download(item) for item in items), return_exceptions=True)
+    errors = [
+        (item, r) for item, r in zip(items, results)
+        if isinstance(r, Exception)]
+    for item, e in errors:
+        logger.error(f"failed download datafile label={item['label']}: {e}")
+    if errors:
+        error_info = "\n".join(f"{item['label']}: {e}" for item, e in errors)
+        raise ValueError(
+            f"Failed download {len(errors)} of {len(items)} datafiles "
+            f"for dataset pid={dataset_id}:\n{error_info}")
+    return results
+
+
+def download_dataset(
+        dv_config, dataset_id, dirpath, version=":latest", patterns=None,
+        max_workers=4, checksum_cache=None, max_retries=3,
+        progress_callback=None):
+    """Download the files of a dataset to `dirpath`.
+
+    The files are downloaded in parallel with `download_datafile`, so the
+    files already present are skipped, and the interrupted transfers are
+    resumed.
+
+    Parameters
+    ----------
+    dv_config : dvpipe.core.DataverseConfig
+        The dataverse connection config.
+    dataset_id : str
+        The persistent id of the dataset.
+    dirpath : str or Path
+        The directory to download to.
+    version : str
+        The version of the dataset.
+    patterns : list, optional
+        If set, only the files with paths ``<directoryLabel>/<label>``
+        matching any of the glob patterns are downloaded.
+    max_workers : int
+        The max number of files to download in parallel. Note that the
+        total number of requests in flight is also bounded by
+        ``dv_config.http.max_concurrency``.
+    checksum_cache : dvpipe.checksum.ChecksumCache, optional
+        If set, the checksums of the present files are looked up from the
+        cache.
+    max_retries : int
+        The number of attempts to download each file.
+    progress_callback : callable, optional
+        If set, it is called with a `dvpipe.streaming.TransferProgress`
+        after each chunk received.
+
+    Returns
+    -------
+    list
+        The results of `download_datafile` of each file.
+    """
+    return run_sync(download_dataset_async(
+        dv_config, dataset_id, dirpath, version=version, patterns=patterns,
+        max_workers=max_workers, checksum_cache=checksum_cache,
+        max_retries=max_retries, progress_callback=progress_callback))
@@ -0,0 +1,199 @@
+import json
+import os
+import sqlite3
+import threading
+from pathlib import Path
+
+from loguru import logger
+
+
+__all__ = ['UploadJournal']
+
+
+class UploadJournal(object):
+    """A persistent journal of the upload state of a dataset index.
+
+    The journal records the dataset being uploaded to, and for each file
+    the state of its upload:
+
+    * ``pending``: the file is known but not uploaded yet.
+    * ``uploading``: the file transfer is started. For multipart direct
+      uploads, the presigned URLs and the acknowledged parts are kept so
+      the transfer can be continued.
+    * ``registered``: the file is registered with the dataset.
+
+    The entries are keyed by the file label, and are only valid if the size
+    and mtime of the local file are not changed. The journal is reset when
+    the upload goes to a different dataset, or when the previous upload is
+    completed, so that the entries are only trusted to resume an
+    unfinished upload.
+
+    Note that the journal only serves to resume interrupted uploads; the
+    output index file written at the end of the upload remains the record
+    of the uploaded dataset.
+
+    Parameters
+    ----------
+    filepath : str or Path
+        The path of the sqlite database file.
+    """
+
+    states = ('pending', 'uploading', 'registered')
+
+    _create_tables = """
+    CREATE TABLE IF NOT EXISTS dataset (
+        id INTEGER PRIMARY KEY CHECK (id = 0),
+        pid TEXT,
+        completed INTEGER
+    );
+    CREATE TABLE IF NOT EXISTS file (
+        label TEXT PRIMARY KEY,
+        filename TEXT,
+        size INTEGER,
+        mtime_ns INTEGER,
+        state TEXT,
+        md5 TEXT,
+        file_id INTEGER,
+        upload_info TEXT,
+        etags TEXT
+    );
+    """
+
+    def __init__(self, filepath):
+        self._filepath = Path(filepath)
+        self._lock = threading.Lock()
+        self._filepath.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(
+            self._filepath.as_posix(), check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.executescript(self._create_tables)
+
+    @property
+    def filepath(self):
+        return self._filepath
+
+    def _execute(self, sql, params=()):
+        with self._lock, self._conn:
+            return self._conn.execute(sql, params).fetchall()
+
+    @property
+    def dataset_pid(self):
+        """The pid of the dataset being uploaded to, or None."""
+        rows = self._execute("SELECT pid FROM dataset WHERE id = 0")
+        return rows[0][0] if rows else None
+
+    @property
+    def completed(self):
+        """True if the last upload recorded in the journal is completed."""
+        rows = self._execute("SELECT completed FROM dataset WHERE id = 0")
+        return bool(rows[0][0]) if rows else False
+
+    def get_resumable_pid(self):
+        """Return the pid of the dataset of an interrupted upload, or None."""
+        if self.completed:
+            return None
+        return self.dataset_pid
+
+    def start(self, pid):
+        """Mark the start of the upload to dataset `pid`.
+
+        The file entries are cleared if they are for another dataset, or
+        if the previous upload is completed.
+        """
+        with self._lock, self._conn:
+            rows = self._conn.execute(
+                "SELECT pid, completed FROM dataset WHERE id = 0").fetchall()
+            if rows and (rows[0][0] != pid or rows[0][1]):
+                logger.debug(
+                    f"reset upload journal {self._filepath} "
+                    f"for dataset pid={pid}")
+                self._conn.execute("DELETE FROM file")
+            self._conn.execute(
+                "INSERT OR REPLACE INTO dataset (id, pid, completed) "
+                "VALUES (0, ?, 0)", (pid, ))
+
+    def finish(self):
+        """Mark the upload as completed."""
+        self._execute("UPDATE dataset SET completed = 1 WHERE id = 0")
+
+    @staticmethod
+    def _stat(filename):
+        st = os.stat(filename)
+        return st.st_size, st.st_mtime_ns
+
+    def get(self, label, filename):
+        """Return the journal entry of `label`.
+
+        Returns
+        -------
+        dict or None
+            The entry, or None if not found or the file has been changed.
+        """
+        rows = self._execute(
+            "SELECT filename, size, mtime_ns, state, md5, file_id, "
+            "upload_info, etags FROM file WHERE label = ?", (label, ))
+        if not rows:
+            return None
+        (
+            filename_, size, mtime_ns, state, md5, file_id,
+            upload_info, etags) = rows[0]
+        if (filename_, size, mtime_ns) != (
+                str(filename), ) + self._stat(filename):
+            return None
+        return {
+            'state': state,
+            'md5': md5,
+            'file_id': file_id,
+            'upload_info': json.loads(upload_info) if upload_info else None,
+            'etags': json.loads(etags) if etags else {},
+            }
+
+    def is_registered(self, label, filename):
+        """Return True if the file is registered per the journal."""
+        entry = self.get(label, filename)
+        return entry is not None and entry['state'] == 'registered'
+
+    def set_state(self, label, filename, state, md5=None, file_id=None):
+        """Set the state of the file entry of `label`."""
+        if state not in self.states:
+            raise ValueError(f"invalid upload journal state {state}")
+        size, mtime_ns = self._stat(filename)
+        with self._lock, self._conn:
+            updated = self._conn.execute(
+                "UPDATE file SET filename = ?, size = ?, mtime_ns = ?, "
+                "state = ?, md5 = COALESCE(?, md5), "
+                "file_id = COALESCE(?, file_id) WHERE label = ?",
+                (str(filename), size, mtime_ns, state, md5, file_id, label)
+                ).rowcount
+            if not updated:
+                self._conn.execute(
+                    "INSERT INTO file "
+                    "(label, filename, size, mtime_ns, state, md5, file_id) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (label, str(filename), size, mtime_ns, state, md5, file_id)
+                    )
+            if state != 'uploading':
+                self._conn.execute(
+                    "UPDATE file SET upload_info = NULL, etags = NULL "
+                    "WHERE label = ?", (label, ))
+
+    def set_upload_info(self, label, upload_info):
+        """Keep the direct upload info of `label` to resume the transfer."""
+        self._execute(
+            "UPDATE file SET upload_info = ?, etags = NULL WHERE label = ?",
+            (json.dumps(upload_info), label))
+
+    def add_etag(self, label, part_number, etag):
+        """Record the acknowledged part `part_number` of `label`."""
+        with self._lock, self._conn:
+            rows = self._conn.execute(
+                "SELECT etags FROM file WHERE label = ?", (label, )).fetchall()
+            etags = json.loads(rows[0][0]) if rows and rows[0][0] else {}
+            etags[str(part_number)] = etag
+            self._conn.execute(
+                "UPDATE file SET etags = ? WHERE label = ?",
+                (json.dumps(etags), label))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
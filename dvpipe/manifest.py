@@ -0,0 +1,119 @@
+from dataclasses import dataclass, field
+from typing import Optional
+
+from loguru import logger
+
+from .checksum import get_remote_checksum
+from .result import ResultTable
+
+
+__all__ = ['ManifestEntry', 'DatafileManifest']
+
+
+def _make_key(label, directory_label=None):
+    # dataverse reports files at the top level with no directoryLabel
+    return (directory_label or None, label)
+
+
+@dataclass(frozen=True)
+class ManifestEntry:
+    """A file of a dataset in `DatafileManifest`."""
+
+    directory_label: Optional[str]
+    label: str
+    file_id: int
+    size: Optional[int] = None
+    checksum: Optional[tuple] = None
+    """The tuple of (algorithm, hexdigest) of the file content."""
+
+    item: dict = field(default=None, compare=False, repr=False)
+    """The file item as returned by dataverse."""
+
+    @property
+    def key(self):
+        return _make_key(self.label, self.directory_label)
+
+    @property
+    def datafile_meta(self):
+        """The "dataFile" entry of the file item."""
+        return self.item["dataFile"]
+
+    @classmethod
+    def from_item(cls, item):
+        datafile_meta = item["dataFile"]
+        return cls(
+            directory_label=item.get("directoryLabel", None) or None,
+            label=item["label"],
+            file_id=datafile_meta["id"],
+            size=datafile_meta.get("filesize", None),
+            checksum=get_remote_checksum(datafile_meta),
+            item=item)
+
+
+class DatafileManifest(object):
+    """The files of a dataset indexed by ``(directoryLabel, label)``.
+
+    Lookups are dict lookups, and the keys support set operations, so
+    matching local files against the manifest costs O(1) per file.
+
+    Parameters
+    ----------
+    entries : list of ManifestEntry
+        The files. When multiple entries have the same key, the first one
+        is kept.
+    meta : dict, optional
+        The response metadata of the file list query.
+    """
+
+    def __init__(self, entries=(), meta=None):
+        self._entries = dict()
+        for entry in entries:
+            if entry.key in self._entries:
+                logger.warning(f"multiple files found with key={entry.key}")
+                continue
+            self._entries[entry.key] = entry
+        self.meta = meta or dict()
+
+    @classmethod
+    def from_items(cls, items, meta=None):
+        """Return the manifest of file items as returned by dataverse."""
+        return cls((ManifestEntry.from_item(item) for item in items), meta=meta)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __iter__(self):
+        return iter(self._entries.values())
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def keys(self):
+        """Return the keys as a set-like view."""
+        return self._entries.keys()
+
+    def get(self, label, directory_label=None):
+        """Return the entry of the file, or None if not found."""
+        return self._entries.get(_make_key(label, directory_label), None)
+
+    def only_remote(self, keys):
+        """Return the entries whose keys are not in `keys`.
+
+        Parameters
+        ----------
+        keys : iterable
+            The ``(directoryLabel, label)`` tuples of the local files.
+        """
+        keys = {_make_key(label, directory_label) for directory_label, label in keys}
+        return [e for k, e in self._entries.items() if k not in keys]
+
+    def only_local(self, keys):
+        """Return the keys in `keys` that are not in the manifest."""
+        return [
+            k for k in keys
+            if _make_key(k[1], k[0]) not in self._entries]
+
+    def to_result(self):
+        """Return the file items as a `ResultTable` like `get_datafiles`."""
+        return ResultTable.from_items(
+            (e.item for e in self), meta={"response_data": self.meta})
@@ -1,4 +1,4 @@
-from dvpipe.pipelines.metadatablock import MetadataBlock
+from dvpipe.pipelines.metadatablock import MetadataBlock, load_cached
 from dvpipe.pipelines.metadb import MetaDB
 import pandas as pd
 import json
@@ -9,6 +9,18 @@ import numpy as npy
 import os
 
 
+def _load_alma_keymap(almakeyscsv):
+    # TODO trim trailing spaces will will get us into trouble possibly later
+    alma_keys = pd.read_csv(almakeyscsv, skipinitialspace=True)
+    lmt_keys = alma_keys[alma_keys["LMT Keyword"].notna()]
+    lmt_map = dict()
+    tablenames = set(alma_keys["Database Table"])
+    for name in tablenames:
+        kv = lmt_keys[(lmt_keys["Database Table"] == name)]
+        lmt_map[name] = dict(zip(kv["LMT Keyword"], kv["ALMA Keyword"]))
+    return alma_keys, lmt_keys, lmt_map
+
+
 class LmtMetadataBlock(MetadataBlock):
     def __init__(self, dbfile=None, yamlfile=None, load_data=False, from_output=False):
         self._datacsv = utils.aux_file("LMTMetaDatablock.csv")
@@ -37,14 +49,9 @@ class LmtMetadataBlock(MetadataBlock):
         self.from_dataverse_dict()
 
     def _map_lmt_to_alma(self):
-        self._lmt_map = dict()
-        # TODO trim trailing spaces will will get us into trouble possibly later
-        self._alma_keys = pd.read_csv(self._almakeyscsv, skipinitialspace=True)
-        self._lmt_keys = self._alma_keys[self._alma_keys["LMT Keyword"].notna()]
-        tablenames = set(self._alma_keys["Database Table"])
-        for name in tablenames:
-            kv = self._lmt_keys[(self._lmt_keys["Database Table"] == name)]
-            self._lmt_map[name] = dict(zip(kv["LMT Keyword"], kv["ALMA Keyword"]))
+        # the key maps are shared by all blocks, and must not be modified
+        self._alma_keys, self._lmt_keys, self._lmt_map = load_cached(
+            _load_alma_keymap, self._almakeyscsv)
 
     def _open_db(self, create=True):
         # True: will create if not exists
@@ -210,39 +217,35 @@ class LmtMetadataBlock(MetadataBlock):
         See e.g. http://lmtdv1.astro.umass.edu/api/datasets/2/versions/1/metadata
         """
         md = self._metadata
-        df = self._datasetFields
+        schema = self._schema
         fields = []
         fdict = {"fields": fields}
 
-        # yes iterrows is frowned upon for performance, but we don't have many rows
-        for index, row in df.iterrows():
+        for field in schema.fields.values():
             d = dict()
-            p = row["name"]
-            am = row["allowmultiples"]
-            if pd.isnull(row["parent"]):
-                if self._is_parent(p):
+            p = field.name
+            am = field.allowmultiples
+            if not field.has_parent:
+                if field.is_parent:
                     d["typeName"] = p
                     d["multiple"] = am
                     d["typeClass"] = "compound"
                     d["value"] = []
-                    children = self.get_children(row["name"])
                     nparent = len(md[p])
                     for np in range(nparent):
                         # for each item, create a dict containing
                         # all chilren
                         parent_dict = dict()
-                        for c in children:
+                        for c in field.children:
                             child_dict = dict()
-                            r = df[df["name"] == c]
-                            am = r["allowmultiples"].values[0]
-                            fieldType = r["fieldType"].values[0]
-                            if self.is_controlled(c):
+                            child = schema[c]
+                            if child.vocabulary:
                                 tc = "controlledVocabulary"
                             else:
                                 tc = "primitive"
                             child_dict["typeName"] = c
                             child_dict["typeClass"] = tc
-                            child_dict["multiple"] = am
+                            child_dict["multiple"] = child.allowmultiples
                             rawvalue = md[p][np][c]
                             # handle boolean types
                             if isinstance(rawvalue, npy.bool_):
@@ -250,21 +253,20 @@ class LmtMetadataBlock(MetadataBlock):
                             elif isinstance(md[p][np][c], str):
                                 child_dict["value"] = rawvalue
                             else:
-                                if fieldType == "int":
+                                if child.fieldType == "int":
                                     rawvalue = int(rawvalue)
                                 child_dict["value"] = str(rawvalue)
                             # print("appending child ",child_dict)
                             parent_dict[c] = child_dict
                         d["value"].append(parent_dict)
                 else:
-                    if self.is_controlled(p):
+                    if field.vocabulary:
                         tc = "controlledVocabulary"
                     else:
                         tc = "primitive"
                     d["typeName"] = p
                     d["typeClass"] = tc
                     d["multiple"] = am
-                    fieldType = row["fieldType"]
                     rawvalue = md[p]
                     if isinstance(rawvalue, npy.bool_):
                         d["value"] = bool(rawvalue)
@@ -274,7 +276,7 @@ class LmtMetadataBlock(MetadataBlock):
                     # elif p in ["calibrationLevel"]:
                     #    d["value"] = str(int(md[p]))
                     else:
-                        if fieldType == "int":
+                        if field.fieldType == "int":
                             rawvalue = int(rawvalue)
                         d["value"] = str(rawvalue)
                 fields.append(d)
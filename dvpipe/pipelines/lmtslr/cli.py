@@ -1,7 +1,7 @@
 import click
 from loguru import logger
 from pathlib import Path
-from ...utils import pformat_yaml, yaml
+from ...utils import lazy_pformat_yaml, yaml
 
 
 @click.group(
@@ -30,15 +30,26 @@ def cmd_lmtslr(ctx):
     metavar='DIR',
     help='Path to directory to store created dataset_index'
     )
+@click.option(
+    '--checksum_cache',
+    type=click.Path(file_okay=True, dir_okay=False),
+    default=None,
+    metavar='FILE',
+    help='Path to the checksum cache file, to precompute file checksums.'
+    )
 @click.pass_obj
-def cmd_create_dataset_index(ctxobj, project_dir, output_dir):
+def cmd_create_dataset_index(ctxobj, project_dir, output_dir, checksum_cache):
     from ..lmtslr.data_prod import LmtslrDataProd
+    from ...checksum import ChecksumCache
     dp_list = LmtslrDataProd.from_project_dir(Path(project_dir))
     logger.info(f"found {len(dp_list)} data products:\n")
+    if checksum_cache is not None:
+        checksum_cache = ChecksumCache(checksum_cache)
     for dp in dp_list:
         meta = dp.meta
-        logger.info(f"meta:\n{pformat_yaml(meta)}\n")
-        dataset_index = dp.make_dataverse_dataset_index()
+        logger.info("meta:\n{}\n", lazy_pformat_yaml(meta))
+        dataset_index = dp.make_dataverse_dataset_index(
+            checksum_cache=checksum_cache)
         output = yaml.dump(dataset_index)
         print(output)
         project_id = meta['project_meta']['project_id']
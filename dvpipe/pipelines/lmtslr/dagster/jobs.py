@@ -25,6 +25,7 @@ from dvpipe.dagster.ops import count_items
 from .ops import (
     get_project_dirs,
     create_dataset_index_from_project_dir,
+    resolve_existing_dataset_pids,
     upload_dataset_to_dataverse
     )
 
@@ -46,10 +47,15 @@ def create_lmtslr_project_dataset_indices():
 
 @_add_graph
 def upload_lmtslr_project_datasets():
-    dataset_urls = get_project_dirs().map(
-        create_dataset_index_from_project_dir).map(
-            upload_dataset_to_dataverse
-            )
+    dataset_indices = get_project_dirs().map(
+        create_dataset_index_from_project_dir)
+    # the existing datasets are resolved in bulk before the uploads
+    parent_id, dataset_pids = resolve_existing_dataset_pids(
+        dataset_indices.collect())
+    dataset_urls = dataset_indices.map(
+        lambda dataset_index: upload_dataset_to_dataverse(
+            dataset_index, parent_id, dataset_pids)
+        )
     return count_items(dataset_urls.collect())
 
 
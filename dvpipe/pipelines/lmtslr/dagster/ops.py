@@ -6,7 +6,7 @@ from dagster import (
     DynamicOut, DynamicOutput, MetadataValue, MetadataEntry,
     op, Field, Enum, EnumValue)
 
-from dvpipe.dataverse import upload_dataset
+from dvpipe.dataverse import resolve_dataset_pids, upload_dataset
 from ..data_prod import LmtslrDataProd
 
 
@@ -31,6 +31,7 @@ def get_project_dirs(context):
 
 
 @op(
+    required_resource_keys={"dataset_index_io_manager"},
     out=Out(
         dict,
         io_manager_key="dataset_index_io_manager",
@@ -41,8 +42,9 @@ def create_dataset_index_from_project_dir(context, project_dir: str) -> dict:
     dp = LmtslrDataProd.from_project_dir(Path(project_dir))
     meta = dp.meta
     context.log.info(f"metadata: {meta}")
+    checksum_cache = context.resources.dataset_index_io_manager.checksum_cache
     yield Output(
-        dp.make_dataverse_dataset_index(),
+        dp.make_dataverse_dataset_index(checksum_cache=checksum_cache),
         metadata_entries=[
             MetadataEntry(
                 value=MetadataValue.text(meta['project_id']),
@@ -60,6 +62,35 @@ def create_dataset_index_from_project_dir(context, project_dir: str) -> dict:
     required_resource_keys={"dataverse_config"},
     config_schema={
         'parent_id': str,
+        'chunk_size': Field(
+            int,
+            default_value=50,
+            description='The max number of titles in one search query.',
+            ),
+        },
+    out={
+        'parent_id': Out(str),
+        'dataset_pids': Out(dict),
+        },
+    description="Find the existing datasets of the dataset indices.",
+)
+def resolve_existing_dataset_pids(context, dataset_indices: list):
+    dataverse_config = context.resources.dataverse_config
+    dataset_pids = resolve_dataset_pids(
+        dataverse_config,
+        dataset_indices=dataset_indices,
+        **context.op_config)
+    n_found = sum(1 for pids in dataset_pids.values() if pids)
+    context.log.info(
+        f"found {n_found} of {len(dataset_pids)} datasets in dataverse")
+    # the uploads go to the same parent as searched
+    yield Output(context.op_config['parent_id'], output_name='parent_id')
+    yield Output(dataset_pids, output_name='dataset_pids')
+
+
+@op(
+    required_resource_keys={"dataverse_config", "dataset_index_io_manager"},
+    config_schema={
         'action_on_exist': Field(
             Enum(
                 'ActionOnExist',
@@ -82,23 +113,42 @@ def create_dataset_index_from_project_dir(context, project_dir: str) -> dict:
                 ),
             default_value='none'
             ),
+        'max_workers': Field(
+            int,
+            default_value=1,
+            description='The number of files to upload in parallel.',
+            ),
+        'direct_upload': Field(
+            bool,
+            default_value=False,
+            description='Upload files directly to the S3 store.',
+            ),
         },
     out=Out(str),
     description="Upload dataset to dataverse.",
 )
-def upload_dataset_to_dataverse(context, dataset_index: dict):
+def upload_dataset_to_dataverse(
+        context, dataset_index: dict, parent_id: str, dataset_pids: dict):
 
     dataverse_config = context.resources.dataverse_config
-    meta = dataset_index['meta']
+    io_manager = context.resources.dataset_index_io_manager
+    checksum_cache = io_manager.checksum_cache
+    project_id = dataset_index['meta']['project_meta']['project_id']
+    journal = io_manager.get_upload_journal(project_id)
     dataset_url = upload_dataset(
         dataverse_config,
+        parent_id=parent_id,
         dataset_index=dataset_index,
+        checksum_cache=checksum_cache,
+        journal=journal,
+        existing_pids=dataset_pids,
         **context.op_config)
+    dataverse_config.log_connection_stats()
     yield Output(
         dataset_url,
         metadata_entries=[
             MetadataEntry(
-                value=MetadataValue.text(meta['project_id']),
+                value=MetadataValue.text(project_id),
                 label='project_id'
                 ),
             MetadataEntry(
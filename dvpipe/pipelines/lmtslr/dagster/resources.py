@@ -7,6 +7,8 @@ from dagster import (
     )
 
 from dvpipe.utils import yaml
+from dvpipe.checksum import ChecksumCache
+from dvpipe.journal import UploadJournal
 
 
 project_dir = make_values_resource(
@@ -28,6 +30,20 @@ class DatasetIndexIOManager(IOManager):
 
     def __init__(self, rootpath):
         self._rootpath = Path(rootpath)
+        self._checksum_cache = None
+
+    @property
+    def checksum_cache(self):
+        """The checksum cache stored next to the dataset index files."""
+        if self._checksum_cache is None:
+            self._checksum_cache = ChecksumCache(
+                self._rootpath.joinpath('checksum_cache.sqlite'))
+        return self._checksum_cache
+
+    def get_upload_journal(self, project_id):
+        """The upload journal of the dataset index of `project_id`."""
+        return UploadJournal(
+            self._rootpath.joinpath(f'{project_id}_journal.sqlite'))
 
     @staticmethod
     def _search_meta_entry_by_label(context, label):
@@ -5,7 +5,7 @@ import datetime
 from ...dataverse import DVDataset, DVDatafile
 from ..lmtmetadatablock import LmtMetadataBlock
 from loguru import logger
-from ...utils import pformat_yaml
+from ...utils import lazy_pformat_yaml
 
 
 class LmtslrDataProd(object):
@@ -46,7 +46,7 @@ class LmtslrDataProd(object):
             "project_id": project_dir.name,
             "archive_rootpath": Path(project_dir.name),
         }
-        logger.debug(f"project meta:\n{pformat_yaml(meta)}")
+        logger.debug("project meta:\n{}", lazy_pformat_yaml(meta))
         return meta
 
     @classmethod
@@ -108,8 +108,13 @@ class LmtslrDataProd(object):
             data_prod_list.append(cls(index_table=index_table))
         return data_prod_list
 
-    def make_dataverse_dataset_index(self):
-        """Create dataverse dataset index from this data product."""
+    def make_dataverse_dataset_index(self, checksum_cache=None):
+        """Create dataverse dataset index from this data product.
+
+        If `checksum_cache` is set, the checksums of the data files are
+        computed in parallel into the cache, so that the upload looks them
+        up instead of hashing the files one by one.
+        """
         meta = self.meta
         # TODO generate these info
         project_meta = meta["project_meta"]
@@ -153,6 +158,9 @@ class LmtslrDataProd(object):
 
         file_is_restricted = date_current < date_public
 
+        if checksum_cache is not None:
+            checksum_cache.get_checksums_many(
+                data_item["filepath"] for data_item in self.index_table)
         datafiles = list()
         for data_item in self.index_table:
             meta = data_item["meta"]
@@ -6,8 +6,331 @@ import yaml
 import dvpipe.utils as utils
 from copy import deepcopy
 import astropy.units as u
+from astropy.table import Table
 from numbers import Number
-#import numpy as np
+import functools
+import hashlib
+import os
+import pickle
+import threading
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import NamedTuple, Optional, Tuple
+from loguru import logger
+import numpy as np
+
+
+@dataclass(frozen=True)
+class DatasetFieldSpec:
+    '''The compiled definition of one dataset field of a metadata block.'''
+    name: str
+    fieldType: str
+    parent: Optional[str] = None
+    children: Tuple[str, ...] = ()
+    units: Optional[str] = None
+    allowmultiples: bool = False
+    vocabulary: frozenset = frozenset()
+
+    @property
+    def is_parent(self):
+        return self.fieldType == "none"
+
+    @property
+    def has_parent(self):
+        return self.parent is not None
+
+
+def _get_str(row, colname):
+    value = row.get(colname, None)
+    if value is None or pd.isnull(value):
+        return None
+    return value
+
+
+class MetadataBlockSchema(object):
+    '''Immutable definition of a metadata block compiled from the dataset
+       field and controlled vocabulary tables, so that all lookups are
+       dict lookups.
+
+       :param fields: the field definitions in display order
+       :type fields: iterable of DatasetFieldSpec
+
+       :param allowed_values: the allowed values keyed by field name, which
+           may include names that are not dataset fields.
+       :type allowed_values: dict
+    '''
+    def __init__(self, fields, allowed_values=None):
+        fields = {f.name: f for f in fields}
+        self._names = tuple(fields.keys())
+        self._fields = MappingProxyType(fields)
+        self._allowed_values = MappingProxyType({
+            k: tuple(v) for k, v in (allowed_values or {}).items()})
+        self._vocabularies = MappingProxyType({
+            k: frozenset(v) for k, v in self._allowed_values.items()})
+
+    @classmethod
+    def from_dataframes(cls, dataset_fields, controlled_vocabulary=None):
+        '''Compile the schema from the tables as read from the CSV files.'''
+        allowed_values = dict()
+        if controlled_vocabulary is not None:
+            for name, value in zip(
+                    controlled_vocabulary["DatasetField"],
+                    controlled_vocabulary["Value"]):
+                allowed_values.setdefault(name, []).append(value)
+        rows = dataset_fields.to_dict("records")
+        children = dict()
+        for row in rows:
+            parent = _get_str(row, "parent")
+            if parent is not None:
+                children.setdefault(parent, []).append(row["name"])
+        fields = [
+            DatasetFieldSpec(
+                name=row["name"],
+                fieldType=row["fieldType"],
+                parent=_get_str(row, "parent"),
+                children=tuple(children.get(row["name"], ())),
+                units=_get_str(row, "units"),
+                allowmultiples=bool(row["allowmultiples"]),
+                vocabulary=frozenset(allowed_values.get(row["name"], ())),
+                )
+            for row in rows]
+        return cls(fields, allowed_values)
+
+    @property
+    def names(self):
+        '''The field names in display order'''
+        return self._names
+
+    @property
+    def fields(self):
+        '''The read-only mapping of field name to DatasetFieldSpec'''
+        return self._fields
+
+    def __contains__(self, name):
+        return name in self._fields
+
+    def __getitem__(self, name):
+        return self._fields[name]
+
+    def __reduce__(self):
+        # mapping proxies can't be pickled
+        return (self.__class__, (
+            tuple(self._fields.values()), dict(self._allowed_values)))
+
+    def get(self, name, default=None):
+        return self._fields.get(name, default)
+
+    def allowed_values(self, name):
+        '''The allowed values of `name` in vocabulary order, which is empty
+           if `name` is not controlled.'''
+        return self._allowed_values.get(name, ())
+
+    def is_allowed(self, name, value):
+        '''True if `value` is in the vocabulary of `name` or `name` is not
+           controlled.'''
+        vocabulary = self._vocabularies.get(name, None)
+        if not vocabulary:
+            return True
+        try:
+            return value in vocabulary
+        except TypeError:
+            # unhashable values are never in the vocabulary
+            return False
+
+
+_definition_cache = dict()
+_definition_cache_lock = threading.Lock()
+_definition_cache_dir = os.environ.get("DVPIPE_BLOCK_CACHE_DIR", None)
+_definition_cache_version = 1
+"""Bumped when the cached objects change so stale cache files are ignored."""
+
+
+def set_definition_cache_dir(dirpath):
+    '''Set the directory of the precompiled definition cache files.
+
+       The loaded definitions are pickled there, so new processes skip
+       parsing the CSV files. Set to None to disable, which is the default
+       unless the ``DVPIPE_BLOCK_CACHE_DIR`` environment variable is set.
+    '''
+    global _definition_cache_dir
+    _definition_cache_dir = dirpath
+
+
+def _get_cache_file(key):
+    if _definition_cache_dir is None:
+        return None
+    digest = hashlib.sha1(repr(key).encode()).hexdigest()
+    return os.path.join(_definition_cache_dir, f"{key[0]}-{digest}.pickle")
+
+
+def _load_cache_file(cache_file, stamp):
+    try:
+        with open(cache_file, "rb") as fo:
+            version, stamp_cached, value = pickle.load(fo)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.debug(f"ignore invalid definition cache {cache_file}: {e}")
+        return None
+    if version != _definition_cache_version or stamp_cached != stamp:
+        return None
+    return value
+
+
+def _dump_cache_file(cache_file, stamp, value):
+    try:
+        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+        cache_file_tmp = f"{cache_file}.{os.getpid()}.tmp"
+        with open(cache_file_tmp, "wb") as fo:
+            pickle.dump(
+                (_definition_cache_version, stamp, value), fo,
+                protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(cache_file_tmp, cache_file)
+    except OSError as e:
+        logger.debug(f"failed write definition cache {cache_file}: {e}")
+
+
+def load_cached(loader, *paths):
+    '''Return ``loader(*paths)``, loaded once per process.
+
+       The value is reloaded when the modification time or size of any of
+       the files changes, and is shared by all the callers, so it must be
+       treated as read-only.
+
+       :param loader: the function to load the files
+       :type loader: callable
+
+       :param paths: the files to load, which may be None
+       :type paths: str
+
+       :return: the loaded value
+    '''
+    paths = tuple(
+        os.path.abspath(p) if p is not None else None for p in paths)
+    key = (loader.__name__.lstrip("_"), paths)
+    stamp = tuple(
+        (st.st_mtime_ns, st.st_size) if st is not None else None
+        for st in (os.stat(p) if p is not None else None for p in paths))
+    with _definition_cache_lock:
+        entry = _definition_cache.get(key, None)
+        if entry is not None and entry[0] == stamp:
+            return entry[1]
+        cache_file = _get_cache_file(key)
+        value = None
+        if cache_file is not None:
+            value = _load_cache_file(cache_file, stamp)
+        if value is None:
+            logger.debug(f"load {key[0]} from {paths}")
+            value = loader(*paths)
+            if cache_file is not None:
+                _dump_cache_file(cache_file, stamp, value)
+        _definition_cache[key] = (stamp, value)
+        return value
+
+
+def clear_definition_cache():
+    '''Drop the definitions loaded in this process.'''
+    with _definition_cache_lock:
+        _definition_cache.clear()
+
+
+class BlockDefinition(NamedTuple):
+    '''The definition of a metadata block as loaded from the CSV files.'''
+    datasetFields: pd.DataFrame
+    controlledVocabulary: Optional[pd.DataFrame]
+    schema: MetadataBlockSchema
+
+
+def _load_block_definition(dataset_file, vocabulary_file=None):
+    #TODO trim trailing spaces will will get us intro trouble possibly later
+    dataset_fields = pd.read_csv(dataset_file,skipinitialspace=True)
+    if vocabulary_file is not None:
+        controlled_vocabulary = pd.read_csv(vocabulary_file,skipinitialspace=True)
+    else:
+        controlled_vocabulary = None
+    return BlockDefinition(
+        dataset_fields, controlled_vocabulary,
+        MetadataBlockSchema.from_dataframes(
+            dataset_fields, controlled_vocabulary))
+
+
+def load_block_definition(dataset_file, vocabulary_file=None):
+    '''Return the BlockDefinition of the files, shared process-wide.'''
+    return load_cached(_load_block_definition, dataset_file, vocabulary_file)
+
+
+@functools.lru_cache(maxsize=None)
+def get_unit_factor(units, requnits):
+    '''Return the scale factor to convert values in `units` to `requnits`.
+
+       The factor is resolved by astropy once per pair of units and cached.
+    '''
+    return u.Unit(units).to(u.Unit(requnits))
+
+
+def convert_units(value, requnits, units=None):
+    '''Return `value` converted to `requnits`.
+
+       :param value: the value(s) to convert. Quantities are converted from
+           their own units, and plain values are in `units`, or in `requnits`
+           if `units` is None.
+       :type value: number, numpy.ndarray, list or astropy.units.Quantity
+
+       :param requnits: the required units
+       :type requnits: str or astropy.units.Unit
+
+       :param units: the units of plain values
+       :type units: str or astropy.units.Unit
+
+       :return: float for scalars, numpy.ndarray for arrays and lists
+    '''
+    if units is None and type(value) in (float, int):
+        # already in the required units
+        return float(value)
+    if isinstance(value, u.Quantity):
+        return value.value * get_unit_factor(value.unit, requnits)
+    factor = 1. if units is None else get_unit_factor(units, requnits)
+    if isinstance(value, (np.ndarray, list, tuple)):
+        return np.asarray(value, dtype=float) * factor
+    if isinstance(value, Number) and not isinstance(value, (bool, np.bool_)):
+        return float(value * factor)
+    # anything else, e.g., strings, is left to astropy
+    if units is None:
+        return u.Quantity(value, requnits).value
+    return u.Quantity(value, units).to(requnits).value
+
+
+def _get_table_columns(table, units):
+    '''Return the columns of `table` as arrays keyed by name.
+
+       The units of astropy columns are added to `units`, and quantity
+       columns are returned as is.
+    '''
+    if isinstance(table, pd.DataFrame):
+        columns = dict()
+        for k in table.columns:
+            col = table[k].to_numpy()
+            if col.dtype == object and any(isinstance(v, u.Quantity) for v in col):
+                raise ValueError(f"Column {k} holds astropy Quantities, which are not supported in a pandas DataFrame. Use an astropy QTable, or plain values with units given in `units`")
+            columns[str(k)] = col
+        return columns
+    if isinstance(table, Table):
+        columns = dict()
+        for k in table.colnames:
+            col = table[k]
+            if not isinstance(col, u.Quantity) and col.unit is not None:
+                if k in units:
+                    raise ValueError(f"You can't provide units for column {k} which has units {col.unit}")
+                units[k] = col.unit
+                col = col.data
+            elif isinstance(col, u.Quantity) and k in units:
+                raise ValueError(f"You can't provide units for column {k} which is a Quantity")
+            columns[k] = col
+        return columns
+    if isinstance(table, np.ndarray) and table.dtype.names is not None:
+        return {k: table[k] for k in table.dtype.names}
+    raise ValueError(f'Unsupported table type {type(table)}. Use a pandas DataFrame, astropy Table or numpy structured array')
+
 
 class MetadataBlock(object):
     '''Generic representation of a Dataverse metadata block.
@@ -30,11 +353,11 @@ class MetadataBlock(object):
         self._dataset_file = dataset_file
         # controlled vocabulary definition
         self._vocabulary_file = vocabulary_file
-        #TODO trim trailing spaces will will get us intro trouble possibly later
-        self._datasetFields = pd.read_csv(dataset_file,skipinitialspace=True)
-        self._datasetFields.set_index("parent")
-        if vocabulary_file is not None:
-            self._controlledVocabulary = pd.read_csv(vocabulary_file,skipinitialspace=True)
+        # the definitions are shared by all blocks of the same files
+        definition = load_block_definition(dataset_file, vocabulary_file)
+        self._datasetFields = definition.datasetFields
+        self._controlledVocabulary = definition.controlledVocabulary
+        self._schema = definition.schema
         # The actual metadata
         self._metadata = dict()
         self._version = None
@@ -52,9 +375,14 @@ class MetadataBlock(object):
     def datasetFields(self):
         return self._datasetFields
 
+    @property
+    def schema(self):
+        '''The compiled definition of the dataset fields'''
+        return self._schema
+
     @property
     def keys(self):
-        return list(self._datasetFields['name'])
+        return list(self._schema.names)
 
     @property
     def controlledVocabularyColnames(self):
@@ -73,17 +401,24 @@ class MetadataBlock(object):
         return self._version
 
     def is_recognized_field(self,name):
-        return name in self._datasetFields['name'].values
+        return name in self._schema
+
+    def _get_field(self,name):
+        field = self._schema.get(name)
+        if field is None:
+            raise Exception(f'{name} is not a valid dataset field')
+        return field
 
     def add_metadata(self,name,value,units=None):
-        if not self.is_recognized_field(name):
+        field = self._schema.get(name)
+        if field is None:
             raise KeyError(f'{name} is not a recognized dataset field in {self.name}')
         # check parent-child relationship of inputs
-        isparent = self._is_parent(name)
+        isparent = field.is_parent
         if isparent  and type(value) is not dict:
             raise ValueError(f'Dataset field {self.name} has children whose values must be passed as a dict: {self.get_children(name)}')
-        if self._has_parent(name):
-            parent = self.get_parent(name)
+        if field.has_parent:
+            parent = field.parent
             raise ValueError(f'Dataset field "{name}" is a child of "{parent}" and passed as a dict member for "{parent}". e.g. add_metadata({parent},{{"{name}":...}}')
 
         value_checked = self._check_units(name,value,units)
@@ -108,6 +443,65 @@ class MetadataBlock(object):
             else:
                 self._metadata[name] = float(value_checked[name])
 
+    def add_metadata_table(self,name,table,units=None):
+        '''Add the entries of a compound dataset field from a table.
+
+           This is the bulk version of calling `add_metadata` with the dict
+           of each row. The units and controlled vocabularies are checked
+           column-wise, and the unit conversion is done on whole columns.
+
+           :param name: the parent dataset field, e.g., "obsInfo" or "band"
+           :type name: str
+
+           :param table: the table with one row per entry, and the children
+               dataset fields as columns. The units of astropy columns and
+               quantities are honored.
+           :type table: pandas.DataFrame, astropy.table.Table or numpy structured array
+
+           :param units: the units of plain columns keyed by column name.
+               Columns not listed are assumed in the required units.
+           :type units: dict
+        '''
+        field = self._schema.get(name)
+        if field is None:
+            raise KeyError(f'{name} is not a recognized dataset field in {self.name}')
+        if not field.is_parent:
+            raise ValueError(f'Dataset field "{name}" has no children. Use add_metadata({name},...)')
+        units = dict(units or {})
+        columns = _get_table_columns(table,units)
+        unknown = [c for c in columns if c not in field.children]
+        if unknown:
+            raise ValueError(f'{unknown} are not children of dataset field {name} in {self.name}: {field.children}')
+        unknown = [c for c in units if c not in columns]
+        if unknown:
+            raise ValueError(f'units are given for {unknown} not in the table')
+
+        values = dict()
+        for k,col in columns.items():
+            child = self._schema[k]
+            if child.units is not None:
+                mask = np.ma.getmask(col)
+                try:
+                    col = convert_units(np.ma.getdata(col),child.units,units.get(k,None))
+                except Exception as ex:
+                    raise ValueError(f'Error converting units for {k}: {ex}. Required units are {child.units}.')
+                if mask is not np.ma.nomask:
+                    # masked entries become None
+                    col = np.ma.array(col,mask=mask)
+            elif k in units or isinstance(col, u.Quantity):
+                raise ValueError(f'Dataset field {k} has no units but units are given')
+            # native python values for the yaml writer
+            values[k] = col.tolist()
+            if child.vocabulary:
+                for v in dict.fromkeys(values[k]):
+                    if not self._schema.is_allowed(k,v):
+                        s =  self._allowed_values(k)
+                        raise ValueError(f'{v} is not a valid value for dataset field {k} in {self.name}. Allowed values are: {s}.')
+
+        entries = [dict(zip(values.keys(),row)) for row in zip(*values.values())]
+        if entries:
+            self._metadata.setdefault(name,[]).extend(entries)
+
     def is_controlled(self,name):
         av = self._allowed_values(name)
         return len(av) != 0
@@ -117,8 +511,7 @@ class MetadataBlock(object):
            (i.e., the enums).  Will return empty list if the variable
            is not controlled
         '''
-        series =  self._controlledVocabulary.loc[self._controlledVocabulary["DatasetField"] == name]["Value"]
-        return series.values
+        return self._schema.allowed_values(name)
 
     def _check_controlled(self,name,value):
         '''Check that `value` is allowable for key `name`.  If `name` is governed by a controlled vocabulary, `value` must be in the vocabulary.
@@ -132,8 +525,7 @@ class MetadataBlock(object):
            :rtype: bool
            :return: True if `value` is in a controlled vocabulary of `name` or is not controlled. False otherwise.
         '''
-        s =  self._allowed_values(name,value)
-        return s.size == 0 or value in s
+        return self._schema.is_allowed(name,value)
 
     def _check_units(self,name,value,units):
         '''always returns a dict with key=name, value is value in defined units'''
@@ -151,65 +543,42 @@ class MetadataBlock(object):
 
         if requnits is not None:
           try :
-            if units is None:
-                q = u.Quantity(value,requnits)
-            else:
-                q = u.Quantity(value,units).to(requnits)
+            parsed_dict[name] = convert_units(value,requnits,units)
           except Exception as ex:
             raise ValueError(f'Error converting units for {name}: {ex}. Required units are {requnits}.')
-          parsed_dict[name] = q.value
-          if type(parsed_dict[name]) is not str:
+          if isinstance(parsed_dict[name], (np.ndarray, np.generic)):
             parsed_dict[name] =  parsed_dict[name].item()
         else:
           parsed_dict[name] = value
         return parsed_dict
 
     def _has_units(self,name):
-        # duh use is recognized data
-        df = self._datasetFields[self._datasetFields['name'] == name]
-        if df.empty:
-            raise Exception(f'{name} is not a valid dataset field')
-        return not df["units"].dropna().empty
+        return self._get_field(name).units is not None
 
     def get_units(self,name):
-        df = self._datasetFields[self._datasetFields['name'] == name]
-        if df.empty:
-            raise Exception(f'{name} is not a valid dataset field')
-        if "units" not in df.columns or pd.isnull(df["units"].iloc[0]):
-            return None
-        else:
-            return df["units"].iloc[0]
+        return self._get_field(name).units
 
     def _has_parent(self,name):
-        df = self._datasetFields[self._datasetFields['name'] == name]
-        if df.empty:
-            raise Exception(f'{name} is not a valid dataset field')
-        return df.notna()["parent"].values[0]
+        return self._get_field(name).has_parent
 
     def _is_parent(self,name):
-        df = self._datasetFields[self._datasetFields['name'] == name]
-        if df.empty:
-            raise Exception(f'{name} is not a valid dataset field')
-        return df["fieldType"].values[0] == "none"
+        return self._get_field(name).is_parent
 
     def get_parent(self,name):
-        df = self._datasetFields[self._datasetFields['name'] == name]
-        if df.empty:
-            raise Exception(f'{name} is not a valid dataset field')
-        return df["parent"].values[0]
+        return self._get_field(name).parent
 
     def get_children(self,name):
         '''Identify the children of the given dataset field
 
         :param name: the parent field to check for children
         :type name: str
-        :return: list of names of children. This list will be empty if the input field has no children
-        :rtype: numpy.ndarray
+        :return: names of children. Raises if the input field has no children
+        :rtype: tuple
         '''
-        df = self._datasetFields[self._datasetFields['parent'] == name]
-        if df.empty:
+        children = self._get_field(name).children
+        if not children:
             raise Exception(f'{name} is not a valid dataset field')
-        return df['name'].values
+        return children
 
     def to_yaml(self):
         comment = f"# {self.name} metadata block version {self.version}"
@@ -253,17 +622,17 @@ class MetadataBlock(object):
         :returns: list with key names of missing metadata. Empty if none missing
         '''
         missing = []
-        for k in self._datasetFields['name'].values:
+        for field in self._schema.fields.values():
+            k = field.name
             value = self._metadata.get(k,None)
             #print(k,type(value))
-            if value is None and not self._has_parent(k):
+            if value is None and not field.has_parent:
                 missing.append(k)
-            if self._is_parent(k):
+            if field.is_parent:
                 if type(value) is list:
                 # it will be a list of dictionaries
                     for v in value:
-                        children = self.get_children(k)
-                        for c in children:
+                        for c in field.children:
                             if v.get(c,None) is None:
                                 missing.append(c)
                 else:
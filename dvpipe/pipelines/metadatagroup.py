@@ -10,6 +10,8 @@ class MetadataGroup(object):
     def __init__(self, name):
         self._name = name
         self._blocks = dict()
+        # dataset field name -> block
+        self._field_blocks = dict()
 
     @property
     def name(self):
@@ -21,12 +23,27 @@ class MetadataGroup(object):
 
     def add_block(self, key, block):
         self._blocks[key] = block
+        # the first block defining a field takes it
+        field_blocks = dict()
+        for b in self._blocks.values():
+            for name in b.schema.names:
+                field_blocks.setdefault(name, b)
+        self._field_blocks = field_blocks
 
     def add_metadata(self, name, value, units=None):
-        for b in self._blocks.values():
-            if b.is_recognized_field(name):
-                b.add_metadata(name, value, units)
-                return
+        b = self._field_blocks.get(name, None)
+        if b is not None:
+            b.add_metadata(name, value, units)
+            return
+        raise KeyError(
+            f"{name} is not a recognized dataset field in metadatablocks: {list(self._blocks.keys())}"
+        )
+
+    def add_metadata_table(self, name, table, units=None):
+        b = self._field_blocks.get(name, None)
+        if b is not None:
+            b.add_metadata_table(name, table, units)
+            return
         raise KeyError(
             f"{name} is not a recognized dataset field in metadatablocks: {list(self._blocks.keys())}"
         )
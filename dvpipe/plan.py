@@ -0,0 +1,494 @@
+import asyncio
+import math
+import os
+from dataclasses import asdict, dataclass, field
+from typing import List, Optional
+
+from loguru import logger
+
+from ._async import call, run_sync
+from .checksum import is_same_file
+from .dataverse import (
+    DVDataset, get_datafiles_async, get_latest_version, get_metadata_hash,
+    publish_datasets_async, resolve_dataset_pids_async, upload_dataset_async)
+from .manifest import DatafileManifest
+from .utils import yaml
+
+
+__all__ = [
+    'PlanAction', 'DatasetPlan', 'UploadPlan', 'make_plan', 'execute_plan',
+    'update_output_versions']
+
+
+@dataclass
+class PlanAction:
+    """An action of the upload plan."""
+
+    kind: str
+    """One of 'create_dataset', 'update_metadata', 'skip_metadata',
+    'create_file', 'replace_file', 'skip_file', 'register_files' and
+    'publish'."""
+
+    label: Optional[str] = None
+    """The label of the file."""
+
+    file_id: Optional[int] = None
+    """The id of the file to be replaced."""
+
+    n_bytes: int = 0
+    """The number of bytes to transfer."""
+
+    n_requests: int = 1
+    """The estimated number of requests."""
+
+
+@dataclass
+class DatasetPlan:
+    """The upload plan of one dataset index."""
+
+    dataset_index: dict
+    action_on_exist: str
+    pid: Optional[str] = None
+    """The pid of the existing dataset, or None if to be created."""
+
+    actions: List[PlanAction] = field(default_factory=list)
+    output: Optional[str] = None
+    """The path to write the output index file to."""
+
+    @property
+    def title(self):
+        return self.dataset_index["dataset"]["title"]
+
+    @property
+    def n_bytes(self):
+        return sum(a.n_bytes for a in self.actions)
+
+    @property
+    def n_requests(self):
+        return sum(a.n_requests for a in self.actions)
+
+    @property
+    def file_plan(self):
+        """The file actions to be passed to `upload_dataset`."""
+        kinds = {
+            'create_file': 'create',
+            'replace_file': 'replace',
+            'skip_file': 'skip',
+            }
+        return {
+            a.label: (kinds[a.kind], a.file_id)
+            for a in self.actions if a.kind in kinds}
+
+    @property
+    def metadata_plan(self):
+        """The metadata action to be passed to `upload_dataset`."""
+        kinds = {
+            'update_metadata': 'update',
+            'skip_metadata': 'skip',
+            }
+        for a in self.actions:
+            if a.kind in kinds:
+                return kinds[a.kind]
+        return None
+
+    def to_dict(self):
+        return {
+            "title": self.title,
+            "pid": self.pid,
+            "action_on_exist": self.action_on_exist,
+            "output": None if self.output is None else str(self.output),
+            "n_bytes": self.n_bytes,
+            "n_requests": self.n_requests,
+            "actions": [
+                {k: v for k, v in asdict(a).items() if v is not None}
+                for a in self.actions],
+            "dataset_index": self.dataset_index,
+            }
+
+    @classmethod
+    def from_dict(cls, data):
+        """Return the plan from the dict made by `to_dict`."""
+        return cls(
+            dataset_index=data["dataset_index"],
+            action_on_exist=data["action_on_exist"],
+            pid=data.get("pid", None),
+            actions=[PlanAction(**a) for a in data.get("actions", [])],
+            output=data.get("output", None),
+            )
+
+
+@dataclass
+class UploadPlan:
+    """The upload plan of a set of dataset indices."""
+
+    parent_id: str
+    publish_type: str = "none"
+    direct_upload: bool = False
+    metadata_only: bool = False
+    """If True, files of existing datasets are skipped."""
+
+    datasets: List[DatasetPlan] = field(default_factory=list)
+
+    @property
+    def n_bytes(self):
+        return sum(d.n_bytes for d in self.datasets)
+
+    @property
+    def n_requests(self):
+        return sum(d.n_requests for d in self.datasets)
+
+    def summary(self):
+        """Return the counts of actions, bytes and requests of the plan."""
+        counts = dict()
+        for d in self.datasets:
+            for a in d.actions:
+                counts[a.kind] = counts.get(a.kind, 0) + 1
+        return {
+            "n_datasets": len(self.datasets),
+            "n_actions": counts,
+            "n_bytes": self.n_bytes,
+            "n_requests": self.n_requests,
+            }
+
+    def to_dict(self):
+        return {
+            "parent_id": self.parent_id,
+            "publish_type": self.publish_type,
+            "direct_upload": self.direct_upload,
+            "metadata_only": self.metadata_only,
+            "summary": self.summary(),
+            "datasets": [d.to_dict() for d in self.datasets],
+            }
+
+    @classmethod
+    def from_dict(cls, data):
+        """Return the plan from the dict made by `to_dict`.
+
+        This allows a plan written to file to be executed later.
+        """
+        return cls(
+            parent_id=data["parent_id"],
+            publish_type=data.get("publish_type", "none"),
+            direct_upload=data.get("direct_upload", False),
+            metadata_only=data.get("metadata_only", False),
+            datasets=[
+                DatasetPlan.from_dict(d) for d in data.get("datasets", [])],
+            )
+
+
+_modify_action_kinds = {
+    'create_dataset', 'update_metadata', 'create_file', 'replace_file'}
+"""The kinds of actions that change the dataset."""
+
+
+def _estimate_file_requests(kind, n_bytes, direct_upload, part_size):
+    if direct_upload:
+        # request urls, put parts and complete, the files are registered
+        # in batches separately
+        n_parts = max(math.ceil(n_bytes / part_size), 1)
+        return 1 + n_parts + (1 if n_parts > 1 else 0)
+    # replace also updates the restrict flag
+    return 2 if kind == "replace_file" else 1
+
+
+async def make_plan_async(
+        dv_config, parent_id, dataset_indices,
+        action_on_exist="none", metadata_only=False, publish_type="none",
+        direct_upload=False, checksum_cache=None, catalog=None,
+        chunk_size=50, part_size=1024 ** 3, register_batch_size=100):
+    """Async version of `make_plan`."""
+    dataset_indices = list(dataset_indices)
+    if action_on_exist == "create":
+        existing_pids = dict()
+    elif catalog is not None and catalog.subtree == parent_id:
+        existing_pids = {
+            d["dataset"]["title"]: catalog.find_datasets(d["dataset"]["title"])
+            for d in dataset_indices}
+    else:
+        existing_pids = await resolve_dataset_pids_async(
+            dv_config, parent_id, dataset_indices, chunk_size=chunk_size)
+        catalog = None
+
+    def _file_action(kind, data, file_id=None):
+        n_bytes = 0
+        n_requests = 0
+        if kind != "skip_file":
+            n_bytes = os.path.getsize(data["filename"])
+            n_requests = _estimate_file_requests(
+                kind, n_bytes, direct_upload, part_size)
+        return PlanAction(
+            kind=kind, label=data["label"], file_id=file_id,
+            n_bytes=n_bytes, n_requests=n_requests)
+
+    def _register_action(actions):
+        # one request for each of the new and the replaced files of a batch
+        n_requests = sum(
+            math.ceil(
+                sum(a.kind == kind for a in actions) / register_batch_size)
+            for kind in ["create_file", "replace_file"])
+        if n_requests == 0:
+            return None
+        return PlanAction(kind="register_files", n_requests=n_requests)
+
+    async def _get_remote_files(pid):
+        items = None
+        if catalog is not None:
+            items = catalog.get_datafiles(pid)
+        if items is None:
+            return await get_datafiles_async(dv_config, pid, manifest=True)
+        return DatafileManifest.from_items(items)
+
+    async def _plan_files(pid, dataset_index):
+        files_remote = await _get_remote_files(pid)
+
+        async def _plan_file(data):
+            entry = files_remote.get(
+                data["label"], data.get("directoryLabel", None))
+            if entry is None:
+                return _file_action("create_file", data)
+            if await call(
+                    dv_config, is_same_file, data["filename"],
+                    entry.datafile_meta, checksum_cache=checksum_cache):
+                return _file_action("skip_file", data)
+            return _file_action(
+                "replace_file", data, file_id=entry.file_id)
+
+        return await asyncio.gather(
+            *(_plan_file(data) for data in dataset_index["files"]))
+
+    # the states of the latest versions queried, keyed by pid
+    latest_version_states = dict()
+
+    async def _query_latest_version(pid):
+        latest_version = await call(
+            dv_config, get_latest_version, dv_config, pid)
+        latest_version_states[pid] = latest_version.get("versionState", None)
+        return latest_version
+
+    async def _plan_metadata(pid, dataset_index):
+        ds = DVDataset()
+        ds.set(dataset_index["dataset"])
+        metadata_hash = get_metadata_hash(ds.to_dict()["datasetVersion"])
+        metadata_hash_remote = None
+        if catalog is not None:
+            metadata_hash_remote = catalog.get_metadata_hash(pid)
+        if metadata_hash_remote is None:
+            metadata_hash_remote = get_metadata_hash(
+                await _query_latest_version(pid))
+        if metadata_hash == metadata_hash_remote:
+            return PlanAction(kind="skip_metadata", n_requests=0)
+        return PlanAction(kind="update_metadata")
+
+    async def _needs_publish(plan):
+        # an unchanged dataset is only published if it has a draft, as
+        # dataverse rejects publishing a released version again.
+        if plan.pid is None or any(
+                a.kind in _modify_action_kinds for a in plan.actions):
+            return True
+        state = latest_version_states.get(plan.pid, None)
+        if state is None:
+            state = (await _query_latest_version(plan.pid)).get(
+                "versionState", None)
+        return state == "DRAFT"
+
+    async def _plan_dataset(dataset_index):
+        title = dataset_index["dataset"]["title"]
+        pids = existing_pids.get(title, None) or []
+        if len(pids) > 1:
+            logger.warning(
+                f"multiple datasets found with title={title}, "
+                f"use the latest pid={pids[0]}")
+        plan = DatasetPlan(
+            dataset_index=dataset_index, action_on_exist=action_on_exist)
+        if not pids:
+            plan.actions.append(PlanAction(kind="create_dataset"))
+            plan.actions.extend(
+                _file_action("create_file", data)
+                for data in dataset_index["files"])
+        else:
+            plan.pid = pid = pids[0]
+            if action_on_exist == "update":
+                plan.actions.append(await _plan_metadata(pid, dataset_index))
+                if not metadata_only:
+                    plan.actions.extend(await _plan_files(pid, dataset_index))
+        if direct_upload:
+            register_action = _register_action(plan.actions)
+            if register_action is not None:
+                plan.actions.append(register_action)
+        if publish_type != "none" and await _needs_publish(plan):
+            plan.actions.append(PlanAction(kind="publish"))
+        return plan
+
+    datasets = await asyncio.gather(
+        *(_plan_dataset(d) for d in dataset_indices))
+    return UploadPlan(
+        parent_id=parent_id, publish_type=publish_type,
+        direct_upload=direct_upload, metadata_only=metadata_only,
+        datasets=list(datasets))
+
+
+def make_plan(
+        dv_config, parent_id, dataset_indices,
+        action_on_exist="none", metadata_only=False, publish_type="none",
+        direct_upload=False, checksum_cache=None, catalog=None,
+        chunk_size=50, part_size=1024 ** 3, register_batch_size=100):
+    """Make the plan to upload `dataset_indices` without changing anything.
+
+    The existing datasets are resolved in bulk, and the local files are
+    compared with the existing files to decide the action of each file.
+
+    Parameters
+    ----------
+    dv_config : dvpipe.core.DataverseConfig
+        The dataverse connection config.
+    parent_id : str
+        The identifier of the parent dataverse.
+    dataset_indices : list
+        The dataset index dicts.
+    action_on_exist : {'none', 'update', 'create'}
+        The action to take when the dataset exists, see `upload_dataset`.
+    metadata_only : bool
+        If True, files of existing datasets are skipped.
+    publish_type : {'none', 'major', 'minor', 'updatecurrent'}
+        How the datasets are published.
+    direct_upload : bool
+        If True, the request counts are estimated for direct uploads.
+    checksum_cache : dvpipe.checksum.ChecksumCache, optional
+        If set, local file checksums are looked up from the cache.
+    catalog : dvpipe.catalog.DataverseCatalog, optional
+        If set and it mirrors `parent_id`, the existing datasets and files
+        are looked up from the catalog.
+    chunk_size : int
+        The max number of titles in one search query.
+    part_size : int
+        The assumed part size of multipart direct uploads, to estimate
+        the request counts.
+    register_batch_size : int
+        The max number of files registered in one request of direct
+        uploads, to estimate the request counts.
+
+    Returns
+    -------
+    UploadPlan
+        The plan.
+    """
+    return run_sync(make_plan_async(
+        dv_config, parent_id, dataset_indices,
+        action_on_exist=action_on_exist, metadata_only=metadata_only,
+        publish_type=publish_type, direct_upload=direct_upload,
+        checksum_cache=checksum_cache, catalog=catalog,
+        chunk_size=chunk_size, part_size=part_size,
+        register_batch_size=register_batch_size))
+
+
+def update_output_versions(output, versions):
+    """Update the dataset versions in the output index file `output`.
+
+    Parameters
+    ----------
+    output : str or Path
+        The output index file written by `upload_dataset`.
+    versions : dvpipe.result.ResultTable
+        The versions of the dataset, as returned by `get_versions`.
+    """
+    with open(output, "r") as fo:
+        index_out = yaml.load(fo)
+    index_out["meta"]["dataset"]["versions"] = versions.to_records()
+    with open(output, "w") as fo:
+        yaml.dump(index_out, fo)
+
+
+async def execute_plan_async(
+        dv_config, plan, max_datasets=4, max_workers=1,
+        max_publish=8, **kwargs):
+    """Async version of `execute_plan`."""
+    semaphore = asyncio.Semaphore(max_datasets)
+
+    async def _execute(dataset_plan):
+        async with semaphore:
+            if not dataset_plan.actions:
+                logger.info(
+                    f"nothing to do for dataset title={dataset_plan.title}")
+                return dataset_plan.pid
+            return await upload_dataset_async(
+                dv_config,
+                plan.parent_id,
+                dataset_plan.dataset_index,
+                action_on_exist=dataset_plan.action_on_exist,
+                # the datasets are published in a separate stage
+                publish_type="none",
+                output=dataset_plan.output,
+                direct_upload=plan.direct_upload,
+                metadata_only=plan.metadata_only,
+                max_workers=max_workers,
+                existing_pids=[dataset_plan.pid] if dataset_plan.pid else [],
+                file_plan=dataset_plan.file_plan,
+                metadata_plan=dataset_plan.metadata_plan,
+                **kwargs)
+
+    results = await asyncio.gather(
+        *(_execute(d) for d in plan.datasets), return_exceptions=True)
+    errors = [
+        (d, r) for d, r in zip(plan.datasets, results)
+        if isinstance(r, Exception)]
+    for d, e in errors:
+        logger.error(f"failed upload dataset title={d.title}: {e}")
+    if errors:
+        error_info = "\n".join(f"{d.title}: {e}" for d, e in errors)
+        raise ValueError(
+            f"Failed upload {len(errors)} of {len(plan.datasets)} "
+            f"datasets:\n{error_info}")
+    # only the datasets planned to be published, as publishing unchanged
+    # released datasets is rejected by dataverse.
+    to_publish = [
+        (d, pid) for d, pid in zip(plan.datasets, results)
+        if any(a.kind == "publish" for a in d.actions)]
+    if plan.publish_type == "none" or not to_publish:
+        return results
+    logger.info(
+        f"publish {len(to_publish)} of {len(results)} datasets")
+    versions = await publish_datasets_async(
+        dv_config, [pid for _, pid in to_publish],
+        publish_type=plan.publish_type,
+        max_concurrency=max_publish,
+        lock_timeout=kwargs.get("lock_timeout", 600.))
+    for dataset_plan, pid in to_publish:
+        if dataset_plan.output is not None:
+            update_output_versions(dataset_plan.output, versions[pid])
+    return results
+
+
+def execute_plan(
+        dv_config, plan, max_datasets=4, max_workers=1, max_publish=8,
+        **kwargs):
+    """Execute the upload plan.
+
+    The datasets are uploaded in parallel, and the files of each dataset
+    are handled as decided in the plan. Once all the datasets are uploaded,
+    they are published together with `publish_datasets` if requested.
+
+    Parameters
+    ----------
+    dv_config : dvpipe.core.DataverseConfig
+        The dataverse connection config.
+    plan : UploadPlan
+        The plan made by `make_plan`.
+    max_datasets : int
+        The max number of datasets to upload in parallel.
+    max_workers : int
+        The max number of files of each dataset to upload in parallel.
+    max_publish : int
+        The max number of datasets to publish in parallel.
+    **kwargs :
+        The other arguments passed to `upload_dataset`. The
+        ``direct_upload`` and ``metadata_only`` are taken from the plan.
+
+    Returns
+    -------
+    list
+        The pids of the datasets.
+    """
+    return run_sync(execute_plan_async(
+        dv_config, plan,
+        max_datasets=max_datasets, max_workers=max_workers,
+        max_publish=max_publish, **kwargs))
@@ -0,0 +1,106 @@
+__all__ = ['ResultTable']
+
+
+class ResultTable(object):
+    """A lightweight columnar container of dataverse query results.
+
+    The columns are plain lists of the item values, built in one pass over
+    the items, with None for the keys missing in some items. Conversions to
+    `astropy.table.Table` and `pandas.DataFrame` are done on demand.
+
+    Parameters
+    ----------
+    columns : dict
+        The lists of values keyed by the column names. All lists have to be
+        of the same length.
+    meta : dict, optional
+        The metadata, e.g., the ``response_data`` of the query.
+    """
+
+    def __init__(self, columns=None, meta=None):
+        self._columns = dict(columns or {})
+        lengths = {len(c) for c in self._columns.values()}
+        if len(lengths) > 1:
+            raise ValueError(f"mismatch column lengths {lengths}")
+        self._len = lengths.pop() if lengths else 0
+        self.meta = dict(meta or {})
+
+    @classmethod
+    def from_items(cls, items, meta=None):
+        """Return the result of the list of dicts `items`."""
+        columns = dict()
+        for i, item in enumerate(items):
+            for key, value in item.items():
+                column = columns.get(key, None)
+                if column is None:
+                    column = columns[key] = [None] * i
+                column.append(value)
+            if len(item) < len(columns):
+                for column in columns.values():
+                    if len(column) <= i:
+                        column.append(None)
+        return cls(columns, meta=meta)
+
+    @property
+    def colnames(self):
+        return list(self._columns.keys())
+
+    def __len__(self):
+        return self._len
+
+    def _row(self, i):
+        return {k: c[i] for k, c in self._columns.items()}
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return self._columns[key]
+        if isinstance(key, (list, tuple)):
+            return self.__class__(
+                {k: self._columns[k] for k in key}, meta=self.meta)
+        if isinstance(key, slice):
+            return self.__class__(
+                {k: c[key] for k, c in self._columns.items()}, meta=self.meta)
+        if key < -self._len or key >= self._len:
+            raise IndexError(f"row index {key} out of range")
+        return self._row(key)
+
+    def __iter__(self):
+        for i in range(self._len):
+            yield self._row(i)
+
+    def to_records(self):
+        """Return the rows as a list of dicts."""
+        return list(self)
+
+    def to_table(self):
+        """Return the result as `astropy.table.Table` of object columns."""
+        import numpy as np
+        from astropy.table import Table
+
+        tbl = Table()
+        for k, c in self._columns.items():
+            # filled item by item so nested lists are not broadcast
+            data = np.empty((self._len, ), dtype=object)
+            for i, v in enumerate(c):
+                data[i] = v
+            tbl[k] = data
+        tbl.meta.update(self.meta)
+        return tbl
+
+    def to_pandas(self):
+        """Return the result as `pandas.DataFrame`."""
+        import pandas as pd
+
+        df = pd.DataFrame(self._columns, columns=self.colnames)
+        df.attrs.update(self.meta)
+        return df
+
+    def __str__(self):
+        if not self._columns:
+            return f"<{self.__class__.__name__} length=0>"
+        return str(self.to_pandas())
+
+    def __repr__(self):
+        return (
+            f"<{self.__class__.__name__} length={self._len} "
+            f"colnames={self.colnames}>")
@@ -0,0 +1,284 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+import requests
+from loguru import logger
+from pydantic import BaseModel
+from requests.adapters import HTTPAdapter
+
+from pyDataverse.api import DataAccessApi, NativeApi, MetricsApi, SearchApi
+from pyDataverse.exceptions import ApiAuthorizationError, OperationFailedError
+
+
+__all__ = [
+    'HttpConfig', 'PooledHTTPAdapter', 'get_session', 'get_pooled_api',
+    'connection_stats', 'get_executor']
+
+
+class HttpConfig(BaseModel):
+    """The config class for the pooled HTTP connections."""
+
+    pool_connections: int = 4
+    """The number of per-host connection pools to keep."""
+
+    pool_maxsize: int = 16
+    """The max number of keep-alive connections per host."""
+
+    pool_block: bool = False
+    """If True, block when all connections to a host are in use."""
+
+    connect_timeout: float = 10.
+    """The timeout in seconds to establish a connection."""
+
+    read_timeout: Optional[float] = None
+    """The timeout in seconds to wait for the server response.
+
+    This applies to every request including the file uploads, for which
+    the server only responds after the whole file is received and
+    processed, so it is not set by default. Set it to fail fast on
+    unresponsive servers when the files are small enough to be sent within
+    the timeout.
+    """
+
+    max_retries: int = 0
+    """The number of retries on failed connection attempts."""
+
+    max_concurrency: int = 8
+    """The max number of requests in flight for the async API.
+
+    This should not exceed `pool_maxsize` so that all concurrent requests
+    can be served with keep-alive connections.
+    """
+
+    @property
+    def timeout(self):
+        return (self.connect_timeout, self.read_timeout)
+
+
+class PooledHTTPAdapter(HTTPAdapter):
+    """A HTTP adapter that keeps track of connection reuse.
+
+    The counts of requests sent and connections opened are collected so
+    that the effectiveness of the keep-alive pool can be checked.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self._stats_lock = threading.Lock()
+        self._n_requests = 0
+        self._n_connections_disposed = 0
+        super().__init__(*args, **kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        # keep the connection counts of pools evicted from the manager.
+        pools = self.poolmanager.pools
+        dispose_func = pools.dispose_func
+
+        def _dispose(pool):
+            with self._stats_lock:
+                self._n_connections_disposed += pool.num_connections
+            if dispose_func is not None:
+                dispose_func(pool)
+        pools.dispose_func = _dispose
+
+    def send(self, request, **kwargs):
+        with self._stats_lock:
+            self._n_requests += 1
+        return super().send(request, **kwargs)
+
+    def connection_stats(self):
+        """Return the request and connection counts of this adapter."""
+        pools = self.poolmanager.pools
+        n_connections = sum(
+            pools[key].num_connections for key in pools.keys())
+        with self._stats_lock:
+            n_requests = self._n_requests
+            n_connections += self._n_connections_disposed
+        return {
+            'requests': n_requests,
+            'connections': n_connections,
+            'reused': max(n_requests - n_connections, 0),
+            }
+
+
+_registry_lock = threading.Lock()
+_sessions = dict()
+_apis = dict()
+_executors = dict()
+
+
+def _process_key(http_config):
+    # sessions are not safe to share across forked processes.
+    return (os.getpid(), http_config.json())
+
+
+def get_session(http_config):
+    """Return the shared `requests.Session` for `http_config`.
+
+    One session is created per process and per config, such that all
+    the API instances share the same keep-alive connection pool.
+    """
+    key = _process_key(http_config)
+    with _registry_lock:
+        session = _sessions.get(key, None)
+        if session is None:
+            session = requests.Session()
+            adapter = PooledHTTPAdapter(
+                pool_connections=http_config.pool_connections,
+                pool_maxsize=http_config.pool_maxsize,
+                pool_block=http_config.pool_block,
+                max_retries=http_config.max_retries,
+                )
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            _sessions[key] = session
+            logger.debug(f"created pooled http session {key}")
+    return session
+
+
+def get_executor(http_config):
+    """Return the shared thread pool that runs the blocking requests.
+
+    The pool size is `http_config.max_concurrency`, which bounds the number
+    of requests in flight issued via the async API.
+    """
+    key = _process_key(http_config)
+    with _registry_lock:
+        executor = _executors.get(key, None)
+        if executor is None:
+            executor = ThreadPoolExecutor(
+                max_workers=http_config.max_concurrency,
+                thread_name_prefix='dvpipe_http',
+                )
+            _executors[key] = executor
+    return executor
+
+
+def connection_stats(http_config):
+    """Return the connection reuse stats of the session for `http_config`."""
+    session = get_session(http_config)
+    stats = {'requests': 0, 'connections': 0, 'reused': 0}
+    for adapter in set(session.adapters.values()):
+        if not isinstance(adapter, PooledHTTPAdapter):
+            continue
+        for k, v in adapter.connection_stats().items():
+            stats[k] += v
+    return stats
+
+
+class _PooledApiMixin(object):
+    """A mixin class to route pyDataverse requests through a shared session.
+
+    The request methods mirror the ones in `pyDataverse.api.Api`, except
+    that the `params` are honored and extra keyword arguments are passed
+    to `requests.Session.request`.
+    """
+
+    session = None
+    http_config = None
+
+    def _make_params(self, params):
+        params = dict(params or {})
+        params["User-Agent"] = "pydataverse"
+        if self.api_token:
+            params["key"] = str(self.api_token)
+        return params
+
+    def _request(self, method, url, params=None, **kwargs):
+        kwargs.setdefault('timeout', self.http_config.timeout)
+        try:
+            return self.session.request(
+                method, url, params=self._make_params(params), **kwargs)
+        except requests.ConnectionError:
+            raise requests.ConnectionError(
+                f"ERROR: {method.upper()} - Could not establish connection "
+                f"to api {url}.")
+
+    @staticmethod
+    def _check_auth(method, url, resp):
+        if resp.status_code == 401:
+            error_msg = resp.json()["message"]
+            raise ApiAuthorizationError(
+                f"ERROR: {method.upper()} HTTP 401 - Authorization error "
+                f"{url}. MSG: {error_msg}")
+
+    def get_request(self, url, params=None, auth=False, **kwargs):
+        resp = self._request('get', url, params=params, **kwargs)
+        self._check_auth('get', url, resp)
+        if resp.status_code >= 300 and resp.text:
+            raise OperationFailedError(
+                f"ERROR: GET HTTP {resp.status_code} - {url}. "
+                f"MSG: {resp.text}")
+        return resp
+
+    def post_request(
+            self, url, data=None, auth=False, params=None, files=None,
+            **kwargs):
+        resp = self._request(
+            'post', url, params=params, data=data, files=files, **kwargs)
+        self._check_auth('post', url, resp)
+        return resp
+
+    def put_request(self, url, data=None, auth=False, params=None, **kwargs):
+        resp = self._request('put', url, params=params, data=data, **kwargs)
+        self._check_auth('put', url, resp)
+        return resp
+
+    def delete_request(self, url, auth=False, params=None, **kwargs):
+        return self._request('delete', url, params=params, **kwargs)
+
+
+class PooledDataAccessApi(_PooledApiMixin, DataAccessApi):
+    pass
+
+
+class PooledNativeApi(_PooledApiMixin, NativeApi):
+    pass
+
+
+class PooledMetricsApi(_PooledApiMixin, MetricsApi):
+    pass
+
+
+class PooledSearchApi(_PooledApiMixin, SearchApi):
+    pass
+
+
+_api_classes = {
+    'data_access': PooledDataAccessApi,
+    'native': PooledNativeApi,
+    'metrics': PooledMetricsApi,
+    'search': PooledSearchApi,
+    }
+
+
+def get_pooled_api(type, base_url, api_token, http_config):
+    """Return the memoized API instance of `type`.
+
+    Parameters
+    ----------
+    type : {'data_access', 'native', 'metrics', 'search'}
+        The type of API.
+    base_url : str
+        The base url of the dataverse instance.
+    api_token : str
+        The api token.
+    http_config : HttpConfig
+        The config of the connection pool.
+    """
+    api_cls = _api_classes.get(type, None)
+    if api_cls is None:
+        raise ValueError(f"Invalid api type {type}")
+    key = _process_key(http_config) + (type, base_url, api_token)
+    session = get_session(http_config)
+    with _registry_lock:
+        api = _apis.get(key, None)
+        if api is None:
+            api = api_cls(base_url=base_url, api_token=api_token)
+            api.session = session
+            api.http_config = http_config
+            _apis[key] = api
+            logger.debug(f"created dataverse api instance: {api}")
+    return api
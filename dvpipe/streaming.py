@@ -0,0 +1,342 @@
+import os
+import struct
+import time
+import uuid
+import zlib
+from dataclasses import dataclass, field
+
+from loguru import logger
+
+
+__all__ = [
+    'compute_crc32', 'StoredZipStream', 'MultipartEncoder',
+    'TransferProgress', 'ProgressLogger']
+
+
+_blocksize = 8 * 1024 * 1024
+
+_zip64_limit = 0xFFFFFFFF
+"""Sizes and offsets at or beyond this value require zip64 records."""
+
+_zip64_marker = 0xFFFFFFFF
+"""The value of the fields whose actual values are in zip64 records."""
+
+
+def compute_crc32(path, blocksize=_blocksize):
+    """Return the CRC-32 of the content of file `path`."""
+    crc = 0
+    buf = bytearray(blocksize)
+    view = memoryview(buf)
+    with open(path, 'rb', buffering=0) as fo:
+        while True:
+            n = fo.readinto(buf)
+            if not n:
+                break
+            crc = zlib.crc32(view[:n], crc)
+    return crc
+
+
+def _dos_datetime(timestamp):
+    t = time.localtime(timestamp)
+    year = max(t.tm_year, 1980)
+    dos_date = (year - 1980) << 9 | t.tm_mon << 5 | t.tm_mday
+    dos_time = t.tm_hour << 11 | t.tm_min << 5 | t.tm_sec // 2
+    return dos_time, dos_date
+
+
+class _ChainedStream(object):
+    """A base class for read-only file-like objects made of segments.
+
+    Subclasses implement `_make_segments`, which returns the list of bytes
+    and file objects to be read in order. The file objects are read in
+    chunks of the requested size, so the memory use is bounded by the
+    size of each read.
+    """
+
+    _segments = None
+
+    def _make_segments(self):
+        raise NotImplementedError
+
+    def open(self):
+        self._segments = self._make_segments()
+        return self
+
+    def close(self):
+        self._segments = None
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def read(self, n=-1):
+        if self._segments is None:
+            self.open()
+        if n is None or n < 0:
+            n = len(self)
+        chunks = list()
+        while n > 0 and self._segments:
+            segment = self._segments[0]
+            if isinstance(segment, bytes):
+                chunk = segment[:n]
+                if len(chunk) < len(segment):
+                    self._segments[0] = segment[n:]
+                else:
+                    self._segments.pop(0)
+            else:
+                chunk = segment.read(n)
+                if len(chunk) < n:
+                    self._segments.pop(0)
+            chunks.append(chunk)
+            n -= len(chunk)
+        return b''.join(chunks)
+
+
+class StoredZipStream(_ChainedStream):
+    """A read-only file-like object of a zip archive wrapping one file.
+
+    The file is stored without compression, and the archive is generated on
+    the fly while being read, so wrapping costs neither CPU time for
+    compression nor scratch disk space. Only the CRC-32 of the file has to
+    be computed in advance, because the consumers of the archive (e.g., the
+    dataverse unzip step) do not support data descriptors for stored
+    entries.
+
+    Parameters
+    ----------
+    path : str or Path
+        The path of the file to wrap.
+    arcname : str, optional
+        The name of the entry in the archive. Default is the file name.
+    crc : int, optional
+        The CRC-32 of the file, computed if not provided.
+    """
+
+    def __init__(self, path, arcname=None, crc=None):
+        self._path = path
+        if arcname is None:
+            arcname = os.path.basename(path)
+        st = os.stat(path)
+        size = st.st_size
+        if crc is None:
+            crc = compute_crc32(path)
+        self._size = size
+        self._header = self._make_local_header(arcname, size, crc, st.st_mtime)
+        self._trailer = self._make_trailer(
+            arcname, size, crc, st.st_mtime, len(self._header))
+        self._fo = None
+        self._segments = None
+
+    @staticmethod
+    def _encode_name(arcname):
+        try:
+            return arcname.encode('ascii'), 0
+        except UnicodeEncodeError:
+            # set the language encoding flag for utf-8 names
+            return arcname.encode('utf-8'), 0x800
+
+    @classmethod
+    def _make_local_header(cls, arcname, size, crc, mtime):
+        name, flags = cls._encode_name(arcname)
+        dos_time, dos_date = _dos_datetime(mtime)
+        if size >= _zip64_limit:
+            version = 45
+            extra = struct.pack('<HHQQ', 0x0001, 16, size, size)
+            size_field = _zip64_marker
+        else:
+            version = 20
+            extra = b''
+            size_field = size
+        return struct.pack(
+            '<IHHHHHIIIHH',
+            0x04034b50, version, flags, 0, dos_time, dos_date,
+            crc, size_field, size_field, len(name), len(extra)
+            ) + name + extra
+
+    @classmethod
+    def _make_trailer(cls, arcname, size, crc, mtime, header_size):
+        name, flags = cls._encode_name(arcname)
+        dos_time, dos_date = _dos_datetime(mtime)
+        cd_offset = header_size + size
+        zip64 = size >= _zip64_limit or cd_offset >= _zip64_limit
+        if size >= _zip64_limit:
+            extra = struct.pack('<HHQQ', 0x0001, 16, size, size)
+            size_field = _zip64_marker
+        else:
+            extra = b''
+            size_field = size
+        version = 45 if zip64 else 20
+        central_dir = struct.pack(
+            '<IHHHHHHIIIHHHHHII',
+            0x02014b50, version, version, flags, 0, dos_time, dos_date,
+            crc, size_field, size_field, len(name), len(extra), 0,
+            0, 0, 0o100644 << 16, 0,
+            ) + name + extra
+        cd_size = len(central_dir)
+        trailer = central_dir
+        if zip64:
+            zip64_eocd_offset = cd_offset + cd_size
+            trailer += struct.pack(
+                '<IQHHIIQQQQ',
+                0x06064b50, 44, 45, 45, 0, 0, 1, 1, cd_size, cd_offset)
+            trailer += struct.pack(
+                '<IIQI', 0x07064b50, 0, zip64_eocd_offset, 1)
+        trailer += struct.pack(
+            '<IHHHHIIH',
+            0x06054b50, 0, 0, 1, 1, cd_size,
+            _zip64_marker if zip64 else cd_offset, 0)
+        return trailer
+
+    def __len__(self):
+        return len(self._header) + self._size + len(self._trailer)
+
+    def _make_segments(self):
+        self._fo = open(self._path, 'rb')
+        return [self._header, self._fo, self._trailer]
+
+    def close(self):
+        if self._fo is not None:
+            self._fo.close()
+        self._fo = None
+        super().close()
+
+
+@dataclass
+class TransferProgress(object):
+    """The progress of a data transfer."""
+
+    name: str
+    bytes_total: int
+    bytes_sent: int = 0
+    t_start: float = field(default_factory=time.monotonic)
+
+    @property
+    def elapsed(self):
+        """The time in seconds since the start of the transfer."""
+        return time.monotonic() - self.t_start
+
+    @property
+    def throughput(self):
+        """The average throughput in bytes per second."""
+        elapsed = self.elapsed
+        if elapsed <= 0:
+            return 0.
+        return self.bytes_sent / elapsed
+
+    @property
+    def done(self):
+        return self.bytes_sent >= self.bytes_total
+
+
+class ProgressLogger(object):
+    """A progress callback that logs the transfer progress periodically.
+
+    Parameters
+    ----------
+    interval : float
+        The min time in seconds between two messages of the same transfer.
+    level : str
+        The log level.
+    """
+
+    def __init__(self, interval=10., level='DEBUG'):
+        self._interval = interval
+        self._level = level
+        self._t_last = dict()
+
+    def __call__(self, progress):
+        key = id(progress)
+        t = time.monotonic()
+        if not progress.done and t - self._t_last.get(key, 0.) < self._interval:
+            return
+        if progress.done:
+            self._t_last.pop(key, None)
+        else:
+            self._t_last[key] = t
+        logger.log(
+            self._level,
+            f"{progress.name}: sent {progress.bytes_sent}/{progress.bytes_total}"
+            f" bytes ({progress.bytes_sent / max(progress.bytes_total, 1):.1%})"
+            f" at {progress.throughput / 1e6:.2f} MB/s"
+        )
+
+
+def _get_size(fo):
+    """Return the number of bytes remaining in file object `fo`."""
+    if hasattr(fo, '__len__'):
+        return len(fo)
+    return os.fstat(fo.fileno()).st_size - fo.tell()
+
+
+class MultipartEncoder(_ChainedStream):
+    """A read-only file-like object of a multipart/form-data request body.
+
+    The file contents are read in chunks as the body is consumed, so the
+    memory use does not depend on the size of the files.
+
+    Parameters
+    ----------
+    fields : dict
+        The form fields. The values are either strings, or tuples of
+        ``(filename, fileobj)`` for the file fields. The file objects
+        have to be real files or implement ``__len__``.
+    callback : callable, optional
+        If set, it is called with a `TransferProgress` after each read.
+    name : str, optional
+        The name of the transfer passed to `callback`.
+    """
+
+    def __init__(self, fields, callback=None, name=None):
+        self._boundary = uuid.uuid4().hex
+        self._fields = fields
+        self._callback = callback
+        self._size = sum(
+            len(seg) if isinstance(seg, bytes) else _get_size(seg)
+            for seg in self._iter_segments())
+        self._progress = TransferProgress(
+            name=name or 'multipart', bytes_total=self._size)
+
+    @property
+    def content_type(self):
+        return f'multipart/form-data; boundary={self._boundary}'
+
+    @property
+    def progress(self):
+        return self._progress
+
+    def _iter_segments(self):
+        boundary = self._boundary
+        for key, value in self._fields.items():
+            if isinstance(value, tuple):
+                filename, fo = value
+                yield (
+                    f'--{boundary}\r\n'
+                    f'Content-Disposition: form-data; name="{key}"; '
+                    f'filename="{filename}"\r\n'
+                    f'Content-Type: application/octet-stream\r\n\r\n'
+                    ).encode('utf-8')
+                yield fo
+            else:
+                yield (
+                    f'--{boundary}\r\n'
+                    f'Content-Disposition: form-data; name="{key}"\r\n\r\n'
+                    ).encode('utf-8') + value.encode('utf-8')
+            yield b'\r\n'
+        yield f'--{boundary}--\r\n'.encode('utf-8')
+
+    def __len__(self):
+        return self._size
+
+    def _make_segments(self):
+        return list(self._iter_segments())
+
+    def read(self, n=-1):
+        chunk = super().read(n)
+        if chunk:
+            self._progress.bytes_sent += len(chunk)
+            if self._callback is not None:
+                self._callback(self._progress)
+        return chunk
@@ -1,4 +1,6 @@
 import datetime
+import functools
+import json
 import os.path
 import warnings
 from pathlib import Path
@@ -8,16 +10,83 @@ import urllib.parse as urlparse
 from urllib.parse import urlencode
 from pathlib import PosixPath
 
-from astropy.io.misc import yaml
 
+__all__ = [
+    'yaml', 'pformat_yaml', 'pformat_resp', 'LazyFormat',
+    'lazy_pformat_yaml', 'lazy_pformat_resp', 'lazy_pformat_json',
+    'set_pformat_max_size']
 
-__all__ = ['yaml', 'pformat_yaml', 'pformat_resp']
+
+_pformat_max_size = None
+"""The max size of the lazily formatted strings. None for no limit."""
+
+
+def set_pformat_max_size(max_size):
+    """Set the max size of the strings produced by `LazyFormat`.
+
+    The longer strings are truncated so large payloads do not flood the
+    log. Set to None to disable the limit.
+    """
+    global _pformat_max_size
+    _pformat_max_size = max_size
+
+
+class LazyFormat(object):
+    """A deferred formatter to be passed as argument to the logger.
+
+    ``func(*args, **kwargs)`` is only called when the object is converted
+    to string, which loguru only does when the message is to be emitted::
+
+        logger.debug("response:{}", LazyFormat(pformat_resp, resp))
+
+    Note that the object should not be used in f-strings, which are
+    formatted eagerly.
+    """
+
+    __slots__ = ('_func', '_args', '_kwargs')
+
+    def __init__(self, func, *args, **kwargs):
+        self._func = func
+        self._args = args
+        self._kwargs = kwargs
+
+    def __str__(self):
+        s = str(self._func(*self._args, **self._kwargs))
+        max_size = _pformat_max_size
+        if max_size is not None and len(s) > max_size:
+            s = f"{s[:max_size]}... ({len(s) - max_size} more chars)"
+        return s
+
+    def __format__(self, format_spec):
+        return format(str(self), format_spec)
 
 
 def pformat_yaml(obj):
     """Return pretty-formatted YAML string representation for `obj`."""
     return f"\n{pyaml.dump(obj)}"
 
+
+def lazy_pformat_yaml(obj):
+    """Return a `LazyFormat` of `pformat_yaml` for `obj`."""
+    return LazyFormat(pformat_yaml, obj)
+
+
+def _pformat_json(obj, **kwargs):
+    if isinstance(obj, (str, bytes)):
+        obj = json.loads(obj)
+    return json.dumps(obj, **kwargs)
+
+
+def lazy_pformat_json(obj, **kwargs):
+    """Return a `LazyFormat` of the indented JSON string of `obj`.
+
+    `obj` can also be a JSON string or bytes, which is re-indented.
+    """
+    kwargs.setdefault('indent', 2)
+    kwargs.setdefault('ensure_ascii', False)
+    return LazyFormat(_pformat_json, obj, **kwargs)
+
+
 def pformat_resp(resp):
     # TODO fix this. maybe in our own fork of pydataverse?
     # the url composed by pydatavese contains the api token as params.
@@ -36,10 +105,19 @@ def pformat_resp(resp):
         'reason': resp.reason,
         }
     if not resp.ok:
-        result['content'] = resp.json()
+        try:
+            result['content'] = resp.json()
+        except ValueError:
+            # e.g., the error page of a proxy
+            result['content'] = resp.text
     return pformat_yaml(result)
 
 
+def lazy_pformat_resp(resp):
+    """Return a `LazyFormat` of `pformat_resp` for `resp`."""
+    return LazyFormat(pformat_resp, resp)
+
+
 pyaml.add_representer(None, lambda s, d: s.represent_str(str(d)))
 
 
@@ -47,7 +125,30 @@ def _path_representer(dumper, p):
     return dumper.represent_str(p.as_posix())
 
 
-yaml.AstropyDumper.add_representer(PosixPath, _path_representer)
+@functools.lru_cache(maxsize=None)
+def _import_astropy_yaml():
+    from astropy.io.misc import yaml
+
+    yaml.AstropyDumper.add_representer(PosixPath, _path_representer)
+    return yaml
+
+
+class _LazyModule(object):
+    """A proxy of the module returned by `loader`, which is only called
+    when an attribute is accessed."""
+
+    __slots__ = ('_loader', )
+
+    def __init__(self, loader):
+        self._loader = loader
+
+    def __getattr__(self, name):
+        return getattr(self._loader(), name)
+
+
+yaml = _LazyModule(_import_astropy_yaml)
+"""The `astropy.io.misc.yaml` module, imported on first use so astropy is
+not imported by the CLI unless YAML files are read or written."""
 
 def now():
     """
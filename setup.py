@@ -24,6 +24,10 @@ requirements = [
     "numpy<2.0",
 ]
 
+extra_requirements = {
+    "fast_json": ["orjson"],
+}
+
 test_requirements = [
     "pytest>=3",
 ]
@@ -47,6 +51,7 @@ setup(
         ],
     },
     install_requires=requirements,
+    extras_require=extra_requirements,
     license="BSD license",
     long_description=readme + "\n\n" + history,
     include_package_data=True,
@@ -0,0 +1,65 @@
+import os
+
+import pytest
+
+from dvpipe.core import DataverseConfig
+from dvpipe.dataverse import DVDataset
+
+from .fake_dataverse import FakeDataverse
+
+
+@pytest.fixture
+def fake_dataverse():
+    """A fake dataverse server running in a thread."""
+    fake = FakeDataverse().start()
+    yield fake
+    fake.stop()
+
+
+@pytest.fixture
+def dv_config(fake_dataverse, monkeypatch):
+    """The config to connect to `fake_dataverse`."""
+    # the dataset schema of pyDataverse 0.3 predates the license object
+    # sent by DVDataset.
+    monkeypatch.setattr(DVDataset, "validate_json", lambda self, *a, **k: True)
+    return DataverseConfig(api_token="x", base_url=fake_dataverse.base_url)
+
+
+@pytest.fixture
+def make_index(tmp_path):
+    """Return a function to make a dataset index of random files."""
+
+    def _make_index(
+            name="data", title="2024-S1-US-1_dp1", n_files=3, size=1000):
+        dirpath = tmp_path / name
+        dirpath.mkdir(exist_ok=True)
+        files = list()
+        for i in range(n_files):
+            path = dirpath / f"{i}_SRDP.tar"
+            if not path.exists():
+                path.write_bytes(os.urandom(size))
+            files.append({
+                "description": "data product",
+                "categories": ["Data"],
+                "restrict": False,
+                "label": path.name,
+                "directoryLabel": "proj",
+                "filename": path.as_posix(),
+                "pid": "not_yet_set",
+            })
+        dataset = {
+            "title": title,
+            "dsDescription": [{"dsDescriptionValue": "Data product"}],
+            "author": [{"authorName": "LMT", "authorAffiliation": "LMT"}],
+            "datasetContact": [{
+                "datasetContactName": "LMT",
+                "datasetContactEmail": "dp@lmtgtm.org"}],
+            "subject": ["Astronomy and Astrophysics"],
+        }
+        return {
+            "meta": {"project_meta": {"project_id": "2024-S1-US-1"}},
+            "dataset": dataset,
+            "files": files,
+        }
+
+    return _make_index
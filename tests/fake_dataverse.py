@@ -0,0 +1,437 @@
+"""An in-memory fake of the dataverse API for offline tests."""
+
+import hashlib
+import io
+import json
+import re
+import threading
+import zipfile
+from email import policy
+from email.parser import BytesParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+def _parse_multipart(content_type, body):
+    """Return the parts of the multipart `body` as dict of
+    ``name: (filename, content)``."""
+    msg = BytesParser(policy=policy.HTTP).parsebytes(
+        f"Content-Type: {content_type}\r\n\r\n".encode() + body)
+    parts = dict()
+    for part in msg.iter_parts():
+        name = part.get_param("name", header="content-disposition")
+        parts[name] = (part.get_filename(), part.get_content())
+    return parts
+
+
+class FakeDataverse(object):
+    """A dataverse server holding datasets in memory.
+
+    The requests received are recorded in ``calls``, and the failure modes
+    are controlled through the attributes ``locks`` (number of lock queries
+    reporting the dataset as locked keyed by pid, the requests are rejected
+    until then), ``fail_labels`` (file labels to reject on add and
+    register), ``fail_register`` (reject the batched register),
+    ``ingest_locks`` (number of lock queries reporting the dataset as locked
+    after each batched register, as by ingest), ``fail_access`` (number of
+    downloads to fail keyed by file id), and ``fail_upload_urls``
+    (answer the upload urls requests with an empty 502, as by a proxy).
+    """
+
+    part_size = 1000
+    max_per_page = 1000
+
+    def __init__(self):
+        self.datasets = dict()
+        self.calls = list()
+        self.locks = dict()
+        self.fail_labels = set()
+        self.fail_register = False
+        self.ingest_locks = 0
+        self.fail_upload_urls = False
+        self.fail_access = dict()
+        self.uploads = dict()
+        self.s3 = dict()
+        self._next_id = 100
+        self._lock = threading.Lock()
+        self._server = None
+
+    def _new_id(self):
+        with self._lock:
+            self._next_id += 1
+            return self._next_id
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self._server.server_port}"
+
+    def start(self):
+        fake = self
+
+        class Handler(_Handler):
+            server_fake = fake
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def count_calls(self, method, pattern):
+        return sum(
+            1 for m, p, _ in self.calls
+            if m == method and re.fullmatch(pattern, p))
+
+    def add_dataset(self, title, parent="lmt"):
+        """Add an empty released dataset and return the pid."""
+        i = self._new_id()
+        pid = f"doi:10.5072/FK2/{i}"
+        self.datasets[pid] = {
+            "id": i, "title": title, "parent": parent, "files": dict(),
+            "version": {}, "versions": [], "draft": False}
+        return pid
+
+    def _is_locked(self, pid):
+        return self.locks.get(pid, 0) > 0
+
+    @staticmethod
+    def _file_entry(fid, label, directory_label, content, meta):
+        md5 = hashlib.md5(content).hexdigest()
+        return {
+            "label": label,
+            "directoryLabel": directory_label,
+            "restricted": meta.get("restrict", False),
+            "description": meta.get("description", ""),
+            "dataFile": {
+                "id": fid,
+                "filename": label,
+                "filesize": len(content),
+                "md5": md5,
+                "checksum": {"type": "MD5", "value": md5},
+            },
+            "_content": content,
+        }
+
+    def _s3_content(self, storage_identifier):
+        key = storage_identifier.split(":")[-1]
+        if key in self.s3:
+            return self.s3[key]
+        return self.uploads[key][0]
+
+    # routes
+
+    def get_dataverse(self, h, q, body, alias):
+        h.send_json(200, {"status": "OK", "data": {"alias": alias, "id": 1}})
+
+    def get_version(self, h, q, body):
+        h.send_json(200, {"status": "OK", "data": {"version": "5.14"}})
+
+    def search(self, h, q, body):
+        q_str = q.get("q", "*")
+        titles = [
+            re.sub(r'\\(.)', r'\1', t)
+            for t in re.findall(r'title:"((?:[^"\\]|\\.)*)"', q_str)]
+        subtree = q.get("subtree", None)
+        items = [
+            {
+                "name": ds["title"],
+                "type": "dataset",
+                "global_id": pid,
+                "identifier_of_dataverse": ds["parent"],
+                "updatedAt": "2024-01-01T00:00:00Z",
+            }
+            for pid, ds in self.datasets.items()
+            if subtree is None or ds["parent"] == subtree
+            # the phrase query matches the titles containing the phrase
+            if q_str == "*" or any(t in ds["title"] for t in titles)]
+        start = int(q.get("start", 0))
+        per_page = min(int(q.get("per_page", 10)), self.max_per_page)
+        page = items[start:start + per_page]
+        h.send_json(200, {"status": "OK", "data": {
+            "q": q_str, "total_count": len(items), "start": start,
+            "count_in_response": len(page), "items": page}})
+
+    def create_dataset(self, h, q, body, parent):
+        data = json.loads(body)
+        fields = data["datasetVersion"]["metadataBlocks"]["citation"]["fields"]
+        title = [f["value"] for f in fields if f["typeName"] == "title"][0]
+        i = self._new_id()
+        pid = f"doi:10.5072/FK2/{i}"
+        self.datasets[pid] = {
+            "id": i, "title": title, "parent": parent, "files": dict(),
+            "version": data["datasetVersion"], "versions": [], "draft": True}
+        h.send_json(201, {"status": "OK", "data": {"id": i, "persistentId": pid}})
+
+    def put_draft(self, h, q, body):
+        ds = self.datasets[q["persistentId"]]
+        ds["version"] = json.loads(body)
+        ds["draft"] = True
+        h.send_json(200, {"status": "OK", "data": {}})
+
+    def add_file(self, h, q, body):
+        pid = q["persistentId"]
+        ds = self.datasets[pid]
+        if self._is_locked(pid):
+            return h.send_json(409, {"status": "ERROR", "message": "Dataset is locked"})
+        parts = _parse_multipart(h.headers["Content-Type"], body)
+        meta = json.loads(parts["jsonData"][1])
+        filename, content = parts["file"]
+        if filename.endswith(".zip"):
+            with zipfile.ZipFile(io.BytesIO(content)) as z:
+                filename = z.namelist()[0]
+                content = z.read(filename)
+        label = meta.get("label") or filename
+        if label in self.fail_labels:
+            return h.send_json(500, {"status": "ERROR", "message": "boom"})
+        fid = self._new_id()
+        ds["files"][fid] = self._file_entry(
+            fid, label, meta.get("directoryLabel"), content, meta)
+        ds["draft"] = True
+        h.send_json(200, {"status": "OK", "data": {"files": [{"dataFile": {"id": fid}}]}})
+
+    def replace_file(self, h, q, body, fid):
+        fid = int(fid)
+        for ds in self.datasets.values():
+            if fid in ds["files"]:
+                parts = _parse_multipart(h.headers["Content-Type"], body)
+                meta = json.loads(parts["jsonData"][1])
+                old = ds["files"].pop(fid)
+                new_fid = self._new_id()
+                ds["files"][new_fid] = self._file_entry(
+                    new_fid, old["label"], old["directoryLabel"],
+                    parts["file"][1], meta)
+                ds["draft"] = True
+                return h.send_json(200, {"status": "OK", "data": {
+                    "files": [{"dataFile": {"id": new_fid}}]}})
+        h.send_json(404, {"status": "ERROR", "message": "no file"})
+
+    def restrict_file(self, h, q, body, fid):
+        h.send_json(200, {"status": "OK", "data": {"message": "ok"}})
+
+    def get_files(self, h, q, body, version):
+        ds = self.datasets[q["persistentId"]]
+        files = [
+            {k: v for k, v in f.items() if k != "_content"}
+            for f in ds["files"].values()]
+        h.send_json(200, {"status": "OK", "data": files})
+
+    def get_versions(self, h, q, body):
+        pid = q["persistentId"]
+        ds = self.datasets[pid]
+        versions = list(ds["versions"])
+        if ds["draft"]:
+            versions.insert(0, {
+                "versionState": "DRAFT", "versionNumber": None,
+                "versionMinorNumber": None})
+        data = [
+            dict(
+                v, id=ds["id"] * 10 + j, datasetId=ds["id"],
+                datasetPersistentId=pid, lastUpdateTime="2024-01-01T00:00:00Z",
+                files=[], metadataBlocks=ds["version"].get("metadataBlocks", {}))
+            for j, v in enumerate(versions)]
+        h.send_json(200, {"status": "OK", "data": data})
+
+    def get_latest_version(self, h, q, body, version):
+        ds = self.datasets[q["persistentId"]]
+        data = dict(ds["version"])
+        data.pop("files", None)
+        data["versionState"] = "DRAFT" if ds["draft"] else "RELEASED"
+        h.send_json(200, {"status": "OK", "data": data})
+
+    def publish(self, h, q, body):
+        pid = q["persistentId"]
+        ds = self.datasets[pid]
+        if self._is_locked(pid):
+            return h.send_json(409, {"status": "ERROR", "message": "Dataset is locked"})
+        if not ds["draft"]:
+            return h.send_json(403, {"status": "ERROR", "message": (
+                f"Latest version of dataset {pid} is already released. "
+                "Only draft versions can be released.")})
+        ds["versions"].insert(0, {
+            "versionState": "RELEASED",
+            "versionNumber": len(ds["versions"]) + 1,
+            "versionMinorNumber": 0})
+        ds["draft"] = False
+        h.send_json(200, {"status": "OK", "data": {}})
+
+    def get_locks(self, h, q, body):
+        pid = q["persistentId"]
+        data = []
+        with self._lock:
+            if self._is_locked(pid):
+                self.locks[pid] -= 1
+                data = [{"lockType": "Ingest"}]
+        h.send_json(200, {"status": "OK", "data": data})
+
+    def get_upload_urls(self, h, q, body):
+        if self.fail_upload_urls:
+            return h.send_json(502, raw=b"")
+        size = int(q["size"])
+        key = f"k{self._new_id()}"
+        storage_identifier = f"s3://bucket:{key}"
+        self.uploads[key] = dict()
+        if size <= self.part_size:
+            return h.send_json(200, {"status": "OK", "data": {
+                "url": f"{self.base_url}/s3/{key}/0?X-Amz-Signature=abc",
+                "partSize": self.part_size,
+                "storageIdentifier": storage_identifier}})
+        n_parts = -(-size // self.part_size)
+        urls = {
+            str(i): f"{self.base_url}/s3/{key}/{i}?X-Amz-Signature=abc"
+            for i in range(1, n_parts + 1)}
+        mpupload = f"/api/datasets/mpupload?uploadid=u&storageidentifier={key}"
+        h.send_json(200, {"status": "OK", "data": {
+            "urls": urls, "partSize": self.part_size,
+            "storageIdentifier": storage_identifier,
+            "complete": mpupload, "abort": mpupload}})
+
+    def put_s3(self, h, q, body, key, part):
+        self.uploads[key][int(part)] = body
+        etag = hashlib.md5(body).hexdigest()
+        h.send_json(200, raw=b"", headers={"ETag": f'"{etag}"'})
+
+    def complete_multipart(self, h, q, body):
+        key = q["storageidentifier"]
+        parts = self.uploads[key]
+        self.s3[key] = b"".join(parts[i] for i in sorted(parts))
+        h.send_json(200, {"status": "OK", "data": {}})
+
+    def abort_multipart(self, h, q, body):
+        self.uploads.pop(q["storageidentifier"], None)
+        h.send_json(204, raw=b"")
+
+    def add_files(self, h, q, body):
+        pid = q["persistentId"]
+        ds = self.datasets[pid]
+        if self._is_locked(pid):
+            return h.send_json(409, {"status": "ERROR", "message": "Dataset is locked"})
+        if self.fail_register:
+            return h.send_json(500, {"status": "ERROR", "message": "boom"})
+        parts = _parse_multipart(h.headers["Content-Type"], body)
+        metas = json.loads(parts["jsonData"][1])
+        results = list()
+        for meta in metas:
+            content = self._s3_content(meta["storageIdentifier"])
+            if meta.get("label") in self.fail_labels:
+                results.append({
+                    "storageIdentifier": meta["storageIdentifier"],
+                    "errorMessage": "boom"})
+                continue
+            if "fileToReplaceId" in meta:
+                old = ds["files"].pop(int(meta["fileToReplaceId"]))
+                meta.setdefault("label", old["label"])
+                meta.setdefault("directoryLabel", old["directoryLabel"])
+            fid = self._new_id()
+            ds["files"][fid] = self._file_entry(
+                fid, meta.get("label") or meta["fileName"],
+                meta.get("directoryLabel"), content, meta)
+            results.append({
+                "storageIdentifier": meta["storageIdentifier"],
+                "successful": True, "fileDetails": {"id": fid}})
+        ds["draft"] = True
+        if self.ingest_locks:
+            with self._lock:
+                self.locks[pid] = self.ingest_locks
+        h.send_json(200, {"status": "OK", "data": {
+            "Files": results,
+            "Result": {"Total number of files": len(metas)}}})
+
+    def get_datafile(self, h, q, body, fid):
+        fid = int(fid)
+        if self.fail_access.get(fid, 0) > 0:
+            self.fail_access[fid] -= 1
+            return h.send_json(503, {"status": "ERROR", "message": "busy"})
+        for ds in self.datasets.values():
+            if fid in ds["files"]:
+                content = ds["files"][fid]["_content"]
+                break
+        else:
+            return h.send_json(404, {"status": "ERROR", "message": "no file"})
+        match = re.fullmatch(r"bytes=(\d+)-", h.headers.get("Range", ""))
+        if match is None:
+            return h.send_json(200, raw=content)
+        start = int(match.group(1))
+        h.send_json(206, raw=content[start:], headers={
+            "Content-Range": f"bytes {start}-{len(content) - 1}/{len(content)}"})
+
+    routes = [
+        ("GET", r"/api/dataverses/([^/]+)", "get_dataverse"),
+        ("GET", r"/api/info/version", "get_version"),
+        ("GET", r"/api/search", "search"),
+        ("POST", r"/api/dataverses/([^/]+)/datasets", "create_dataset"),
+        ("PUT", r"/api/datasets/:persistentId/versions/:draft", "put_draft"),
+        ("POST", r"/api/datasets/:persistentId/add", "add_file"),
+        ("POST", r"/api/files/(\d+)/replace", "replace_file"),
+        ("PUT", r"/api/files/(\d+)/restrict", "restrict_file"),
+        ("GET", r"/api/datasets/:persistentId/versions/([^/]+)/files", "get_files"),
+        ("GET", r"/api/datasets/:persistentId/versions", "get_versions"),
+        ("GET", r"/api/datasets/:persistentId/versions/([^/]+)", "get_latest_version"),
+        ("POST", r"/api/datasets/:persistentId/actions/:publish", "publish"),
+        ("GET", r"/api/datasets/:persistentId/locks/?", "get_locks"),
+        ("GET", r"/api/datasets/:persistentId/uploadurls", "get_upload_urls"),
+        ("PUT", r"/s3/([^/]+)/(\d+)", "put_s3"),
+        ("PUT", r"/api/datasets/mpupload", "complete_multipart"),
+        ("DELETE", r"/api/datasets/mpupload", "abort_multipart"),
+        ("POST", r"/api/datasets/:persistentId/addFiles", "add_files"),
+        ("POST", r"/api/datasets/:persistentId/replaceFiles", "add_files"),
+        ("GET", r"/api/access/datafile/(\d+)", "get_datafile"),
+    ]
+
+
+class _Handler(BaseHTTPRequestHandler):
+
+    protocol_version = "HTTP/1.1"
+    server_fake = None
+
+    def log_message(self, *args):
+        pass
+
+    def send_json(self, code, obj=None, raw=None, headers=None):
+        body = raw if raw is not None else json.dumps(obj).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_body(self):
+        if self.headers.get("Transfer-Encoding") == "chunked":
+            data = b""
+            while True:
+                size = int(self.rfile.readline().strip(), 16)
+                if size == 0:
+                    self.rfile.readline()
+                    return data
+                data += self.rfile.read(size)
+                self.rfile.readline()
+        return self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+    def _route(self, method):
+        url = urlparse(self.path)
+        q = {k: v[0] for k, v in parse_qs(url.query).items()}
+        path = url.path.replace("/api/v1/", "/api/")
+        body = self._read_body() if method in ("POST", "PUT") else b""
+        fake = self.server_fake
+        fake.calls.append((method, path, q))
+        for m, pattern, name in fake.routes:
+            match = re.fullmatch(pattern, path)
+            if m == method and match:
+                return getattr(fake, name)(self, q, body, *match.groups())
+        self.send_json(404, {"status": "ERROR", "message": f"no route {method} {path}"})
+
+    def do_GET(self):
+        self._route("GET")
+
+    def do_POST(self):
+        self._route("POST")
+
+    def do_PUT(self):
+        self._route("PUT")
+
+    def do_DELETE(self):
+        self._route("DELETE")
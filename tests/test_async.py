@@ -0,0 +1,80 @@
+"""Tests for the async helpers and the async API."""
+
+import asyncio
+import threading
+import time
+
+from dvpipe._async import call, run_sync
+from dvpipe.core import DataverseConfig
+from dvpipe.dataverse import (
+    get_datafiles, get_datafiles_async, get_versions_async, upload_dataset)
+from dvpipe.session import HttpConfig
+
+
+async def _get_thread():
+    return threading.current_thread()
+
+
+def test_run_sync():
+    assert run_sync(_get_thread()) is threading.current_thread()
+
+
+def test_run_sync_in_running_loop():
+    # e.g., the sync API called in a notebook
+    async def _main():
+        return run_sync(_get_thread())
+
+    thread = asyncio.run(_main())
+    assert thread is not threading.current_thread()
+
+
+def test_call_bounded_concurrency(fake_dataverse):
+    dv_config = DataverseConfig(
+        api_token="x", base_url=fake_dataverse.base_url,
+        http=HttpConfig(max_concurrency=2))
+    lock = threading.Lock()
+    n_running = list()
+    running = [0]
+
+    def _work(i):
+        with lock:
+            running[0] += 1
+            n_running.append(running[0])
+        time.sleep(0.05)
+        with lock:
+            running[0] -= 1
+        return i, threading.current_thread().name
+
+    async def _main():
+        return await asyncio.gather(
+            *(call(dv_config, _work, i) for i in range(6)))
+
+    results = asyncio.run(_main())
+    assert [i for i, _ in results] == list(range(6))
+    assert all(name.startswith("dvpipe_http") for _, name in results)
+    assert max(n_running) == 2
+
+
+def test_async_api(dv_config, fake_dataverse, make_index):
+    pids = [
+        upload_dataset(
+            dv_config, "lmt", make_index(name=f"d{i}", title=f"t{i}"))
+        for i in range(3)]
+
+    async def _main():
+        return await asyncio.gather(
+            *(get_datafiles_async(dv_config, pid) for pid in pids),
+            *(get_versions_async(dv_config, pid) for pid in pids))
+
+    results = asyncio.run(_main())
+    for pid, files in zip(pids, results[:3]):
+        assert len(files) == 3
+        assert files.to_records() == get_datafiles(dv_config, pid).to_records()
+    for versions in results[3:]:
+        assert len(versions) == 1
+
+    # the sync API works inside a running event loop
+    async def _sync_in_loop():
+        return get_datafiles(dv_config, pids[0])
+
+    assert len(asyncio.run(_sync_in_loop())) == 3
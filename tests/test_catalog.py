@@ -0,0 +1,35 @@
+"""Tests for the local catalog of datasets."""
+
+import copy
+
+from dvpipe.catalog import DataverseCatalog
+from dvpipe.dataverse import upload_dataset
+
+
+def test_catalog_sync(dv_config, fake_dataverse, make_index, tmp_path):
+    index = make_index()
+    pid = upload_dataset(dv_config, "lmt", copy.deepcopy(index))
+    catalog = DataverseCatalog(tmp_path / "catalog.sqlite")
+    catalog.sync(dv_config, subtree="lmt")
+    assert catalog.subtree == "lmt"
+    assert catalog.find_datasets(index["dataset"]["title"]) == [pid]
+    assert len(catalog.get_datafiles(pid)) == 3
+    assert catalog.get_metadata_hash(pid) is not None
+
+    catalog.invalidate(pid)
+    assert catalog.get_datafiles(pid) is None
+    assert catalog.get_metadata_hash(pid) is None
+
+
+def test_catalog_order_latest_first(tmp_path):
+    catalog = DataverseCatalog(tmp_path / "catalog.sqlite")
+    for pid, updated_at in [("doi:1", "2024-01-01"), ("doi:2", "2024-02-01")]:
+        catalog._update_dataset(
+            {"global_id": pid, "name": "a", "updatedAt": updated_at}, [], [])
+    assert catalog.find_datasets("a") == ["doi:2", "doi:1"]
+    # the datasets not synced yet are the latest
+    catalog.add_dataset("doi:3", "a")
+    assert catalog.find_datasets("a") == ["doi:3", "doi:2", "doi:1"]
+    catalog.invalidate("doi:1")
+    assert catalog.find_datasets("a")[2] == "doi:2"
+    assert [d["pid"] for d in catalog.get_datasets()][2] == "doi:2"
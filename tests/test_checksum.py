@@ -0,0 +1,76 @@
+"""Tests for the file checksums."""
+
+import hashlib
+import os
+
+from dvpipe.checksum import (
+    ChecksumCache, compute_checksums, get_remote_checksum, is_same_file)
+
+
+def test_compute_checksums(tmp_path):
+    path = tmp_path / "a.dat"
+    content = os.urandom(10000)
+    path.write_bytes(content)
+    assert compute_checksums(path, blocksize=1000) == {
+        "md5": hashlib.md5(content).hexdigest(),
+        "sha1": hashlib.sha1(content).hexdigest(),
+        }
+
+
+def test_checksum_cache(tmp_path):
+    path = tmp_path / "a.dat"
+    path.write_bytes(b"abc")
+    filepath = tmp_path / "cache.sqlite"
+    cache = ChecksumCache(filepath)
+    assert cache.get(path) is None
+    checksums = cache.get_checksums(path)
+    assert checksums["md5"] == hashlib.md5(b"abc").hexdigest()
+    cache.close()
+
+    # the cached entries are persistent
+    cache = ChecksumCache(filepath)
+    assert cache.get(path) == checksums
+
+    # the entries are invalid once the file is changed
+    path.write_bytes(b"abcd")
+    assert cache.get(path) is None
+    assert cache.get_checksums(path)["md5"] == hashlib.md5(b"abcd").hexdigest()
+
+
+def test_checksum_cache_many(tmp_path):
+    paths = list()
+    for i in range(5):
+        path = tmp_path / f"{i}.dat"
+        path.write_bytes(bytes([i]) * 10)
+        paths.append(path)
+    cache = ChecksumCache(tmp_path / "cache.sqlite", max_workers=2)
+    checksums = cache.get_checksums_many(paths)
+    assert list(checksums.keys()) == paths
+    for path in paths:
+        assert checksums[path] == cache.get(path)
+
+
+def test_get_remote_checksum():
+    assert get_remote_checksum(
+        {"checksum": {"type": "SHA-1", "value": "ABC"}}) == ("sha1", "abc")
+    assert get_remote_checksum(
+        {"checksum": {"type": "UNF", "value": "x"}, "md5": "ABC"}
+        ) == ("md5", "abc")
+    assert get_remote_checksum({}) is None
+
+
+def test_is_same_file(tmp_path):
+    path = tmp_path / "a.dat"
+    path.write_bytes(b"abc")
+    md5 = hashlib.md5(b"abc").hexdigest()
+    cache = ChecksumCache(tmp_path / "cache.sqlite")
+    for checksum_cache in [None, cache]:
+        assert is_same_file(
+            path, {"filesize": 3, "md5": md5}, checksum_cache=checksum_cache)
+        assert not is_same_file(
+            path, {"filesize": 4, "md5": md5}, checksum_cache=checksum_cache)
+        assert not is_same_file(
+            path, {"filesize": 3, "md5": "0" * 32},
+            checksum_cache=checksum_cache)
+        assert not is_same_file(
+            path, {"filesize": 3}, checksum_cache=checksum_cache)
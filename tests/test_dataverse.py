@@ -0,0 +1,82 @@
+"""Tests for the dataverse module."""
+
+import json
+
+import numpy as np
+import pytest
+
+from dvpipe import dataverse
+from dvpipe.dataverse import CustomJSONizer, _json_dumps, get_metadata_hash
+
+
+@pytest.fixture(params=["orjson", "json"])
+def json_backend(request, monkeypatch):
+    if request.param == "orjson":
+        pytest.importorskip("orjson")
+    else:
+        monkeypatch.setattr(dataverse, "orjson", None)
+    return request.param
+
+
+def test_json_dumps_baseline(json_backend):
+    data = {
+        "bool": np.bool_(True),
+        "float": np.float64(0.1),
+        "list": [np.bool_(False), 2, 0.5, "a", None],
+        "nested": {"value": np.float64(-1e30), "text": "日本"},
+    }
+    expected = json.dumps(
+        data, indent=2, cls=CustomJSONizer, ensure_ascii=False)
+    assert json.loads(_json_dumps(data, indent=2)) == json.loads(expected)
+    if json_backend == "json":
+        assert _json_dumps(data, indent=2) == expected.encode("utf-8")
+
+
+def test_json_dumps_numpy_scalars(json_backend):
+    data = [np.int64(3), np.int32(-1), np.uint8(255), np.float32(1.5)]
+    assert json.loads(_json_dumps(data)) == [3, -1, 255, 1.5]
+
+
+def _make_version(fields, **kwargs):
+    return dict(
+        metadataBlocks={"citation": {"displayName": "Citation", "fields": fields}},
+        **kwargs)
+
+
+_fields = [
+    {"typeName": "title", "multiple": False, "typeClass": "primitive",
+     "value": "a"},
+    {"typeName": "subject", "multiple": True,
+     "typeClass": "controlledVocabulary", "value": ["Astronomy"]},
+    {"typeName": "author", "multiple": True, "typeClass": "compound",
+     "value": [{"authorName": {
+         "typeName": "authorName", "multiple": False,
+         "typeClass": "primitive", "value": "x"}}]},
+    ]
+
+
+def test_get_metadata_hash():
+    h = get_metadata_hash(_make_version(_fields))
+    # as returned by the server, with the fields reordered, the values as
+    # strings, the empty fields dropped and the extra keys
+    fields_remote = [dict(f) for f in reversed(_fields)] + [
+        {"typeName": "notes", "multiple": False, "typeClass": "primitive",
+         "value": ""}]
+    assert get_metadata_hash(_make_version(
+        fields_remote, versionState="DRAFT", id=1,
+        license={"name": None})) == h
+    assert get_metadata_hash(_make_version(
+        _fields, license={"name": "CC0 1.0"})) != h
+    fields_changed = [dict(f) for f in _fields]
+    fields_changed[0]["value"] = "b"
+    assert get_metadata_hash(_make_version(fields_changed)) != h
+
+
+def test_get_metadata_hash_value_types():
+    def _hash(value):
+        return get_metadata_hash(_make_version([{
+            "typeName": "x", "multiple": False, "typeClass": "primitive",
+            "value": value}]))
+
+    assert _hash(np.bool_(True)) == _hash(True) == _hash("true")
+    assert _hash(np.int64(1)) == _hash(1) == _hash("1")
@@ -0,0 +1,97 @@
+"""Tests for uploading files directly to the S3 store."""
+
+import copy
+
+import pytest
+from loguru import logger
+
+from dvpipe.dataverse import upload_dataset
+from dvpipe.journal import UploadJournal
+from dvpipe.utils import yaml
+
+
+def test_direct_upload(dv_config, fake_dataverse, make_index, tmp_path):
+    # one file is sent as multipart
+    index = make_index(n_files=3, size=2500)
+    output = tmp_path / "out.yaml"
+    pid = upload_dataset(
+        dv_config, "lmt", copy.deepcopy(index), output=output,
+        direct_upload=True, register_batch_size=2)
+    assert fake_dataverse.count_calls(
+        "POST", r"/api/datasets/:persistentId/addFiles") == 2
+    files = fake_dataverse.datasets[pid]["files"].values()
+    assert sorted(f["label"] for f in files) == [
+        d["label"] for d in index["files"]]
+    with open(output) as fo:
+        transfer = yaml.load(fo)["meta"]["dataset"]["transfer"]
+    assert transfer["n_files_transferred"] == 3
+    assert transfer["bytes_transferred"] == 7500
+
+
+def test_direct_upload_register_failed(
+        dv_config, fake_dataverse, make_index):
+    fake_dataverse.fail_register = True
+    messages = list()
+    sink_id = logger.add(messages.append, level="INFO", format="{message}")
+    try:
+        with pytest.raises(ValueError, match="Failed upload 3 of 3"):
+            upload_dataset(
+                dv_config, "lmt", make_index(), direct_upload=True)
+    finally:
+        logger.remove(sink_id)
+    stats = [m for m in messages if m.startswith("file transfer stats")]
+    assert len(stats) == 1
+    assert "n_files_transferred: 0" in stats[0]
+
+
+def test_direct_upload_urls_failed(dv_config, fake_dataverse, make_index):
+    fake_dataverse.fail_upload_urls = True
+    with pytest.raises(ValueError, match="Failed request upload urls"):
+        upload_dataset(dv_config, "lmt", make_index(), direct_upload=True)
+
+
+def test_direct_upload_register_partial(
+        dv_config, fake_dataverse, make_index, tmp_path):
+    index = make_index()
+    journal = UploadJournal(tmp_path / "journal.sqlite")
+    kwargs = dict(
+        action_on_exist="update", direct_upload=True, journal=journal)
+    fake_dataverse.fail_labels = {"1_SRDP.tar"}
+    with pytest.raises(ValueError, match="Failed upload 1 of 3") as e:
+        upload_dataset(dv_config, "lmt", copy.deepcopy(index), **kwargs)
+    assert "0_SRDP.tar" not in str(e.value)
+    pid = journal.dataset_pid
+    assert sorted(
+        f["label"] for f in fake_dataverse.datasets[pid]["files"].values()
+    ) == ["0_SRDP.tar", "2_SRDP.tar"]
+    for d in index["files"]:
+        assert journal.is_registered(d["label"], d["filename"]) == (
+            d["label"] != "1_SRDP.tar")
+
+    # only the rejected file is registered on rerun
+    fake_dataverse.fail_labels = set()
+    upload_dataset(dv_config, "lmt", copy.deepcopy(index), **kwargs)
+    assert fake_dataverse.count_calls(
+        "POST", r"/api/datasets/:persistentId/addFiles") == 2
+    assert len(fake_dataverse.datasets[pid]["files"]) == 3
+
+
+def test_direct_upload_register_per_endpoint(
+        dv_config, fake_dataverse, make_index):
+    index = make_index(n_files=2)
+    kwargs = dict(action_on_exist="update", direct_upload=True)
+    pid = upload_dataset(dv_config, "lmt", copy.deepcopy(index), **kwargs)
+    with open(index["files"][0]["filename"], "ab") as fo:
+        fo.write(b"changed")
+    index = make_index(n_files=3)
+    # the dataset is locked by the addFiles request, only the rejected
+    # replaceFiles request is retried
+    n_add = fake_dataverse.count_calls(
+        "POST", r"/api/datasets/:persistentId/addFiles")
+    fake_dataverse.ingest_locks = 1
+    upload_dataset(dv_config, "lmt", copy.deepcopy(index), **kwargs)
+    assert fake_dataverse.count_calls(
+        "POST", r"/api/datasets/:persistentId/addFiles") == n_add + 1
+    assert fake_dataverse.count_calls(
+        "POST", r"/api/datasets/:persistentId/replaceFiles") == 2
+    assert len(fake_dataverse.datasets[pid]["files"]) == 3
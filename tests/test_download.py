@@ -0,0 +1,96 @@
+"""Tests for downloading datasets."""
+
+import copy
+from pathlib import Path
+
+import pytest
+
+from dvpipe.dataverse import upload_dataset
+from dvpipe.download import download_datafile, download_dataset
+
+
+_access_path = r"/api/access/datafile/\d+"
+
+
+def _make_item(label, directory_label=None):
+    item = {"label": label, "dataFile": {"id": 1, "filesize": 3}}
+    if directory_label is not None:
+        item["directoryLabel"] = directory_label
+    return item
+
+
+@pytest.mark.parametrize("label,directory_label", [
+    ("a.dat", "../../escape"),
+    ("../a.dat", None),
+    ("..", "sub"),
+    ("a.dat", "/abs"),
+    ])
+def test_download_path_outside(dv_config, tmp_path, label, directory_label):
+    dirpath = tmp_path / "out"
+    with pytest.raises(ValueError, match="is not inside"):
+        download_datafile(
+            dv_config, _make_item(label, directory_label), dirpath)
+    assert list(tmp_path.iterdir()) == []
+
+
+def _upload(dv_config, make_index, **kwargs):
+    index = make_index(**kwargs)
+    pid = upload_dataset(dv_config, "lmt", copy.deepcopy(index))
+    return pid, {d["label"]: Path(d["filename"]) for d in index["files"]}
+
+
+def _get_file(fake, pid, label):
+    for f in fake.datasets[pid]["files"].values():
+        if f["label"] == label:
+            return f
+
+
+def test_download_dataset(dv_config, fake_dataverse, make_index, tmp_path):
+    pid, sources = _upload(dv_config, make_index)
+    dirpath = tmp_path / "out"
+    results = download_dataset(dv_config, pid, dirpath)
+    assert {r["state"] for r in results} == {"downloaded"}
+    for label, source in sources.items():
+        path = dirpath / "proj" / label
+        assert path.read_bytes() == source.read_bytes()
+
+    # the present files are skipped
+    n_calls = fake_dataverse.count_calls("GET", _access_path)
+    results = download_dataset(dv_config, pid, dirpath)
+    assert {r["state"] for r in results} == {"skipped"}
+    assert fake_dataverse.count_calls("GET", _access_path) == n_calls
+
+
+def test_download_resume(dv_config, fake_dataverse, make_index, tmp_path):
+    pid, sources = _upload(dv_config, make_index, n_files=1)
+    label, source = next(iter(sources.items()))
+    dirpath = tmp_path / "out"
+    path_part = dirpath / "proj" / f"{label}.part"
+    path_part.parent.mkdir(parents=True)
+    path_part.write_bytes(source.read_bytes()[:300])
+    result, = download_dataset(dv_config, pid, dirpath)
+    assert result["state"] == "downloaded"
+    assert result["n_bytes"] == 700
+    assert (dirpath / "proj" / label).read_bytes() == source.read_bytes()
+    assert not path_part.exists()
+
+
+def test_download_retry(dv_config, fake_dataverse, make_index, tmp_path):
+    pid, sources = _upload(dv_config, make_index, n_files=1)
+    label = next(iter(sources))
+    f = _get_file(fake_dataverse, pid, label)
+    fake_dataverse.fail_access[f["dataFile"]["id"]] = 2
+    result, = download_dataset(dv_config, pid, tmp_path, max_retries=3)
+    assert result["state"] == "downloaded"
+
+
+def test_download_checksum_mismatch(
+        dv_config, fake_dataverse, make_index, tmp_path):
+    pid, sources = _upload(dv_config, make_index, n_files=1)
+    label = next(iter(sources))
+    f = _get_file(fake_dataverse, pid, label)
+    f["dataFile"]["checksum"]["value"] = "0" * 32
+    with pytest.raises(ValueError, match="mismatch md5 checksum"):
+        download_dataset(dv_config, pid, tmp_path, max_retries=2)
+    assert not (tmp_path / "proj" / label).exists()
+    assert not (tmp_path / "proj" / f"{label}.part").exists()
@@ -0,0 +1,95 @@
+"""Tests for the upload journal."""
+
+import copy
+
+import pytest
+
+from dvpipe.dataverse import upload_dataset
+from dvpipe.journal import UploadJournal
+
+
+def test_journal_reset_after_completed(tmp_path):
+    path = tmp_path / "a.dat"
+    path.write_bytes(b"abc")
+    journal = UploadJournal(tmp_path / "journal.sqlite")
+    journal.start("doi:1")
+    journal.set_state("a.dat", path, "registered", md5="x", file_id=1)
+    # an unfinished upload of the same dataset is resumed
+    journal.start("doi:1")
+    assert journal.is_registered("a.dat", path)
+    journal.finish()
+    assert journal.get_resumable_pid() is None
+    # the entries of a completed upload are not trusted
+    journal.start("doi:1")
+    assert journal.get("a.dat", path) is None
+    assert journal.dataset_pid == "doi:1"
+    assert not journal.completed
+
+
+def test_upload_rerun_with_completed_journal(
+        dv_config, fake_dataverse, make_index, tmp_path):
+    index = make_index()
+    journal = UploadJournal(tmp_path / "journal.sqlite")
+    kwargs = dict(action_on_exist="update", journal=journal)
+    pid = upload_dataset(dv_config, "lmt", copy.deepcopy(index), **kwargs)
+    assert len(fake_dataverse.datasets[pid]["files"]) == 3
+
+    # the files are removed remotely after the upload is completed
+    fake_dataverse.datasets[pid]["files"].clear()
+    upload_dataset(dv_config, "lmt", copy.deepcopy(index), **kwargs)
+    assert len(fake_dataverse.datasets[pid]["files"]) == 3
+
+
+def test_journal_states(tmp_path):
+    path = tmp_path / "a.dat"
+    path.write_bytes(b"abc")
+    journal = UploadJournal(tmp_path / "journal.sqlite")
+    assert journal.dataset_pid is None
+    assert journal.get_resumable_pid() is None
+    journal.start("doi:1")
+    assert journal.get_resumable_pid() == "doi:1"
+
+    journal.set_state("a.dat", path, "uploading")
+    journal.set_upload_info("a.dat", {"urls": ["u1", "u2"]})
+    journal.add_etag("a.dat", 1, "e1")
+    entry = journal.get("a.dat", path)
+    assert entry["state"] == "uploading"
+    assert entry["upload_info"] == {"urls": ["u1", "u2"]}
+    assert entry["etags"] == {"1": "e1"}
+
+    journal.set_state("a.dat", path, "registered", md5="x", file_id=2)
+    entry = journal.get("a.dat", path)
+    assert entry["upload_info"] is None
+    assert entry["etags"] == {}
+    assert (entry["md5"], entry["file_id"]) == ("x", 2)
+    assert journal.is_registered("a.dat", path)
+
+    with pytest.raises(ValueError):
+        journal.set_state("a.dat", path, "unknown")
+
+
+def test_journal_file_changed(tmp_path):
+    path = tmp_path / "a.dat"
+    path.write_bytes(b"abc")
+    journal = UploadJournal(tmp_path / "journal.sqlite")
+    journal.start("doi:1")
+    journal.set_state("a.dat", path, "registered")
+    path.write_bytes(b"abcd")
+    assert journal.get("a.dat", path) is None
+    assert not journal.is_registered("a.dat", path)
+
+
+def test_journal_reset_other_dataset(tmp_path):
+    path = tmp_path / "a.dat"
+    path.write_bytes(b"abc")
+    filepath = tmp_path / "journal.sqlite"
+    journal = UploadJournal(filepath)
+    journal.start("doi:1")
+    journal.set_state("a.dat", path, "registered")
+    journal.close()
+    # the journal is persistent
+    journal = UploadJournal(filepath)
+    assert journal.get_resumable_pid() == "doi:1"
+    assert journal.is_registered("a.dat", path)
+    journal.start("doi:2")
+    assert journal.get("a.dat", path) is None
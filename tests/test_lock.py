@@ -0,0 +1,54 @@
+"""Tests for retrying requests rejected by dataset locks."""
+
+import asyncio
+
+import pytest
+import requests
+
+from dvpipe.dataverse import (
+    DatasetLockedError, _call_with_lock_retry, _is_lock_error,
+    publish_datasets, upload_dataset)
+
+
+def _make_resp(status_code, text):
+    resp = requests.Response()
+    resp.status_code = status_code
+    resp._content = text.encode()
+    return resp
+
+
+@pytest.mark.parametrize("status_code,text,expected", [
+    (409, "", True),
+    (400, '{"message": "Dataset is locked"}', True),
+    (403, '{"message": "Dataset cannot be edited due to dataset lock."}', True),
+    (400, '{"message": "Invalid metadataBlock"}', False),
+    (400, '{"message": "blocked by policy"}', False),
+    (500, '{"message": "block size exceeded"}', False),
+    (200, '{"message": "locked"}', False),
+])
+def test_is_lock_error(status_code, text, expected):
+    assert _is_lock_error(_make_resp(status_code, text)) is expected
+
+
+def test_publish_retry_on_lock(dv_config, fake_dataverse, make_index):
+    pid = upload_dataset(dv_config, "lmt", make_index())
+    fake_dataverse.locks[pid] = 2
+    publish_datasets(dv_config, [pid])
+    assert fake_dataverse.count_calls(
+        "POST", r"/api/datasets/:persistentId/actions/:publish") == 2
+    assert not fake_dataverse.datasets[pid]["draft"]
+
+
+def test_lock_retry_unconfirmed(dv_config, fake_dataverse, make_index):
+    pid = upload_dataset(dv_config, "lmt", make_index())
+    n_calls = 0
+
+    def _func():
+        nonlocal n_calls
+        n_calls += 1
+        raise DatasetLockedError("locked")
+
+    with pytest.raises(DatasetLockedError):
+        asyncio.run(_call_with_lock_retry(
+            dv_config, pid, _func, retry_interval=0.01, max_unconfirmed=3))
+    assert n_calls == 3
@@ -0,0 +1,46 @@
+"""Tests for the datafile manifest."""
+
+from dvpipe.manifest import DatafileManifest
+
+
+def _make_item(file_id, label, directory_label=None, md5="abc"):
+    item = {
+        "label": label,
+        "dataFile": {"id": file_id, "filesize": 3, "md5": md5},
+        }
+    if directory_label is not None:
+        item["directoryLabel"] = directory_label
+    return item
+
+
+def test_datafile_manifest():
+    items = [
+        _make_item(1, "a.dat"),
+        _make_item(2, "a.dat", "sub"),
+        _make_item(3, "b.dat", ""),
+        _make_item(4, "a.dat", "sub"),
+        ]
+    manifest = DatafileManifest.from_items(items, meta={"total": 4})
+    # the duplicated entry is dropped
+    assert len(manifest) == 3
+    assert manifest.get("a.dat").file_id == 1
+    assert manifest.get("a.dat", "sub").file_id == 2
+    # empty directory label is the top level
+    assert manifest.get("b.dat").file_id == 3
+    assert manifest.get("b.dat", "").file_id == 3
+    assert manifest.get("c.dat") is None
+    assert (None, "a.dat") in manifest
+
+    entry = manifest.get("a.dat", "sub")
+    assert entry.size == 3
+    assert entry.checksum == ("md5", "abc")
+    assert entry.datafile_meta is items[1]["dataFile"]
+
+    local_keys = [("sub", "a.dat"), ("", "b.dat"), ("sub", "c.dat")]
+    assert [e.file_id for e in manifest.only_remote(local_keys)] == [1]
+    assert manifest.only_local(local_keys) == [("sub", "c.dat")]
+
+    result = manifest.to_result()
+    assert len(result) == 3
+    assert result["label"] == ["a.dat", "a.dat", "b.dat"]
+    assert result.meta == {"response_data": {"total": 4}}
@@ -0,0 +1,244 @@
+"""Tests for the metadata blocks."""
+
+import os
+import pickle
+from pathlib import Path
+
+import astropy.units as u
+import numpy as np
+import pandas as pd
+import pytest
+from astropy.table import QTable, Table
+
+# the pipelines subpackage imports the dagster pipelines
+pytest.importorskip("dagster")
+
+from dvpipe.pipelines.lmtmetadatablock import LmtMetadataBlock  # noqa: E402
+from dvpipe.pipelines import metadatablock  # noqa: E402
+from dvpipe.pipelines.metadatablock import (  # noqa: E402
+    MetadataBlockSchema, clear_definition_cache, convert_units,
+    get_unit_factor, load_cached)
+from dvpipe import pipelines  # noqa: E402
+
+
+_bands = {
+    "bandNum": [1, 2, 3],
+    "bandName": ["OTHER", "OTHER", "OTHER"],
+    "formula": ["CS", "CO", "HCN"],
+    "transition": ["2-1", "1-0", "1-0"],
+    "frequencyCenter": [97981.0, 115271.2, 88631.6],
+    "velocityCenter": [300000.0, -25000.0, 12.5],
+    "bandwidth": [2.5, 2.5, 0.8],
+    "nchan": [1024, 2048, 512],
+    "beam": [20.0, 17.0, 22.1],
+    "winrms": [0.072, 0.123, 0.2],
+    "qaGrade": [1, 4, 2],
+    }
+_band_units = {
+    "frequencyCenter": "MHz",
+    "velocityCenter": "m/s",
+    "bandwidth": "GHz",
+    "beam": "arcsec",
+    "winrms": "K",
+    }
+
+
+def _make_block():
+    lmt = LmtMetadataBlock(
+        yamlfile=Path(pipelines.__path__[0]).joinpath("example_lmt.yaml"),
+        load_data=True)
+    del lmt.metadata["band"]
+    return lmt
+
+
+def test_schema():
+    lmt = _make_block()
+    schema = lmt.schema
+    dsf = lmt.datasetFields
+    assert list(schema.names) == list(dsf["name"])
+    for row in dsf.to_dict("records"):
+        field = schema[row["name"]]
+        assert field.fieldType == row["fieldType"]
+        assert field.units == (None if pd.isnull(row["units"]) else row["units"])
+        parent = None if pd.isnull(row["parent"]) else row["parent"]
+        assert field.parent == parent
+        if parent is not None:
+            assert row["name"] in schema[parent].children
+    assert lmt.get_children("band") == tuple(
+        dsf["name"][dsf["parent"] == "band"])
+    cv = lmt.controlledVocabulary
+    for name in set(cv["DatasetField"]):
+        assert schema.allowed_values(name) == tuple(
+            cv["Value"][cv["DatasetField"] == name])
+        assert lmt.is_controlled(name)
+    assert not schema.is_allowed("velFrame", "Foobar")
+    assert schema.is_allowed("velFrame", "LSR")
+    assert schema.is_allowed("projectID", "anything")
+    # the schema is shared by the blocks, and survives the pickle cache
+    assert LmtMetadataBlock().schema is schema
+    schema_copy = pickle.loads(pickle.dumps(schema))
+    assert isinstance(schema_copy, MetadataBlockSchema)
+    assert schema_copy.fields == schema.fields
+
+
+def _add_band_rows(lmt):
+    for i in range(len(_bands["bandNum"])):
+        row = dict()
+        for k, values in _bands.items():
+            if k in _band_units:
+                row[k] = values[i] * u.Unit(_band_units[k])
+            else:
+                row[k] = values[i]
+        lmt.add_metadata("band", row)
+
+
+def _make_band_table(kind):
+    if kind == "pandas":
+        return pd.DataFrame(_bands), dict(_band_units)
+    if kind == "numpy":
+        return Table(_bands).as_array(), dict(_band_units)
+    if kind == "table":
+        tbl = Table(_bands)
+        for k, unit in _band_units.items():
+            tbl[k].unit = unit
+        return tbl, None
+    if kind == "qtable":
+        tbl = QTable(_bands)
+        for k, unit in _band_units.items():
+            tbl[k] = tbl[k] * u.Unit(unit)
+        return tbl, None
+    raise ValueError(kind)
+
+
+@pytest.mark.parametrize("kind", ["pandas", "numpy", "table", "qtable"])
+def test_add_metadata_table(kind):
+    lmt_rows = _make_block()
+    _add_band_rows(lmt_rows)
+    lmt_table = _make_block()
+    table, units = _make_band_table(kind)
+    lmt_table.add_metadata_table("band", table, units=units)
+    assert lmt_table.metadata["band"] == lmt_rows.metadata["band"]
+    assert lmt_table.to_dataverse_dict() == lmt_rows.to_dataverse_dict()
+
+
+def test_add_metadata_table_quantity_object_column():
+    lmt = _make_block()
+    df = pd.DataFrame({
+        "bandNum": [1, 2],
+        "frequencyCenter": [97.981 * u.GHz, 115271.2 * u.MHz],
+        })
+    with pytest.raises(ValueError, match="frequencyCenter holds astropy"):
+        lmt.add_metadata_table("band", df)
+    assert "band" not in lmt.metadata
+
+
+def test_add_metadata_table_errors():
+    lmt = _make_block()
+    with pytest.raises(KeyError):
+        lmt.add_metadata_table("foo", pd.DataFrame({"a": [1]}))
+    with pytest.raises(ValueError, match="has no children"):
+        lmt.add_metadata_table("RA", pd.DataFrame({"RA": [1.]}))
+    with pytest.raises(ValueError, match="not children"):
+        lmt.add_metadata_table("band", pd.DataFrame({"RA": [1.]}))
+    with pytest.raises(ValueError, match="not a valid value"):
+        lmt.add_metadata_table("band", pd.DataFrame({"bandName": ["foo"]}))
+    with pytest.raises(ValueError, match="Error converting units"):
+        lmt.add_metadata_table(
+            "band", pd.DataFrame({"beam": [1.]}), units={"beam": "km"})
+
+
+@pytest.mark.parametrize("value,requnits,units", [
+    (1.5 * u.GHz, "MHz", None),
+    (np.array([1., 2.5]) * u.deg, "arcsec", None),
+    (1.5, "GHz", "MHz"),
+    ([1., 2.5], "km/s", "m/s"),
+    (np.array([1, 2]), "s", "min"),
+    (np.float32(0.5), "K", "mK"),
+    ("3 arcmin", "deg", None),
+    ])
+def test_convert_units(value, requnits, units):
+    q = value if units is None else u.Quantity(value, units)
+    expected = u.Quantity(q).to_value(requnits)
+    np.testing.assert_allclose(
+        convert_units(value, requnits, units), expected, rtol=1e-15)
+
+
+def test_convert_units_same_units():
+    assert convert_units(2, "GHz") == 2.
+    np.testing.assert_array_equal(convert_units([1, 2], "GHz"), [1., 2.])
+    assert get_unit_factor("GHz", "GHz") == 1.
+
+
+def _make_loader(calls):
+    def _load_text(path):
+        calls.append(path)
+        with open(path) as fo:
+            return fo.read()
+    return _load_text
+
+
+def _set_mtime_ns(path, mtime_ns):
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def test_load_cached(tmp_path):
+    calls = list()
+    loader = _make_loader(calls)
+    path = tmp_path / "a.csv"
+    path.write_text("abc")
+    mtime_ns = path.stat().st_mtime_ns
+    assert load_cached(loader, path) == "abc"
+    assert load_cached(loader, path.as_posix()) == "abc"
+    assert len(calls) == 1
+
+    # reloaded on mtime change with the same size
+    path.write_text("xyz")
+    _set_mtime_ns(path, mtime_ns + 10 ** 9)
+    assert load_cached(loader, path) == "xyz"
+    assert len(calls) == 2
+
+    # reloaded on size change with the same mtime
+    path.write_text("abcd")
+    _set_mtime_ns(path, mtime_ns + 10 ** 9)
+    assert load_cached(loader, path) == "abcd"
+    assert len(calls) == 3
+    assert load_cached(loader, path) == "abcd"
+    assert len(calls) == 3
+
+
+def test_load_cached_pickle(tmp_path, monkeypatch):
+    cache_dir = tmp_path / "cache"
+    monkeypatch.setattr(
+        metadatablock, "_definition_cache_dir", cache_dir.as_posix())
+    calls = list()
+    loader = _make_loader(calls)
+    path = tmp_path / "a.csv"
+    path.write_text("abc")
+    assert load_cached(loader, path) == "abc"
+    cache_file, = cache_dir.iterdir()
+
+    # a new process loads the pickle
+    clear_definition_cache()
+    assert load_cached(loader, path) == "abc"
+    assert len(calls) == 1
+
+    # the stale pickle of a changed file is ignored and replaced
+    path.write_text("abcd")
+    clear_definition_cache()
+    assert load_cached(loader, path) == "abcd"
+    assert len(calls) == 2
+    clear_definition_cache()
+    assert load_cached(loader, path) == "abcd"
+    assert len(calls) == 2
+
+    # so are the pickles of other cache versions and the invalid ones
+    monkeypatch.setattr(
+        metadatablock, "_definition_cache_version",
+        metadatablock._definition_cache_version + 1)
+    clear_definition_cache()
+    assert load_cached(loader, path) == "abcd"
+    assert len(calls) == 3
+    cache_file.write_bytes(b"invalid")
+    clear_definition_cache()
+    assert load_cached(loader, path) == "abcd"
+    assert len(calls) == 4
@@ -0,0 +1,95 @@
+"""Tests for the upload plan."""
+
+import copy
+import os
+
+from dvpipe.dataverse import upload_dataset
+from dvpipe.plan import UploadPlan, execute_plan, make_plan
+from dvpipe.utils import yaml
+
+
+def test_plan_round_trip(dv_config, fake_dataverse, make_index, tmp_path):
+    index = make_index()
+    pid = upload_dataset(dv_config, "lmt", copy.deepcopy(index))
+    file_ids = set(fake_dataverse.datasets[pid]["files"])
+
+    # change both the metadata and a file
+    index["dataset"]["dsDescription"][0]["dsDescriptionValue"] = "changed"
+    with open(index["files"][0]["filename"], "wb") as fo:
+        fo.write(os.urandom(100))
+    plan = make_plan(
+        dv_config, "lmt", [copy.deepcopy(index)],
+        action_on_exist="update", metadata_only=True)
+    assert plan.metadata_only
+    assert [a.kind for a in plan.datasets[0].actions] == ["update_metadata"]
+    plan.datasets[0].output = tmp_path / "out.yaml"
+
+    plan_file = tmp_path / "plan.yaml"
+    with open(plan_file, "w") as fo:
+        yaml.dump(plan.to_dict(), fo)
+    with open(plan_file) as fo:
+        plan_loaded = UploadPlan.from_dict(yaml.load(fo))
+    assert plan_loaded.to_dict() == plan.to_dict()
+
+    assert execute_plan(dv_config, plan_loaded) == [pid]
+    ds = fake_dataverse.datasets[pid]
+    assert set(ds["files"]) == file_ids
+    assert "changed" in str(ds["version"])
+    assert (tmp_path / "out.yaml").exists()
+
+
+def test_plan_skip_metadata(dv_config, fake_dataverse, make_index):
+    index = make_index()
+    pid = upload_dataset(dv_config, "lmt", copy.deepcopy(index))
+    with open(index["files"][0]["filename"], "wb") as fo:
+        fo.write(os.urandom(100))
+    plan = make_plan(
+        dv_config, "lmt", [copy.deepcopy(index)], action_on_exist="update")
+    assert [a.kind for a in plan.datasets[0].actions] == [
+        "skip_metadata", "replace_file", "skip_file", "skip_file"]
+
+    # the planned metadata and files are not queried again
+    n_calls = len(fake_dataverse.calls)
+    assert execute_plan(dv_config, plan) == [pid]
+    paths = [p for _, p, _ in fake_dataverse.calls[n_calls:]]
+    assert not any("/versions/" in p for p in paths)
+    assert fake_dataverse.count_calls(
+        "PUT", r"/api/datasets/:persistentId/versions/:draft") == 0
+    label = index["files"][0]["label"]
+    content, = [
+        f["_content"] for f in fake_dataverse.datasets[pid]["files"].values()
+        if f["label"] == label]
+    assert len(content) == 100
+
+
+def test_plan_direct_upload_requests(
+        dv_config, fake_dataverse, make_index):
+    index = make_index(n_files=5, size=2500)
+    pid = upload_dataset(dv_config, "lmt", copy.deepcopy(index))
+    for data in index["files"][:3]:
+        with open(data["filename"], "wb") as fo:
+            fo.write(os.urandom(100))
+    index["files"].append(
+        make_index(name="new", n_files=1, size=2500)["files"][0])
+    index["files"][-1]["label"] = "new.tar"
+    plan = make_plan(
+        dv_config, "lmt", [copy.deepcopy(index)], action_on_exist="update",
+        direct_upload=True, part_size=1000, register_batch_size=2)
+    actions = plan.datasets[0].actions
+    assert [a.kind for a in actions] == [
+        "skip_metadata"] + ["replace_file"] * 3 + ["skip_file"] * 2 + [
+        "create_file", "register_files"]
+    # request urls and a single put for the small files, and the multipart
+    # upload of 1000 bytes parts for the new file
+    assert [a.n_requests for a in actions[1:4]] == [2, 2, 2]
+    assert actions[6].n_requests == 1 + 3 + 1
+    # the 3 replaced files in 2 batches and the new file in 1
+    assert actions[7].n_requests == 3
+
+    assert execute_plan(
+        dv_config, plan, register_batch_size=2) == [pid]
+    n_register = sum(
+        fake_dataverse.count_calls(
+            "POST", rf"/api/datasets/:persistentId/{endpoint}")
+        for endpoint in ["addFiles", "replaceFiles"])
+    assert n_register == 3
@@ -0,0 +1,53 @@
+"""Tests for publishing datasets."""
+
+import copy
+
+from dvpipe.dataverse import upload_dataset
+from dvpipe.plan import execute_plan, make_plan
+from dvpipe.utils import yaml
+
+
+_publish_path = r"/api/datasets/:persistentId/actions/:publish"
+
+
+def test_upload_rerun_unchanged(dv_config, fake_dataverse, make_index, tmp_path):
+    index = make_index()
+    kwargs = dict(action_on_exist="update", publish_type="major")
+    pid = upload_dataset(dv_config, "lmt", copy.deepcopy(index), **kwargs)
+    assert fake_dataverse.count_calls("POST", _publish_path) == 1
+
+    output = tmp_path / "out.yaml"
+    pid_rerun = upload_dataset(
+        dv_config, "lmt", copy.deepcopy(index), output=output, **kwargs)
+    assert pid_rerun == pid
+    assert fake_dataverse.count_calls("POST", _publish_path) == 1
+    with open(output) as fo:
+        meta = yaml.load(fo)["meta"]["dataset"]
+    assert meta["transfer"]["metadata_action"] == "unchanged"
+    assert meta["transfer"]["n_files_transferred"] == 0
+    assert [v["versionState"] for v in meta["versions"]] == ["RELEASED"]
+
+
+def test_upload_rerun_publishes_draft(dv_config, fake_dataverse, make_index):
+    index = make_index()
+    upload_dataset(dv_config, "lmt", copy.deepcopy(index), action_on_exist="update")
+    # nothing changed in this run, but the draft is pending
+    upload_dataset(
+        dv_config, "lmt", copy.deepcopy(index),
+        action_on_exist="update", publish_type="major")
+    assert fake_dataverse.count_calls("POST", _publish_path) == 1
+
+
+def test_plan_rerun_unchanged(dv_config, fake_dataverse, make_index):
+    indices = [make_index(f"data{i}", title=f"dataset {i}") for i in range(2)]
+    kwargs = dict(action_on_exist="update", publish_type="major")
+    plan = make_plan(dv_config, "lmt", copy.deepcopy(indices), **kwargs)
+    assert all(d.actions[-1].kind == "publish" for d in plan.datasets)
+    execute_plan(dv_config, plan)
+    assert fake_dataverse.count_calls("POST", _publish_path) == 2
+
+    plan = make_plan(dv_config, "lmt", copy.deepcopy(indices), **kwargs)
+    assert plan.summary()["n_actions"] == {
+        "skip_metadata": 2, "skip_file": 6}
+    execute_plan(dv_config, plan)
+    assert fake_dataverse.count_calls("POST", _publish_path) == 2
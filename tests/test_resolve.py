@@ -0,0 +1,42 @@
+"""Tests for resolving the existing datasets of many dataset indices."""
+
+import re
+
+from dvpipe.dataverse import resolve_dataset_pids
+
+
+def _make_indices(titles):
+    return [{"dataset": {"title": title}} for title in titles]
+
+
+def test_resolve_dataset_pids(dv_config, fake_dataverse):
+    pids = {
+        title: fake_dataverse.add_dataset(title)
+        for title in ["a0", "a1", "a2", "a3", "a0 extra"]}
+    pid_a1 = fake_dataverse.add_dataset("a1")
+    fake_dataverse.add_dataset("a0", parent="other")
+    titles = ["a0", "a1", "a2", "a3", "a1", "missing"]
+    result = resolve_dataset_pids(
+        dv_config, "lmt", _make_indices(titles), chunk_size=2)
+    # the titles containing the searched ones are not matched
+    assert result == {
+        "a0": [pids["a0"]],
+        "a1": [pids["a1"], pid_a1],
+        "a2": [pids["a2"]],
+        "a3": [pids["a3"]],
+        "missing": [],
+        }
+
+    # the unique titles are searched in chunks
+    queries = [
+        q["q"] for m, p, q in fake_dataverse.calls if p == "/api/search"]
+    assert sorted(
+        re.findall(r'title:"([^"]*)"', q) for q in queries) == [
+        ["a0", "a1"], ["a2", "a3"], ["missing"]]
+
+
+def test_resolve_dataset_pids_quoted(dv_config, fake_dataverse):
+    title = 'a "b" c'
+    pid = fake_dataverse.add_dataset(title)
+    result = resolve_dataset_pids(dv_config, "lmt", _make_indices([title]))
+    assert result == {title: [pid]}
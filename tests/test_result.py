@@ -0,0 +1,55 @@
+"""Tests for the query result table."""
+
+import pytest
+
+from dvpipe.result import ResultTable
+
+
+_items = [
+    {"a": 1, "b": [1, 2]},
+    {"a": 2, "c": "x"},
+    {"b": [3], "c": "y"},
+    ]
+
+
+def test_result_table_from_items():
+    result = ResultTable.from_items(_items, meta={"total": 3})
+    assert len(result) == 3
+    assert result.colnames == ["a", "b", "c"]
+    assert result["a"] == [1, 2, None]
+    assert result["b"] == [[1, 2], None, [3]]
+    assert result["c"] == [None, "x", "y"]
+    assert result[1] == {"a": 2, "b": None, "c": "x"}
+    assert result[-1] == {"a": None, "b": [3], "c": "y"}
+    assert result.to_records() == list(result)
+    assert result[1:]["a"] == [2, None]
+    assert result[["c"]].colnames == ["c"]
+    assert result[["c"]].meta == {"total": 3}
+    with pytest.raises(IndexError):
+        result[3]
+
+
+def test_result_table_empty():
+    result = ResultTable.from_items([])
+    assert len(result) == 0
+    assert result.colnames == []
+    assert result.to_records() == []
+
+
+def test_result_table_mismatch():
+    with pytest.raises(ValueError, match="mismatch column lengths"):
+        ResultTable({"a": [1], "b": [1, 2]})
+
+
+def test_result_table_conversions():
+    result = ResultTable.from_items(_items, meta={"total": 3})
+    tbl = result.to_table()
+    assert tbl.colnames == ["a", "b", "c"]
+    # nested lists are kept as objects
+    assert list(tbl["b"][0]) == [1, 2]
+    assert tbl.meta["total"] == 3
+    df = result.to_pandas()
+    assert list(df.columns) == ["a", "b", "c"]
+    assert df["c"].isna().tolist() == [True, False, False]
+    assert df["c"].tolist()[1:] == ["x", "y"]
+    assert df.attrs["total"] == 3
@@ -0,0 +1,71 @@
+"""Tests for the paginated search."""
+
+import asyncio
+import time
+
+import pytest
+
+from dvpipe.dataverse import (
+    iter_search_dataverse, iter_search_dataverse_async, search_dataverse)
+
+
+def _get_search_starts(fake_dataverse):
+    return [
+        int(q.get("start", 0)) for m, p, q in fake_dataverse.calls
+        if p == "/api/search"]
+
+
+def _wait_for_searches(fake_dataverse, n, timeout=5.):
+    t_end = time.monotonic() + timeout
+    while (
+            len(_get_search_starts(fake_dataverse)) < n
+            and time.monotonic() < t_end):
+        time.sleep(0.01)
+    # make sure no more requests are sent
+    time.sleep(0.1)
+    return len(_get_search_starts(fake_dataverse))
+
+
+@pytest.mark.parametrize("prefetch", [True, False])
+def test_iter_search_dataverse(dv_config, fake_dataverse, prefetch):
+    pids = [fake_dataverse.add_dataset(f"t{i}") for i in range(2500)]
+    items = list(iter_search_dataverse(
+        dv_config, q_str="*", prefetch=prefetch))
+    assert [item["global_id"] for item in items] == pids
+    assert _get_search_starts(fake_dataverse) == [0, 1000, 2000]
+
+
+@pytest.mark.parametrize("prefetch", [True, False])
+def test_iter_search_dataverse_async(dv_config, fake_dataverse, prefetch):
+    pids = [fake_dataverse.add_dataset(f"t{i}") for i in range(25)]
+
+    async def _main():
+        return [
+            item async for item in iter_search_dataverse_async(
+                dv_config, q_str="*", per_page=10, prefetch=prefetch)]
+
+    items = asyncio.run(_main())
+    assert [item["global_id"] for item in items] == pids
+    assert _get_search_starts(fake_dataverse) == [0, 10, 20]
+
+
+@pytest.mark.parametrize("prefetch,n_searches", [(True, 2), (False, 1)])
+def test_iter_search_dataverse_prefetch(
+        dv_config, fake_dataverse, prefetch, n_searches):
+    pids = [fake_dataverse.add_dataset(f"t{i}") for i in range(30)]
+    it = iter_search_dataverse(
+        dv_config, q_str="*", per_page=10, prefetch=prefetch)
+    assert next(it)["global_id"] == pids[0]
+    # only the next page is requested while the first page is consumed
+    assert _wait_for_searches(fake_dataverse, n_searches) == n_searches
+    assert [item["global_id"] for item in it] == pids[1:]
+    assert _get_search_starts(fake_dataverse) == [0, 10, 20]
+
+
+def test_search_dataverse_all_pages(dv_config, fake_dataverse):
+    pids = [fake_dataverse.add_dataset(f"t{i}") for i in range(1500)]
+    result = search_dataverse(dv_config, q_str="*", per_page=1000)
+    assert len(result) == 1000
+    result = search_dataverse(
+        dv_config, all_pages=True, q_str="*", per_page=1000)
+    assert list(result.to_pandas()["global_id"]) == pids
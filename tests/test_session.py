@@ -0,0 +1,57 @@
+"""Tests for the pooled HTTP sessions."""
+
+from loguru import logger
+
+from dvpipe.core import DataverseConfig
+from dvpipe.session import HttpConfig, get_session
+
+
+def _make_config(base_url, **kwargs):
+    # the sessions are shared per config, so each test uses its own one
+    # to start with fresh stats.
+    return DataverseConfig(
+        api_token="x", base_url=base_url, http=HttpConfig(**kwargs))
+
+
+def test_session_shared(fake_dataverse):
+    dv_config = _make_config(fake_dataverse.base_url, pool_maxsize=3)
+    session = get_session(dv_config.http)
+    for type in ['data_access', 'native', 'metrics', 'search']:
+        api = dv_config.get_api(type)
+        assert api.session is session
+        assert dv_config.get_api(type) is api
+    # a config with the same http settings shares the session
+    other = _make_config("http://127.0.0.1:1", pool_maxsize=3)
+    assert other.native_api.session is session
+    other = _make_config(fake_dataverse.base_url, pool_maxsize=2)
+    assert other.native_api.session is not session
+
+
+def test_connection_stats(fake_dataverse):
+    dv_config = _make_config(fake_dataverse.base_url, pool_maxsize=5)
+    for _ in range(5):
+        assert dv_config.native_api.get_info_version().ok
+    assert dv_config.connection_stats() == {
+        'requests': 5, 'connections': 1, 'reused': 4}
+
+    messages = list()
+    sink_id = logger.add(messages.append, level="INFO", format="{message}")
+    try:
+        dv_config.log_connection_stats()
+    finally:
+        logger.remove(sink_id)
+    assert "reused: 4" in messages[0]
+
+
+def test_connection_stats_pool_evicted(fake_dataverse):
+    # the connections of the pools evicted from the pool manager are
+    # still counted.
+    dv_config = _make_config(
+        fake_dataverse.base_url, pool_maxsize=6, pool_connections=1)
+    api = dv_config.native_api
+    port = fake_dataverse._server.server_port
+    for host in ["127.0.0.1", "localhost", "127.0.0.1"]:
+        assert api.get_request(
+            f"http://{host}:{port}/api/info/version").ok
+    assert dv_config.connection_stats() == {
+        'requests': 3, 'connections': 3, 'reused': 0}
@@ -0,0 +1,102 @@
+"""Tests for the streaming request bodies."""
+
+import io
+import os
+import zipfile
+import zlib
+
+import pytest
+
+from dvpipe import streaming
+from dvpipe.streaming import MultipartEncoder, StoredZipStream, compute_crc32
+
+from .fake_dataverse import _parse_multipart
+
+
+def _read_all(stream, chunk_size):
+    chunks = list()
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
+def test_compute_crc32(tmp_path):
+    path = tmp_path / "a.dat"
+    content = os.urandom(10000)
+    path.write_bytes(content)
+    assert compute_crc32(path, blocksize=1000) == zlib.crc32(content)
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 1000, -1])
+@pytest.mark.parametrize("arcname", [None, "sub/b.dat", "データ.dat"])
+def test_stored_zip_stream(tmp_path, chunk_size, arcname):
+    path = tmp_path / "a.dat"
+    content = os.urandom(3000)
+    path.write_bytes(content)
+    with StoredZipStream(path, arcname=arcname) as stream:
+        data = _read_all(stream, chunk_size)
+    assert len(data) == len(stream)
+    with zipfile.ZipFile(io.BytesIO(data)) as z:
+        assert z.testzip() is None
+        info, = z.infolist()
+        assert info.filename == (arcname or "a.dat")
+        assert info.compress_type == zipfile.ZIP_STORED
+        assert z.read(info) == content
+
+
+def test_stored_zip_stream_zip64(tmp_path, monkeypatch):
+    # use the zip64 records for a small file
+    monkeypatch.setattr(streaming, "_zip64_limit", 100)
+    path = tmp_path / "a.dat"
+    content = os.urandom(3000)
+    path.write_bytes(content)
+    stream = StoredZipStream(path)
+    data = stream.read()
+    stream.close()
+    assert b"PK\x06\x06" in data
+    with zipfile.ZipFile(io.BytesIO(data)) as z:
+        assert z.testzip() is None
+        assert z.read("a.dat") == content
+
+
+def test_stored_zip_stream_reopen(tmp_path):
+    path = tmp_path / "a.dat"
+    path.write_bytes(b"abc")
+    stream = StoredZipStream(path, crc=zlib.crc32(b"abc"))
+    data = stream.read()
+    stream.close()
+    # the stream can be read again, e.g., on retry
+    assert stream.read() == data
+
+
+def test_multipart_encoder(tmp_path):
+    path = tmp_path / "a.dat"
+    content = os.urandom(5000)
+    path.write_bytes(content)
+    progress = list()
+    with open(path, "rb") as fo:
+        encoder = MultipartEncoder(
+            {"jsonData": '{"label": "a"}', "file": ("a.dat", fo)},
+            callback=lambda p: progress.append(p.bytes_sent), name="a.dat")
+        body = _read_all(encoder, 1024)
+    assert len(body) == len(encoder)
+    assert encoder.progress.done
+    assert progress[-1] == len(body)
+    parts = _parse_multipart(encoder.content_type, body)
+    assert parts["jsonData"] == (None, '{"label": "a"}')
+    assert parts["file"] == ("a.dat", content)
+
+
+def test_multipart_encoder_stream(tmp_path):
+    path = tmp_path / "a.dat"
+    path.write_bytes(b"abc")
+    zip_stream = StoredZipStream(path)
+    encoder = MultipartEncoder({"file": ("a.zip", zip_stream)})
+    body = encoder.read()
+    assert len(body) == len(encoder)
+    filename, data = _parse_multipart(encoder.content_type, body)["file"]
+    with zipfile.ZipFile(io.BytesIO(data)) as z:
+        assert z.read("a.dat") == b"abc"
@@ -0,0 +1,23 @@
+"""Tests for the utilities."""
+
+import io
+import subprocess
+import sys
+from pathlib import Path
+
+from dvpipe.utils import yaml
+
+
+def test_yaml_path():
+    fo = io.StringIO()
+    yaml.dump({"path": Path("/a/b")}, fo)
+    assert yaml.load(io.StringIO(fo.getvalue())) == {"path": "/a/b"}
+
+
+def test_no_astropy_import():
+    # the upload path does not need astropy
+    code = (
+        "import sys\n"
+        "import dvpipe.dataverse, dvpipe.plan, dvpipe.catalog\n"
+        "assert 'astropy' not in sys.modules, 'astropy imported'\n")
+    subprocess.run([sys.executable, "-c", code], check=True)